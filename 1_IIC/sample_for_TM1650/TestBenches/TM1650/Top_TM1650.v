@@ -0,0 +1,39 @@
+`ifndef TOP_TM1650_V
+`define TOP_TM1650_V
+
+`include "top.v"
+
+/**
+ * @brief cocotb测试使用的顶层模块，把Top的IIC总线接到带上拉电阻的总线上，TM1650由Python模型实现
+ * @param in_add_trigger 加法触发信号，对应Top的in_btn_s2(DEBUG_TEST_BENCH下没有消抖)
+ * @param in_target_sda_pull_low 从设备拉低SDA(高电平有效)，否则释放SDA
+ * @return out_bus_scl 总线上的SCL，Top没有驱动(高阻态)时由上拉电阻拉高
+ * @return out_bus_sda 总线上的SDA，主机和从设备同时驱动不同的电平时为x
+ */
+module Top_TM1650(
+    input wire in_clk,
+    input wire in_rst,
+    input wire in_add_trigger,
+    input wire in_target_sda_pull_low,
+    output wire out_bus_scl,
+    output wire out_bus_sda,
+    output wire [3:0] out_values
+);
+
+    tri1 _w_bus_sda;
+    assign _w_bus_sda = in_target_sda_pull_low ? 1'b0 : 1'bz;
+    assign out_bus_sda = _w_bus_sda;
+
+    wire _w_scl;
+    assign out_bus_scl = (_w_scl === 1'b0) ? 1'b0 : 1'b1;
+
+    Top _inst_top(.in_clk(in_clk)
+        , .in_btn_s1(in_rst)
+        , .in_btn_s2(in_add_trigger)
+        , .out_iic_scl(_w_scl)
+        , .in_out_iic_sda(_w_bus_sda)
+        , .out_values(out_values));
+
+endmodule
+
+`endif ///< TOP_TM1650_V
@@ -0,0 +1,119 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import time
+import cocotb
+from cocotb.triggers import First, RisingEdge
+from cocotb.runner import get_runner
+from cocotb.utils import get_sim_time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../utils/TestBenchUtils'))
+from SignalWait import FastClockCycles, start_clock
+from IICTarget import TM1650_Target
+
+CLOCK_PERIOD_NS = 2
+# 与top.v中的TM1650_LIGHTING_CMD_BYTE(0x15)保持一致：亮度1级，8段模式，打开显示
+EXPECTED_BRIGHTNESS = 1
+
+# 按下加法按钮的次数，超过9次可以覆盖十进制进位
+g_presses = 12
+# 每次按下按钮之后等待显示更新的最长时钟周期数量
+g_timeout_cycles = 1_000_000
+
+g_run_all = False
+
+g_test_case_enable_settings = {
+    'counter_display': True
+}
+
+
+# 通用的复位行为
+async def reset_signal(dut):
+    dut.in_add_trigger.value = 0
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 1
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 0
+    await RisingEdge(dut.in_clk)
+
+
+async def wait_display(dut, tm1650, expected_text, timeout_cycles):
+    """
+    等待TM1650显示expected_text，只在显示状态发生变化时被唤醒
+    Returns:
+        是否在超时之前显示了expected_text
+    """
+    deadline = get_sim_time('ns') + timeout_cycles * CLOCK_PERIOD_NS
+    while tm1650.text() != expected_text:
+        remaining_cycles = int((deadline - get_sim_time('ns')) // CLOCK_PERIOD_NS)
+        if remaining_cycles <= 0:
+            return False
+        timeout = FastClockCycles(dut.in_clk, remaining_cycles)
+        tm1650.updated.clear()
+        fired = await First(tm1650.updated.wait(), timeout)
+        if fired is timeout:
+            return False
+    return True
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['counter_display'] and not g_run_all)
+async def counter_display(dut):
+    """
+    测试用例：每按一次加法按钮，Top通过IIC把四位十进制计数写到TM1650，直接比较TM1650模型显示的字符
+    """
+    await start_clock(dut.in_clk, CLOCK_PERIOD_NS, units='ns')
+    tm1650 = TM1650_Target(dut.out_bus_scl, dut.out_bus_sda, dut.in_target_sda_pull_low)
+    await reset_signal(dut)
+    tm1650.start()
+
+    start_wall_time = time.perf_counter()
+    for count in range(1, g_presses + 1):
+        dut.in_add_trigger.value = 1
+        await RisingEdge(dut.in_clk)
+        dut.in_add_trigger.value = 0
+        expected_text = f"{count:04d}"
+        assert await wait_display(dut, tm1650, expected_text, g_timeout_cycles), \
+            f"display shows '{tm1650.text()}', expected '{expected_text}'"
+        # 等待四个数位都发送完成，再触发下一次加法
+        while dut._id('_inst_top', extended=False)._id('_r_current_state', extended=False).value != 0:
+            await FastClockCycles(dut.in_clk, 1024)
+    wall_time = time.perf_counter() - start_wall_time
+    tm1650.stop()
+
+    assert tm1650.brightness == EXPECTED_BRIGHTNESS
+    assert not tm1650.is_seven_segment
+    dut._log.info(f"{len(tm1650.timeline)} display updates in {wall_time:.2f}s "
+                  f"({len(tm1650.timeline) / wall_time:.1f} updates per wall second)")
+    for sim_time_ns, state in tm1650.timeline[-4:]:
+        dut._log.info(f"{sim_time_ns:>12}ns {state}")
+
+
+def main():
+    proj_path = os.path.dirname(os.path.abspath(__file__))
+
+    always_run_build_step = True
+    generate_wave = False
+
+    source_dirs = [ os.path.join(proj_path, "Top_TM1650.v") ]
+    include_dirs = [ os.path.join(proj_path, "../../"), proj_path ]
+    build_dir = os.path.join(proj_path, 'tb_build')
+    pre_defines = {'DEBUG_TEST_BENCH': '1'}
+    top_level_module = 'Top_TM1650'
+
+    runner = get_runner('icarus')
+    runner.build(
+        verilog_sources=source_dirs,
+        hdl_toplevel=top_level_module,
+        always=always_run_build_step,
+        waves=generate_wave,
+        build_dir=build_dir,
+        includes=include_dirs,
+        defines=pre_defines,
+        timescale=('1us', '1ns')
+    )
+
+    runner.test(hdl_toplevel=top_level_module, test_module='tb_TM1650,', waves=generate_wave)
+
+
+if __name__ == '__main__':
+    main()
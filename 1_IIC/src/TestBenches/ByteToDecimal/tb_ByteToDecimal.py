@@ -0,0 +1,66 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import numpy as np
+import cocotb
+from cocotb.runner import get_runner
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../utils/TestBenchUtils'))
+from ExhaustiveCheck import check_exhaustive
+
+g_run_all = False
+
+g_test_case_enable_settings = {
+    'exhaustive': True
+}
+
+
+def reference_byte_to_decimal(inputs):
+    """
+    向量化的参考模型：个位、十位、百位，out_decimal_3恒为0
+    """
+    value = inputs['in_byte']
+    return {
+        'out_decimal_0': value % 10,
+        'out_decimal_1': value // 10 % 10,
+        'out_decimal_2': value // 100,
+        'out_decimal_3': np.zeros_like(value)
+    }
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['exhaustive'] and not g_run_all)
+async def exhaustive(dut):
+    """
+    测试用例：穷举in_byte的全部256个取值
+    """
+    mismatches = await check_exhaustive(dut, {'in_byte': 8}, reference_byte_to_decimal)
+    assert mismatches == 0, f"{mismatches} input values mismatch, see log"
+
+
+def main():
+    proj_path = os.path.dirname(os.path.abspath(__file__))
+
+    always_run_build_step = True
+    generate_wave = False
+
+    source_dirs = [ os.path.join(proj_path, "../../ByteToDecimal.v") ]
+    include_dirs = [ os.path.join(proj_path, "../../") ]
+    build_dir = os.path.join(proj_path, 'tb_build')
+    top_level_module = 'ByteToDecimal'
+
+    runner = get_runner('icarus')
+    runner.build(
+        verilog_sources=source_dirs,
+        hdl_toplevel=top_level_module,
+        always=always_run_build_step,
+        waves=generate_wave,
+        build_dir=build_dir,
+        includes=include_dirs,
+        timescale=('1us', '1ns')
+    )
+
+    runner.test(hdl_toplevel=top_level_module, test_module='tb_ByteToDecimal,', waves=generate_wave)
+
+
+if __name__ == '__main__':
+    main()
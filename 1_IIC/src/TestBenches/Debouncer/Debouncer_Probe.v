@@ -0,0 +1,38 @@
+`ifndef DEBOUNCER_PROBE_V
+`define DEBOUNCER_PROBE_V
+
+`include "Debouncer.v"
+`include "EdgeDetection.v"
+
+/**
+ * @brief cocotb测试使用的顶层模块，同一个按键信号同时送到Debouncer以及不除抖的EdgeDetection，用来比较两者的触发次数
+ * @param COUNTER_WIDTH 传给Debouncer的除抖计数器位宽
+ * @param in_sig 带抖动的按键信号，由测试代码驱动
+ * @return out_raw_edge 不除抖时检测到的边沿：in_sig经过一个寄存器之后接到双边沿的EdgeDetection
+ * @note
+ * 其余输出与Debouncer一致。Debouncer没有复位信号，测试代码需要通过后门设置_inst_debouncer._r_sig_state的初始值
+ */
+module Debouncer_Probe #(
+    parameter COUNTER_WIDTH = 16
+)(
+    input wire in_clk,
+    input wire in_rst,
+    input wire in_sig,
+    output wire out_sig_state,
+    output wire out_sig_down,
+    output wire out_sig_up,
+    output wire out_raw_edge
+);
+
+    Debouncer #(.COUNTER_WIDTH(COUNTER_WIDTH)) _inst_debouncer(.in_clk(in_clk), .in_sig(in_sig)
+        , .out_sig_state(out_sig_state), .out_sig_down(out_sig_down), .out_sig_up(out_sig_up));
+
+    // EdgeDetection假设输入来自寄存器，先同步一次
+    reg _r_sig;
+    always @(posedge in_clk) _r_sig <= in_sig;
+
+    EdgeDetection #(.Direction(2)) _inst_ed_in_sig(.in_clk(in_clk), .in_rst(in_rst), .in_sig(_r_sig), .out_detected(out_raw_edge));
+
+endmodule
+
+`endif ///< DEBOUNCER_PROBE_V
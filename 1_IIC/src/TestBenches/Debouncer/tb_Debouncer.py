@@ -0,0 +1,216 @@
+# -*- coding: UTF-8 -*-
+
+import json
+import os
+import random
+import sys
+import numpy as np
+import cocotb
+from cocotb.triggers import RisingEdge
+from cocotb.utils import get_sim_time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../utils/TestBenchUtils'))
+from SignalWait import FastClockCycles, start_clock
+from SwitchBounce import Bounce_Parameters, make_press_sequence, match_detections, replay_edges
+from BuildMatrix import Build_Matrix, config_name, expand_matrix, find_smallest_config, load_sweep_statistics
+
+CLOCK_PERIOD_NS = 2
+# 抖动参数按照开发板的时钟频率换算成时钟周期，仿真中的一个时钟周期对应开发板上的一个时钟周期
+BOARD_FREQ = 27_000_000
+
+# 每个测试用例按下/松开按键的次数
+g_presses = 8
+
+# 参数扫描：每个除抖窗口(2^COUNTER_WIDTH个时钟周期)单独编译，所有窗口与所有抖动场景在多个进程中并行执行
+g_parameter_axes = {
+    'COUNTER_WIDTH': [8, 10, 12, 14, 16],
+}
+
+# 抖动场景，时间单位是微秒，glitch_rate是每微秒出现毛刺的概率
+# 保持与空闲时间都大于最大的除抖窗口(2^16个时钟周期约为2.4ms)，没有毛刺时任何窗口都不会漏掉按键
+# 保持阶段的每个毛刺都会让Debouncer的计数器重新开始，noisy_hold平均每次保持有6~10个毛刺，
+# 很难出现一整个大窗口的稳定时间，大窗口漏掉按键是这个场景要测量的结果，不作为失败
+g_bounce_profiles = {
+    'clean_press': Bounce_Parameters(bounce_cycles=(0, 0), num_bounces=(0, 0), hold_cycles=(3000, 5000),
+                                     gap_cycles=(3000, 5000), glitch_rate=0, glitch_cycles=(0, 0)),
+    'contact_bounce': Bounce_Parameters(bounce_cycles=(100, 1500), num_bounces=(2, 10), hold_cycles=(3000, 5000),
+                                        gap_cycles=(3000, 5000), glitch_rate=0, glitch_cycles=(0, 0)),
+    'noisy_hold': Bounce_Parameters(bounce_cycles=(100, 1000), num_bounces=(1, 5), hold_cycles=(3000, 5000),
+                                    gap_cycles=(3000, 5000), glitch_rate=0.002, glitch_cycles=(0.5, 20)),
+}
+
+g_run_all = False
+
+g_test_case_enable_settings = {
+    'clean_press': True,
+    'contact_bounce': True,
+    'noisy_hold': True
+}
+
+# 不允许漏掉按键的抖动场景，其余场景只记录漏掉的次数
+g_profiles_without_misses = ['clean_press', 'contact_bounce']
+
+
+def profile_in_cycles(parameters):
+    """把以微秒为单位的抖动场景换算成时钟周期"""
+    cycles_per_us = BOARD_FREQ / 1e6
+    scale = lambda bounds: (bounds[0] * cycles_per_us, bounds[1] * cycles_per_us)
+    return parameters._replace(bounce_cycles=scale(parameters.bounce_cycles), hold_cycles=scale(parameters.hold_cycles),
+                               gap_cycles=scale(parameters.gap_cycles), glitch_cycles=scale(parameters.glitch_cycles),
+                               glitch_rate=parameters.glitch_rate / cycles_per_us)
+
+
+# 通用的复位行为
+async def reset_signal(dut):
+    dut.in_sig.value = 0
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 1
+    await RisingEdge(dut.in_clk)
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 0
+    # Debouncer没有复位信号，同步寄存器已经采样到稳定的0之后再通过后门设置初始状态，计数器会在下一个时钟周期清零
+    dut._id('_inst_debouncer', extended=False)._id('_r_sig_state', extended=False).value = 0
+    await RisingEdge(dut.in_clk)
+    await RisingEdge(dut.in_clk)
+
+
+async def record_rising_edges(signal, times, start_ns):
+    """记录signal每次变为高电平的时刻(相对于start_ns的时钟周期数)"""
+    while True:
+        await RisingEdge(signal)
+        times.append((get_sim_time('ns') - start_ns) / CLOCK_PERIOD_NS)
+
+
+async def _impl_characterize(dut, profile_name):
+    """
+    回放一段带抖动的按键序列，记录Debouncer的上升沿/下降沿检测延迟以及误触发次数
+    统计结果写到执行目录下的 <profile_name>.json
+    """
+    counter_width = len(dut._id('_inst_debouncer', extended=False)._id('_r_sig_counter', extended=False))
+    window = 1 << counter_width
+    rng = np.random.default_rng(random.getrandbits(32))
+    sequence = make_press_sequence(rng, g_presses, profile_in_cycles(g_bounce_profiles[profile_name]))
+
+    await start_clock(dut.in_clk, CLOCK_PERIOD_NS, units='ns')
+    await reset_signal(dut)
+
+    start_ns = get_sim_time('ns')
+    detections = {'up': [], 'down': [], 'raw': []}
+    monitors = [cocotb.start_soon(record_rising_edges(signal, detections[name], start_ns))
+                for name, signal in [('up', dut.out_sig_up), ('down', dut.out_sig_down), ('raw', dut.out_raw_edge)]]
+    times_ns = np.round(sequence.times * CLOCK_PERIOD_NS).astype(np.int64)
+    await replay_edges(dut.in_sig, times_ns, sequence.levels)
+    # 最后一次松开之后至少还有一个除抖窗口的空闲，再多等一个窗口确认没有迟到的误触发
+    await FastClockCycles(dut.in_clk, window + 16)
+    for monitor in monitors:
+        monitor.kill()
+
+    press_latencies, false_ups = match_detections(sequence.press_starts, detections['up'])
+    release_latencies, false_downs = match_detections(sequence.release_starts, detections['down'])
+    # 不除抖时按下和松开各应该触发一次，其余的都是误触发
+    event_starts = np.sort(np.concatenate((sequence.press_starts, sequence.release_starts)))
+    _, raw_false_edges = match_detections(event_starts, detections['raw'])
+    result = {
+        'counter_width': counter_width,
+        'presses': g_presses,
+        'press_latency_cycles': press_latencies.tolist(),
+        'release_latency_cycles': release_latencies.tolist(),
+        'settle_latency_cycles': (press_latencies - (sequence.press_settles - sequence.press_starts)).tolist(),
+        'false_ups': false_ups,
+        'false_downs': false_downs,
+        'missed_presses': int(np.isnan(press_latencies).sum()),
+        'missed_releases': int(np.isnan(release_latencies).sum()),
+        'raw_edges': len(detections['raw']),
+        'raw_false_edges': raw_false_edges,
+    }
+    with open(f"{profile_name}.json", 'w') as f:
+        json.dump(result, f, indent=2)
+    median_latency = np.nanmedian(press_latencies) if np.any(~np.isnan(press_latencies)) else np.nan
+    dut._log.info(f"window {window} cycles: press latency {median_latency:.0f} cycles (median), "
+                  f"false ups {false_ups}, false downs {false_downs}, "
+                  f"missed {result['missed_presses'] + result['missed_releases']}, raw edges {len(detections['raw'])} "
+                  f"for {2 * g_presses} real edges")
+    if profile_name not in g_profiles_without_misses:
+        return result
+    assert result['missed_presses'] == 0 and result['missed_releases'] == 0, \
+        f"missed {result['missed_presses']} presses and {result['missed_releases']} releases"
+    return result
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['clean_press'] and not g_run_all)
+async def clean_press(dut):
+    """
+    测试用例：没有抖动的按键，检测延迟应该是除抖窗口加上两级同步寄存器
+    """
+    result = await _impl_characterize(dut, 'clean_press')
+    window = 1 << result['counter_width']
+    assert result['false_ups'] == 0 and result['false_downs'] == 0 and result['raw_false_edges'] == 0
+    latencies = np.array(result['press_latency_cycles'] + result['release_latency_cycles'])
+    assert np.all((latencies >= window) & (latencies <= window + 4)), f"latencies {latencies}, window {window}"
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['contact_bounce'] and not g_run_all)
+async def contact_bounce(dut):
+    """
+    测试用例：按下和松开时触点来回弹跳，记录不同窗口下的误触发次数
+    """
+    await _impl_characterize(dut, 'contact_bounce')
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['noisy_hold'] and not g_run_all)
+async def noisy_hold(dut):
+    """
+    测试用例：在弹跳之外，保持和空闲阶段还有随机的短毛刺，记录不同窗口下漏掉的按键次数
+    """
+    await _impl_characterize(dut, 'noisy_hold')
+
+
+def print_sweep_summary(statistics):
+    """打印每个除抖窗口在各个抖动场景下的延迟分布(微秒)以及误触发次数"""
+    cycles_per_us = BOARD_FREQ / 1e6
+    print(f"{'config':<20} {'test':<16} {'p50us':>8} {'p95us':>8} {'maxus':>8} {'false':>6} {'missed':>6} {'raw_false':>9}")
+    for config in sorted(statistics, key=config_name):
+        for test, stats in statistics[config].items():
+            latencies = np.array(stats['press_latency_cycles'], dtype=np.float64) / cycles_per_us
+            # 窗口太大时可能所有按键都被漏掉
+            p50, p95, maximum = np.nanpercentile(latencies, [50, 95, 100]) if np.any(~np.isnan(latencies)) \
+                else (np.nan, np.nan, np.nan)
+            print(f"{config_name(config):<20} {test:<16} {p50:>8.1f} {p95:>8.1f} {maximum:>8.1f} "
+                  f"{stats['false_ups'] + stats['false_downs']:>6} "
+                  f"{stats['missed_presses'] + stats['missed_releases']:>6} {stats['raw_false_edges']:>9}")
+
+
+def debounce_counter_width(config):
+    return dict(config.parameters)['COUNTER_WIDTH']
+
+
+def main():
+    proj_path = os.path.dirname(os.path.abspath(__file__))
+
+    source_dirs = [ os.path.join(proj_path, "Debouncer_Probe.v") ]
+    include_dirs = [ os.path.join(proj_path, "../../"), proj_path ]
+    top_level_module = 'Debouncer_Probe'
+
+    matrix = Build_Matrix(top_level_module, source_dirs, os.path.join(proj_path, 'tb_build'), includes=include_dirs)
+    build_dirs = matrix.build_all(expand_matrix(g_parameter_axes))
+    results = matrix.run('tb_Debouncer', build_dirs)
+
+    statistics = load_sweep_statistics(results)
+    print_sweep_summary(statistics)
+
+    # 所有抖动场景下既没有误触发也没有漏掉按键的窗口里，最短的窗口带来的按键延迟最小
+    candidates = [config for config, config_results in results.items()
+                  if all(result.passed for result in config_results)
+                  and len(statistics[config]) == len(config_results)
+                  and all(stats['false_ups'] + stats['false_downs'] == 0 for stats in statistics[config].values())
+                  and all(stats['missed_presses'] + stats['missed_releases'] == 0
+                          for stats in statistics[config].values())]
+    smallest = find_smallest_config(candidates, debounce_counter_width)
+    if smallest is None:
+        print("No debounce window is free of false triggers and missed presses in every bounce profile")
+    else:
+        print(f"Shortest debounce window without false triggers or missed presses: {config_name(smallest)} "
+              f"({(1 << debounce_counter_width(smallest)) / BOARD_FREQ * 1e6:.1f}us at {BOARD_FREQ / 1e6:.0f}MHz)")
+
+
+if __name__ == '__main__':
+    main()
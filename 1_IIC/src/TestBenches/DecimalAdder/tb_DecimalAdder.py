@@ -0,0 +1,65 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import numpy as np
+import cocotb
+from cocotb.runner import get_runner
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../utils/TestBenchUtils'))
+from ExhaustiveCheck import check_exhaustive
+
+g_run_all = False
+
+g_test_case_enable_settings = {
+    'exhaustive': True
+}
+
+
+def reference_decimal_adder(inputs):
+    """
+    向量化的参考模型：和在[0, 19]之内时按十进制拆分成结果与进位，否则与RTL的default分支一致，结果与进位都为0
+    """
+    added = inputs['in_v1'] + inputs['in_v2'] + inputs['in_carry']
+    is_valid = added < 20
+    return {
+        'out_result': np.where(is_valid, added % 10, 0),
+        'out_carry': (is_valid & (added >= 10)).astype(np.int64)
+    }
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['exhaustive'] and not g_run_all)
+async def exhaustive(dut):
+    """
+    测试用例：穷举in_carry、in_v1、in_v2的全部512种组合
+    """
+    mismatches = await check_exhaustive(dut, {'in_carry': 1, 'in_v1': 4, 'in_v2': 4}, reference_decimal_adder)
+    assert mismatches == 0, f"{mismatches} input combinations mismatch, see log"
+
+
+def main():
+    proj_path = os.path.dirname(os.path.abspath(__file__))
+
+    always_run_build_step = True
+    generate_wave = False
+
+    source_dirs = [ os.path.join(proj_path, "../../DecimalAdder.v") ]
+    include_dirs = [ os.path.join(proj_path, "../../") ]
+    build_dir = os.path.join(proj_path, 'tb_build')
+    top_level_module = 'DecimalAdder'
+
+    runner = get_runner('icarus')
+    runner.build(
+        verilog_sources=source_dirs,
+        hdl_toplevel=top_level_module,
+        always=always_run_build_step,
+        waves=generate_wave,
+        build_dir=build_dir,
+        includes=include_dirs,
+        timescale=('1us', '1ns')
+    )
+
+    runner.test(hdl_toplevel=top_level_module, test_module='tb_DecimalAdder,', waves=generate_wave)
+
+
+if __name__ == '__main__':
+    main()
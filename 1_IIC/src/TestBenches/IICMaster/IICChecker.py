@@ -467,7 +467,7 @@ class IIC_Checker():
                 and self._scl_falling_edge_count == 0 \
                 and input_scl == 0 \
                 and super().is_scl_no_change(input_scl) \
-                and super().is_inside_one_fourth_iic_clock_interval
+                and super().is_inside_one_fourth_iic_clock_interval()
         # scl被拉高
         def is_change_to_state_2(self, input_scl):
             return self._scl_rising_edge_count == 1 \
@@ -481,7 +481,7 @@ class IIC_Checker():
                 and self._scl_falling_edge_count == 0 \
                 and input_scl == 1 \
                 and super().is_scl_no_change(input_scl) \
-                and (super().is_inside_two_fourths_iic_clock_interval or super().is_inside_three_fourths_iic_clock_interval())
+                and (super().is_inside_two_fourths_iic_clock_interval() or super().is_inside_three_fourths_iic_clock_interval())
         # scl被拉低
         def is_change_to_state_3(self, input_scl):
             return self._scl_rising_edge_count == 1 \
@@ -550,7 +550,7 @@ def try_to_match_iic_sigs(checkers: list[IIC_Checker.Base_Checker], sigs_of_scl,
     Returns:
         None: 如果没有检查器可以处理当前的scl和sda信号序列
     Raises:
-        一旦其中一个检查器检查失败，将会抛出异常(assert)
+        一旦其中一个检查器检查失败，或者信号序列结束时还有检查器没有完成，将会抛出异常(assert)
     """
     assert len(checkers) and len(sigs_of_scl) and(sigs_of_sda)
     current_checker = checkers.pop(0)
@@ -564,4 +564,6 @@ def try_to_match_iic_sigs(checkers: list[IIC_Checker.Base_Checker], sigs_of_scl,
                 current_checker = checkers.pop(0)
             else:
                 current_checker = None
-        sig_idx = sig_idx + 1
\ No newline at end of file
+        sig_idx = sig_idx + 1
+    # 信号序列提前结束(例如截断或者停在某个阶段)时，剩下的检查器没有机会失败，同样认为不匹配
+    assert current_checker is None, f"trace ended after {sig_idx} ticks while {type(current_checker).__name__} was unfinished"
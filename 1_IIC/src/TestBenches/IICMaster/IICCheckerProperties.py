@@ -0,0 +1,401 @@
+# -*- coding: UTF-8 -*-
+# IICChecker的基于性质的测试：用NumPy批量生成合法的scl/sda序列以及各种破坏之后的序列，
+# 检查检查器接受所有合法的序列、拒绝所有被破坏的序列，不需要仿真器。执行 python IICCheckerProperties.py 即可
+# 指定--engine时，同一批用例同时交给另一个检查实现，确认它和try_to_match_iic_sigs的结论完全一致
+
+import argparse
+import importlib
+import math
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from IICChecker import *
+
+SYMBOL_START = 0
+SYMBOL_STOP = 1
+SYMBOL_REPEAT_START = 2
+SYMBOL_BIT_0 = 3
+SYMBOL_BIT_1 = 4
+SYMBOL_NAMES = ['START', 'STOP', 'REPEAT_START', 'BIT_0', 'BIT_1']
+NUM_SYMBOLS = len(SYMBOL_NAMES)
+
+# 每个符号按四分之一IIC时钟周期给出的(scl, sda)电平，sda为-1表示这四分之一周期内SCL是低电平，sda可以任意变化
+_SYMBOL_QUARTERS = {
+    SYMBOL_START: ([1, 1, 0], [1, 0, 0]),
+    SYMBOL_STOP: ([0, 1, 1], [0, 0, 1]),
+    SYMBOL_REPEAT_START: ([0, 1, 1, 0], [1, 1, 0, 0]),
+    SYMBOL_BIT_0: ([0, 1, 1, 0], [-1, 0, 0, -1]),
+    SYMBOL_BIT_1: ([0, 1, 1, 0], [-1, 1, 1, -1]),
+}
+SYMBOL_LENGTHS = np.array([len(_SYMBOL_QUARTERS[symbol][0]) * ONE_FOURTH_IIC_CLOCK_INTERVAL
+                           for symbol in range(NUM_SYMBOLS)], dtype=np.int64)
+# 查表生成采样：[符号, 符号内的tick]
+_SCL_TABLE = np.zeros((NUM_SYMBOLS, IIC_CLOCK_INTERVAL), dtype=np.int8)
+_SDA_TABLE = np.zeros((NUM_SYMBOLS, IIC_CLOCK_INTERVAL), dtype=np.int8)
+for _symbol, (_scl_quarters, _sda_quarters) in _SYMBOL_QUARTERS.items():
+    _SCL_TABLE[_symbol, :SYMBOL_LENGTHS[_symbol]] = np.repeat(_scl_quarters, ONE_FOURTH_IIC_CLOCK_INTERVAL)
+    _SDA_TABLE[_symbol, :SYMBOL_LENGTHS[_symbol]] = np.repeat(_sda_quarters, ONE_FOURTH_IIC_CLOCK_INTERVAL)
+
+# Bit_Checker按SCL高电平期间SDA的比例(0.98/0.02)判断位的值，高电平的采样中允许这么多个采样和期望的位不一致
+BIT_SDA_TOLERANCE = math.ceil(ONE_HALF_IIC_CLOCK_INTERVAL * 0.02) - 1
+
+# 一个测试用例：symbols是期望的检查器序列，starts是每个符号在采样中的起始位置，expected为True表示检查器应该接受
+Checker_Case = namedtuple('Checker_Case', ['kind', 'detail', 'symbols', 'starts', 'scl', 'sda', 'expected'])
+# 结论和期望不一致的用例，error是检查器抛出的非断言异常(repr)
+Property_Failure = namedtuple('Property_Failure', ['case', 'accepted', 'error'])
+
+
+def make_checkers(symbols):
+    """符号序列对应的检查器列表"""
+    factories = {
+        SYMBOL_START: IIC_Checker.Start_Checker,
+        SYMBOL_STOP: IIC_Checker.Stop_Checker,
+        SYMBOL_REPEAT_START: IIC_Checker.Repeat_Start_Checker,
+        SYMBOL_BIT_0: lambda: IIC_Checker.Bit_Checker(0),
+        SYMBOL_BIT_1: lambda: IIC_Checker.Bit_Checker(1),
+    }
+    return [factories[symbol]() for symbol in symbols]
+
+
+def _edges_of(symbol):
+    """
+    符号内检查器要求必须准确出现在四分之一周期边界上的翻转
+    Returns:
+        [(信号名, 符号内的tick)]，SCL低电平期间可以任意变化的SDA不算
+    """
+    edges = []
+    for line, table in [('scl', _SCL_TABLE), ('sda', _SDA_TABLE)]:
+        levels = table[symbol, :SYMBOL_LENGTHS[symbol]]
+        for tick in np.flatnonzero(levels[1:] != levels[:-1]) + 1:
+            if levels[tick] >= 0 and levels[tick - 1] >= 0:
+                edges.append((line, int(tick)))
+    return edges
+
+
+_SYMBOL_EDGES = [_edges_of(symbol) for symbol in range(NUM_SYMBOLS)]
+# 最后一个翻转之前的采样被删除或者重复时，这个翻转一定会偏离四分之一周期的边界
+_LAST_EDGE = [max(tick for _, tick in edges) for edges in _SYMBOL_EDGES]
+
+
+def random_transaction(rng, max_bytes=3):
+    """一次完整的传输：开始信号、若干字节(8位数据加ACK)、可能出现的重复开始信号、结束信号"""
+    symbols = [SYMBOL_START]
+    for _ in range(int(rng.integers(1, max_bytes + 1))):
+        if len(symbols) > 1 and rng.random() < 0.25:
+            symbols.append(SYMBOL_REPEAT_START)
+        symbols += (SYMBOL_BIT_0 + rng.integers(0, 2, 9)).tolist()
+    symbols.append(SYMBOL_STOP)
+    return symbols
+
+
+def random_windows(rng, num_cases, max_symbols):
+    """
+    从随机传输中截取num_cases段连续的符号，每段1~max_symbols个
+    检查器之间互相独立，截取的片段和完整传输一样是合法的检查器序列，但是更短，每秒可以检查更多用例
+    """
+    stream = []
+    while len(stream) < num_cases * max_symbols:
+        stream += random_transaction(rng)
+    stream = np.array(stream, dtype=np.int64)
+    lengths = rng.integers(1, max_symbols + 1, num_cases)
+    offsets = rng.integers(0, len(stream) - max_symbols, num_cases)
+    return [stream[offset:offset + length] for offset, length in zip(offsets, lengths)]
+
+
+def render_cases(rng, windows):
+    """
+    一次性把所有符号序列转换成scl/sda采样：所有符号拼在一起查表，SCL低电平期间的SDA随机取值
+    Returns:
+        kind为'valid'的Checker_Case列表
+    """
+    flat = np.concatenate(windows)
+    lengths = SYMBOL_LENGTHS[flat]
+    symbol_starts = np.cumsum(lengths) - lengths
+    symbol_of_sample = np.repeat(np.arange(len(flat)), lengths)
+    ticks = np.arange(int(lengths.sum())) - symbol_starts[symbol_of_sample]
+    kinds = flat[symbol_of_sample]
+    scl = _SCL_TABLE[kinds, ticks]
+    sda = _SDA_TABLE[kinds, ticks]
+    sda = np.where(sda < 0, rng.integers(0, 2, len(sda), dtype=np.int8), sda).astype(np.int8)
+
+    cases = []
+    first_symbol = 0
+    for window in windows:
+        last_symbol = first_symbol + len(window)
+        begin = symbol_starts[first_symbol]
+        end = symbol_starts[last_symbol - 1] + lengths[last_symbol - 1]
+        cases.append(Checker_Case('valid', '', window.tolist(), (symbol_starts[first_symbol:last_symbol] - begin).tolist(),
+                                  scl[begin:end], sda[begin:end], True))
+        first_symbol = last_symbol
+    return cases
+
+
+# >>> BEG: 变换，每个变换返回新的用例以及期望的结论，不适用时返回None
+def _pick_symbol(rng, case, allowed=None):
+    candidates = [idx for idx, symbol in enumerate(case.symbols) if allowed is None or symbol in allowed]
+    if len(candidates) == 0:
+        return None
+    return candidates[int(rng.integers(0, len(candidates)))]
+
+
+def _variant(case, kind, detail, expected, scl=None, sda=None, symbols=None):
+    return case._replace(kind=kind, detail=detail, expected=expected,
+                         scl=case.scl if scl is None else scl, sda=case.sda if sda is None else sda,
+                         symbols=case.symbols if symbols is None else symbols)
+
+
+def shift_edge(rng, case):
+    """把某个符号的一次翻转提前或者推迟1~四分之一周期减一个tick"""
+    idx = _pick_symbol(rng, case)
+    symbol = case.symbols[idx]
+    line, tick = _SYMBOL_EDGES[symbol][int(rng.integers(0, len(_SYMBOL_EDGES[symbol])))]
+    shift = int(rng.integers(1, ONE_FOURTH_IIC_CLOCK_INTERVAL)) * (1 if rng.random() < 0.5 else -1)
+    levels = getattr(case, line).copy()
+    edge = case.starts[idx] + tick
+    if shift > 0:
+        levels[edge:edge + shift] = levels[edge - 1]
+    else:
+        levels[edge + shift:edge] = levels[edge]
+    detail = f"{line} edge at tick {tick} of {SYMBOL_NAMES[symbol]}#{idx} shifted by {shift}"
+    return _variant(case, 'shift_edge', detail, False, **{line: levels})
+
+
+def drop_sample(rng, case):
+    """删除某个符号最后一次翻转之前的一个采样"""
+    idx = _pick_symbol(rng, case)
+    position = case.starts[idx] + int(rng.integers(0, _LAST_EDGE[case.symbols[idx]]))
+    detail = f"sample {position} in {SYMBOL_NAMES[case.symbols[idx]]}#{idx} dropped"
+    return _variant(case, 'drop_sample', detail, False, scl=np.delete(case.scl, position), sda=np.delete(case.sda, position))
+
+
+def insert_sample(rng, case):
+    """重复某个符号最后一次翻转之前的一个采样"""
+    idx = _pick_symbol(rng, case)
+    position = case.starts[idx] + int(rng.integers(0, _LAST_EDGE[case.symbols[idx]]))
+    detail = f"sample {position} in {SYMBOL_NAMES[case.symbols[idx]]}#{idx} repeated"
+    return _variant(case, 'insert_sample', detail, False, scl=np.insert(case.scl, position, case.scl[position]),
+                    sda=np.insert(case.sda, position, case.sda[position]))
+
+
+def flip_scl(rng, case):
+    """翻转某个符号内的一段SCL，每个检查器的每个阶段都规定了SCL的电平"""
+    idx = _pick_symbol(rng, case)
+    length = SYMBOL_LENGTHS[case.symbols[idx]]
+    start = int(rng.integers(0, length))
+    end = min(length, start + int(rng.integers(1, ONE_FOURTH_IIC_CLOCK_INTERVAL + 1)))
+    scl = case.scl.copy()
+    scl[case.starts[idx] + start:case.starts[idx] + end] ^= 1
+    detail = f"scl ticks [{start}, {end}) of {SYMBOL_NAMES[case.symbols[idx]]}#{idx} flipped"
+    return _variant(case, 'flip_scl', detail, False, scl=scl)
+
+
+def flip_sda(rng, case):
+    """
+    翻转SDA：开始/结束/重复开始信号的任何位置，或者数据位SCL高电平期间超过容忍数量的采样
+    """
+    idx = _pick_symbol(rng, case)
+    symbol = case.symbols[idx]
+    if symbol in (SYMBOL_BIT_0, SYMBOL_BIT_1):
+        low, high = ONE_FOURTH_IIC_CLOCK_INTERVAL, THREE_FOURTHS_IIC_CLOCK_INTERVAL
+        length = int(rng.integers(BIT_SDA_TOLERANCE + 1, high - low + 1))
+    else:
+        low, high = 0, int(SYMBOL_LENGTHS[symbol])
+        length = int(rng.integers(1, ONE_FOURTH_IIC_CLOCK_INTERVAL + 1))
+    start = int(rng.integers(low, high - min(length, high - low) + 1))
+    end = min(high, start + length)
+    sda = case.sda.copy()
+    sda[case.starts[idx] + start:case.starts[idx] + end] ^= 1
+    detail = f"sda ticks [{start}, {end}) of {SYMBOL_NAMES[symbol]}#{idx} flipped"
+    return _variant(case, 'flip_sda', detail, False, sda=sda)
+
+
+def glitch_bit_sda(rng, case):
+    """数据位SCL高电平期间翻转不超过容忍数量的SDA采样，检查器仍然接受"""
+    idx = _pick_symbol(rng, case, (SYMBOL_BIT_0, SYMBOL_BIT_1))
+    if idx is None or BIT_SDA_TOLERANCE == 0:
+        return None
+    ticks = rng.choice(np.arange(ONE_FOURTH_IIC_CLOCK_INTERVAL, THREE_FOURTHS_IIC_CLOCK_INTERVAL), BIT_SDA_TOLERANCE,
+                       replace=False)
+    sda = case.sda.copy()
+    sda[case.starts[idx] + ticks] ^= 1
+    detail = f"sda ticks {sorted(ticks.tolist())} of {SYMBOL_NAMES[case.symbols[idx]]}#{idx} flipped"
+    return _variant(case, 'glitch_bit_sda', detail, True, sda=sda)
+
+
+def truncate(rng, case):
+    """在某个符号结束之前截断"""
+    idx = _pick_symbol(rng, case)
+    end = case.starts[idx] + int(rng.integers(0, SYMBOL_LENGTHS[case.symbols[idx]]))
+    detail = f"truncated to {end} ticks inside {SYMBOL_NAMES[case.symbols[idx]]}#{idx}"
+    return _variant(case, 'truncate', detail, False, scl=case.scl[:end], sda=case.sda[:end])
+
+
+def append_idle(rng, case):
+    """所有检查器完成之后多出来的采样不影响结论"""
+    length = int(rng.integers(1, IIC_CLOCK_INTERVAL + 1))
+    scl = np.concatenate((case.scl, rng.integers(0, 2, length, dtype=np.int8)))
+    sda = np.concatenate((case.sda, rng.integers(0, 2, length, dtype=np.int8)))
+    return _variant(case, 'append_idle', f"{length} random ticks appended", True, scl=scl, sda=sda)
+
+
+def wrong_checker(rng, case):
+    """波形不变，把某个符号期望的检查器换成其它符号的检查器"""
+    idx = _pick_symbol(rng, case)
+    symbols = list(case.symbols)
+    replacement = int(rng.integers(0, NUM_SYMBOLS - 1))
+    symbols[idx] = replacement if replacement < symbols[idx] else replacement + 1
+    detail = f"{SYMBOL_NAMES[case.symbols[idx]]}#{idx} checked as {SYMBOL_NAMES[symbols[idx]]}"
+    return _variant(case, 'wrong_checker', detail, False, symbols=symbols)
+# <<< END: 变换
+
+
+MUTATIONS = [shift_edge, drop_sample, insert_sample, flip_scl, flip_sda, glitch_bit_sda, truncate, append_idle,
+             wrong_checker]
+
+
+def generate_cases(rng, num_cases, max_symbols=4, valid_fraction=0.25):
+    """
+    生成num_cases个用例：valid_fraction是不做变换的合法序列，其余平均分给各个变换
+    Returns:
+        Checker_Case列表
+    """
+    cases = render_cases(rng, random_windows(rng, num_cases, max_symbols))
+    num_valid = int(num_cases * valid_fraction)
+    for idx in range(num_valid, num_cases):
+        mutated = None
+        while mutated is None:
+            mutated = MUTATIONS[int(rng.integers(0, len(MUTATIONS)))](rng, cases[idx])
+        cases[idx] = mutated
+    return cases
+
+
+def run_case(match_func, case):
+    """
+    Returns:
+        (是否接受, 非断言异常的repr)，异常转换成字符串之后才能从子进程传回来
+    """
+    try:
+        match_func(make_checkers(case.symbols), case.scl.tolist(), case.sda.tolist())
+        return True, None
+    except AssertionError:
+        return False, None
+    except Exception as e:
+        return False, repr(e)
+
+
+def _run_chunk(match_func, cases):
+    return [run_case(match_func, case) for case in cases]
+
+
+def run_cases(match_func, cases, num_workers=1):
+    """
+    parameters:
+        match_func: 用法和try_to_match_iic_sigs一致，num_workers大于1时必须是模块级别的函数
+        num_workers: 大于1时把用例分块交给多个进程检查
+    Returns:
+        和cases一一对应的(是否接受, 非断言异常)列表
+    """
+    if num_workers <= 1:
+        return _run_chunk(match_func, cases)
+    chunk_size = max(1, math.ceil(len(cases) / (num_workers * 4)))
+    chunks = [cases[idx:idx + chunk_size] for idx in range(0, len(cases), chunk_size)]
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        results = executor.map(_run_chunk, [match_func] * len(chunks), chunks)
+        return [result for chunk in results for result in chunk]
+
+
+def check_properties(match_func, cases, num_workers=1):
+    """
+    检查match_func对每个用例的结论是否和期望一致
+    Returns:
+        (Property_Failure列表, 每个用例的结论列表)
+    """
+    results = run_cases(match_func, cases, num_workers)
+    failures = [Property_Failure(case, accepted, error) for case, (accepted, error) in zip(cases, results)
+                if accepted != case.expected or error is not None]
+    return failures, [accepted for accepted, _ in results]
+
+
+def compare_engines(candidate, reference_verdicts, cases, num_workers=1):
+    """
+    把同一批用例交给另一个检查实现，结论必须和参考实现逐个一致(包括参考实现本身判断错误的用例)
+    Returns:
+        结论不一致的Property_Failure列表，用例的expected替换成参考实现的结论，accepted是candidate的结论
+    """
+    results = run_cases(candidate, cases, num_workers)
+    return [Property_Failure(case._replace(expected=reference_accepted), accepted, error)
+            for case, reference_accepted, (accepted, error) in zip(cases, reference_verdicts, results)
+            if accepted != reference_accepted or error is not None]
+
+
+def format_failure(failure):
+    case = failure.case
+    symbols = ' '.join(SYMBOL_NAMES[symbol] for symbol in case.symbols)
+    error = f", raised {failure.error}" if failure.error is not None else ''
+    return (f"{case.kind:<15} expected {'accept' if case.expected else 'reject'}, got "
+            f"{'accept' if failure.accepted else 'reject'}{error}: [{symbols}] {case.detail} ({len(case.scl)} ticks)")
+
+
+def report_failures(title, failures, limit):
+    """每种变换只打印最短的几个反例，Returns: 失败数量"""
+    if len(failures) == 0:
+        print(f"{title}: all passed")
+        return 0
+    print(f"{title}: {len(failures)} failed")
+    for kind in sorted({failure.case.kind for failure in failures}):
+        of_kind = sorted((failure for failure in failures if failure.case.kind == kind), key=lambda f: len(f.case.scl))
+        for failure in of_kind[:limit]:
+            print(f"  {format_failure(failure)}")
+        if len(of_kind) > limit:
+            print(f"  ... {len(of_kind) - limit} more {kind}")
+    return len(failures)
+
+
+def _load_engine(text):
+    """'模块名:函数名'"""
+    module_name, func_name = text.split(':')
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IICChecker的基于性质的测试：合法的序列必须接受，被破坏的序列必须拒绝")
+    parser.add_argument('--cases', type=int, default=5000, help="用例数量")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子，默认每次不同，失败时打印出来用于复现")
+    parser.add_argument('--max-symbols', type=int, default=4, help="每个用例最多包含的符号(开始/结束/重复开始信号以及数据位)数量")
+    parser.add_argument('--engine', default=None, help="另一个检查实现 模块名:函数名，用法和try_to_match_iic_sigs一致")
+    parser.add_argument('--limit', type=int, default=3, help="每种变换最多打印的反例数量")
+    parser.add_argument('--workers', type=int, default=1, help="检查用例的进程数量")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else int(np.random.SeedSequence().entropy % (1 << 32))
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    cases = generate_cases(rng, args.cases, args.max_symbols)
+    generate_time = time.perf_counter() - start
+    kinds = {}
+    for case in cases:
+        kinds[case.kind] = kinds.get(case.kind, 0) + 1
+    print(f"seed={seed}: {len(cases)} cases in {generate_time:.2f}s "
+          f"({', '.join(f'{kind} {count}' for kind, count in sorted(kinds.items()))})")
+
+    start = time.perf_counter()
+    failures, verdicts = check_properties(try_to_match_iic_sigs, cases, args.workers)
+    check_time = time.perf_counter() - start
+    print(f"try_to_match_iic_sigs: {len(cases) / check_time:.0f} cases/s")
+    failed = report_failures('try_to_match_iic_sigs', failures, args.limit)
+
+    if args.engine is not None:
+        candidate = _load_engine(args.engine)
+        start = time.perf_counter()
+        mismatches = compare_engines(candidate, verdicts, cases, args.workers)
+        check_time = time.perf_counter() - start
+        print(f"{args.engine}: {len(cases) / check_time:.0f} cases/s")
+        failed += report_failures(f"{args.engine} vs try_to_match_iic_sigs", mismatches, args.limit)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
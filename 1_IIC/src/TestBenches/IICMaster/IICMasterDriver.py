@@ -0,0 +1,415 @@
+# -*- coding: UTF-8 -*-
+# tb_IICMaster以及tb_IICMasterLanes共用的指令驱动：设置指令、逐时钟周期采集scl/sda并交给IIC检查器
+# 导入时不创建持久化缓存、检查进程等需要清理的对象，其它测试模块可以直接导入
+
+import os
+import random
+import sys
+from cocotb.triggers import RisingEdge
+from IICChecker import *
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../utils/TestBenchUtils'))
+from SignalWait import assert_stable
+from TraceCache import Verification_Cache
+
+# 提前x个时钟周期拉起完成信号
+ENABLE_SIGNAL_PRE_COMPLETED = 3
+
+IIC_INST_UNKNOWN = 0
+IIC_INST_START_TX = IIC_INST_UNKNOWN + 1
+IIC_INST_REPEAT_START_TX = IIC_INST_START_TX + 1
+IIC_INST_STOP_TX = IIC_INST_REPEAT_START_TX + 1
+IIC_INST_RECV_BYTE = IIC_INST_STOP_TX + 1
+IIC_INST_SEND_BYTE = IIC_INST_RECV_BYTE + 1
+
+# 每个测试用例都监视指令衔接处的总线：上一条指令拉起完成信号之后，到下一条指令开始改变总线之前，不允许释放总线或者改变电平
+# 结束信号完成之后释放总线是正常的
+IIC_MASTER_BUS_LINES = {'scl': ('out_scl_out', 'out_scl_is_using'), 'sda': ('out_sda_out', 'out_sda_is_using')}
+
+# 协议检查使用的验证器，用法与Verification_Cache.verify一致
+# 默认只在内存中缓存，tb_IICMaster通过set_iic_verifier换成持久化的缓存或者Trace_Offload
+g_iic_verifier = Verification_Cache()
+
+
+def set_iic_verifier(verifier):
+    global g_iic_verifier
+    g_iic_verifier = verifier
+
+
+# 通用的复位行为
+async def reset_signal(dut):
+    print("Start Rest")
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 1
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 0
+    print("Finish Reset")
+
+
+def check_scl_is_using_as(dut, expect_value):
+    assert dut.out_scl_out.value == expect_value
+    assert dut.out_scl_is_using.value == 1
+
+
+def check_sda_is_using_as(dut, expect_value):
+    assert dut.out_sda_out.value == expect_value
+    assert dut.out_sda_is_using.value == 1
+
+
+def check_sda_is_in_high_resitance_state(dut):
+    assert dut.out_sda_out.value == 'z'
+    assert dut.out_sda_is_using == 0
+
+
+# 所有用例结束时候，期望的结束状态的信号
+def check_end_of_sigs(dut):
+    assert dut.out_sda_out.value == 'z'
+    assert dut.out_sda_is_using == 0
+    assert dut.out_scl_out.value == 'z'
+    assert dut.out_scl_is_using == 0
+
+
+def check_scl_and_sda_is_using_and_not_in_high_resitance_state(dut):
+    assert dut.out_sda_out.value != 'z'
+    assert dut.out_scl_out.value != 'z'
+    assert dut.out_sda_is_using.value == 1
+    assert dut.out_scl_is_using.value == 1
+
+
+def get_bus_handles(dut):
+    return [dut.out_scl_out, dut.out_scl_is_using, dut.out_sda_out, dut.out_sda_is_using]
+
+
+async def expect_scl_with_released_sda(dut, scl_value, cycles):
+    """
+    从当前时钟上升沿开始(包含当前这个)，连续cycles个上升沿上scl都被本器件驱动为scl_value，sda处于高阻抗状态
+    结束时停在这段窗口之后的第一个上升沿上
+    """
+    check_scl_is_using_as(dut, scl_value)
+    check_sda_is_in_high_resitance_state(dut)
+    await assert_stable(get_bus_handles(dut), [scl_value, 1, 'z', 0], cycles - 1, dut.in_clk)
+    await RisingEdge(dut.in_clk)
+
+
+async def receive_signals(dut, scl_out_sigs, sda_out_sigs, timeout=5000, complete_callback=None):
+    iter_count = 0
+    complete_sig_count_down = ENABLE_SIGNAL_PRE_COMPLETED
+    while iter_count < timeout:
+        await RisingEdge(dut.in_clk)
+        if complete_callback is not None and dut.out_is_completed.value == 1:
+            complete_callback()
+        if dut.out_is_completed.value == 1:
+            complete_sig_count_down -= 1
+        check_scl_and_sda_is_using_and_not_in_high_resitance_state(dut)
+        sda_out_sigs.append(int(dut.out_sda_out.value))
+        scl_out_sigs.append(int(dut.out_scl_out.value))
+        iter_count += 1
+        if dut.out_is_completed.value == 1 and complete_sig_count_down == 0:
+            break
+    assert iter_count < 5000
+
+
+async def _impl_start_signal(dut, skip_cmd_setting, in_complete_callback=None):
+    if skip_cmd_setting is False:
+        dut.in_instruction.value = IIC_INST_START_TX
+        dut.in_enable.value = 1
+        await RisingEdge(dut.in_clk)
+    # 一个上升沿后恢复命令
+    dut.in_instruction.value = IIC_INST_UNKNOWN
+    dut.in_enable.value = 0
+    await RisingEdge(dut.in_clk)
+    # 指令配置之后的第一个时钟上升沿，检查scl和sda的初始状态
+    check_scl_is_using_as(dut, 1)
+    check_sda_is_using_as(dut, 1)
+    assert dut.out_is_completed.value == 0
+    
+    sda_out_sigs = [1]
+    scl_out_sigs = [1]
+    await receive_signals(dut, scl_out_sigs, sda_out_sigs, complete_callback=in_complete_callback)
+    
+    g_iic_verifier.verify(try_to_match_iic_sigs, [ IIC_Checker.Start_Checker() ], scl_out_sigs, sda_out_sigs)
+
+
+async def _impl_stop_signal(dut, skip_cmd_setting, in_complete_callback=None):
+    if skip_cmd_setting is False:
+        dut.in_instruction.value = IIC_INST_STOP_TX
+        dut.in_enable.value = 1
+        await RisingEdge(dut.in_clk)
+    # 一个上升沿后恢复命令
+    dut.in_instruction.value = IIC_INST_UNKNOWN
+    dut.in_enable.value = 0
+    await RisingEdge(dut.in_clk)
+    # 指令配置之后的第一个时钟上升沿，检查scl和sda的初始状态
+    check_scl_is_using_as(dut, 0)
+    check_sda_is_using_as(dut, 0)
+    assert dut.out_is_completed.value == 0
+    
+    sda_out_sigs = [0]
+    scl_out_sigs = [0]
+    await receive_signals(dut, scl_out_sigs, sda_out_sigs, complete_callback=in_complete_callback)
+    
+    g_iic_verifier.verify(try_to_match_iic_sigs, [ IIC_Checker.Stop_Checker() ], scl_out_sigs, sda_out_sigs)
+
+
+async def _impl_repeat_start(dut, skip_cmd_setting, in_complete_callback=None):
+    if skip_cmd_setting is False:
+        dut.in_instruction.value = IIC_INST_REPEAT_START_TX
+        dut.in_enable.value = 1
+        await RisingEdge(dut.in_clk)
+    # 一个上升沿后恢复命令
+    dut.in_instruction.value = IIC_INST_UNKNOWN
+    dut.in_enable.value = 0
+    await RisingEdge(dut.in_clk)
+    # 指令配置之后的第一个时钟上升沿，检查scl和sda的初始状态
+    check_scl_is_using_as(dut, 0)
+    check_sda_is_using_as(dut, 1)
+    assert dut.out_is_completed.value == 0
+    
+    sda_out_sigs = [1]
+    scl_out_sigs = [0]
+    await receive_signals(dut, scl_out_sigs, sda_out_sigs, complete_callback=in_complete_callback)
+    
+    g_iic_verifier.verify(try_to_match_iic_sigs, [ IIC_Checker.Repeat_Start_Checker() ], scl_out_sigs, sda_out_sigs)
+
+
+async def _impl_send_byte(dut, byte_to_send, skip_cmd_setting, in_complete_callback=None):
+    if skip_cmd_setting is False:
+        dut.in_instruction.value = IIC_INST_SEND_BYTE
+        dut.in_byte_to_send.value = byte_to_send
+        dut.in_enable.value = 1
+        await RisingEdge(dut.in_clk)
+    # 一个上升沿后恢复命令
+    dut.in_instruction.value = IIC_INST_UNKNOWN
+    dut.in_enable.value = 0
+    await RisingEdge(dut.in_clk)
+    # 指令配置之后的第一个时钟上升沿，检查scl和sda的初始状态
+    check_scl_is_using_as(dut, 0)
+    check_sda_is_using_as(dut, ((byte_to_send >> 7) & 1))
+    assert dut.out_is_completed.value == 0
+
+    sda_out_sigs = [((byte_to_send >> 7) & 1)]
+    scl_out_sigs = [0]
+
+    # 发送一个字节需要8个SCL时钟周期，每个周期单独需要tick 128次，第一个周期提前进行了一次tick所以减一
+    await receive_signals(dut, scl_out_sigs, sda_out_sigs, timeout=128 * 8 - 1)
+    
+    bit_checkers_of_byte_to_send = []
+    for i in range(7, -1, -1):
+        bit_checkers_of_byte_to_send.append(IIC_Checker.Bit_Checker((byte_to_send >> i) & 1))
+
+    g_iic_verifier.verify(try_to_match_iic_sigs, bit_checkers_of_byte_to_send, scl_out_sigs, sda_out_sigs)
+
+    # 开始进入ACK接收状态
+    dut.in_sda_in.value = 1  # 模拟ACK信号为1
+    await assert_stable(get_bus_handles(dut), [0, 1, 'z', 0], 32, dut.in_clk)
+    await assert_stable(get_bus_handles(dut), [1, 1, 'z', 0], 64, dut.in_clk)
+    await assert_stable(get_bus_handles(dut), [0, 1, 'z', 0], 32 - ENABLE_SIGNAL_PRE_COMPLETED, dut.in_clk)
+
+    if ENABLE_SIGNAL_PRE_COMPLETED:
+        for i in range(ENABLE_SIGNAL_PRE_COMPLETED):
+            await RisingEdge(dut.in_clk)
+            # 提前拉起了完成信号
+            assert dut.out_is_completed.value == 1
+            assert dut.out_ack_read.value == 1
+            check_scl_is_using_as(dut, 0)
+            check_sda_is_in_high_resitance_state(dut)
+            if in_complete_callback is not None:
+                in_complete_callback()
+    else:
+        await RisingEdge(dut.in_clk)
+        assert dut.out_is_completed.value == 1
+        assert dut.out_ack_read.value == 1
+
+
+async def _impl_clock_stretching_send_byte(dut, byte_to_send, time_of_stretching):
+    dut.in_instruction.value = IIC_INST_SEND_BYTE
+    dut.in_byte_to_send.value = byte_to_send
+    dut.in_enable.value = 1
+    await RisingEdge(dut.in_clk)
+    # 一个上升沿后恢复命令
+    dut.in_instruction.value = IIC_INST_UNKNOWN
+    dut.in_enable.value = 0
+    await RisingEdge(dut.in_clk)
+    # 指令配置之后的第一个时钟上升沿，检查scl和sda的初始状态
+    check_scl_is_using_as(dut, 0)
+    check_sda_is_using_as(dut, 1)
+    assert dut.out_is_completed.value == 0
+
+    # 模拟时钟拉伸，将scl总线钳制到低电平
+    for _ in range(time_of_stretching):
+        dut.in_scl_in.value = 0
+        await RisingEdge(dut.in_clk)
+        while dut.out_is_clock_stretching.value != 1:
+            await RisingEdge(dut.in_clk)
+    
+    dut.in_scl_in.value = 1  # 恢复SCL总线
+    await RisingEdge(dut.in_clk)
+    assert dut.out_is_clock_stretching.value == 0
+
+    sda_out_sigs = [1]
+    scl_out_sigs = [0]
+
+    # 发送一个字节需要8个SCL时钟周期，每个周期单独需要tick 128次，第一个周期提前进行了一次tick所以减一
+    await receive_signals(dut, scl_out_sigs, sda_out_sigs, timeout=128 * 8 - 1)
+
+    bit_checkers_of_byte_to_send = []
+    for i in range(7, -1, -1):
+        bit_checkers_of_byte_to_send.append(IIC_Checker.Bit_Checker((byte_to_send >> i) & 1))
+
+    g_iic_verifier.verify(try_to_match_iic_sigs, bit_checkers_of_byte_to_send,
+        scl_out_sigs, sda_out_sigs)
+    
+    # 开始进入ACK接收状态
+    await RisingEdge(dut.in_clk)
+    dut.in_sda_in.value = 1  # 模拟ACK信号为1
+    await expect_scl_with_released_sda(dut, 0, 32)
+    await expect_scl_with_released_sda(dut, 1, 64)
+    await expect_scl_with_released_sda(dut, 0, 32)
+    
+    assert dut.out_is_completed.value == 1
+    assert dut.out_ack_read.value == 1
+
+
+async def _impl_receive_byte(dut, byte_to_receive, skip_cmd_setting, in_complete_callback=None):
+    if skip_cmd_setting is False:
+        dut.in_instruction.value = IIC_INST_RECV_BYTE
+        dut.in_enable.value = 1
+        await RisingEdge(dut.in_clk)
+    # 一个上升沿后恢复命令
+    dut.in_instruction.value = IIC_INST_UNKNOWN
+    dut.in_enable.value = 0
+    await RisingEdge(dut.in_clk)
+    # 指令配置之后的第一个时钟上升沿，检查scl和sda的初始状态
+    check_scl_is_using_as(dut, 0)
+    check_sda_is_in_high_resitance_state(dut)
+    assert dut.out_is_completed.value == 0
+
+    # 模拟接收数据，需要监听SCL的状态，以判断输入的SDA的值
+    for i in range(7, -1, -1):
+        await expect_scl_with_released_sda(dut, 0, 32)
+        # 在SCL为高电平时，设置SDA的输入值
+        dut.in_sda_in.value = (byte_to_receive >> i) & 1
+        await expect_scl_with_released_sda(dut, 1, 64)
+        await expect_scl_with_released_sda(dut, 0, 32)
+
+    # 模拟发送ACK信号
+    check_scl_is_using_as(dut, 0)
+    check_sda_is_using_as(dut, 1)
+    sda_out_sigs = [1]
+    scl_out_sigs = [0]
+    
+    await receive_signals(dut, scl_out_sigs, sda_out_sigs, complete_callback=in_complete_callback)
+    assert dut.out_byte_read.value == byte_to_receive
+
+    # 检查ACK输出信号
+    g_iic_verifier.verify(try_to_match_iic_sigs, [ IIC_Checker.Bit_Checker(1) ], scl_out_sigs, sda_out_sigs)
+
+
+async def _impl_clock_stretching_receive_byte(dut, byte_to_receive, clock_stretching_time):
+    dut.in_instruction.value = IIC_INST_RECV_BYTE
+    dut.in_enable.value = 1
+    await RisingEdge(dut.in_clk)
+    # 一个上升沿后恢复命令
+    dut.in_instruction.value = IIC_INST_UNKNOWN
+    dut.in_enable.value = 0
+    await RisingEdge(dut.in_clk)
+    # 指令配置之后的第一个时钟上升沿，检查scl和sda的初始状态
+    check_scl_is_using_as(dut, 0)
+    check_sda_is_in_high_resitance_state(dut)
+    assert dut.out_is_completed.value == 0
+
+    # 模拟时钟拉伸，将scl总线钳制到低电平
+    for _ in range(clock_stretching_time):
+        dut.in_scl_in.value = 0
+        await RisingEdge(dut.in_clk)
+        while dut.out_is_clock_stretching.value != 1:
+            await RisingEdge(dut.in_clk)
+    
+    dut.in_scl_in.value = 1  # 恢复SCL总线
+    await RisingEdge(dut.in_clk)
+    assert dut.out_is_clock_stretching.value == 0
+
+    # 模拟接收数据，需要监听SCL的状态，以判断输入的SDA的值
+    for i in range(7, -1, -1):
+        await expect_scl_with_released_sda(dut, 0, 32)
+        # 在SCL为高电平时，设置SDA的输入值
+        dut.in_sda_in.value = (byte_to_receive >> i) & 1
+        await expect_scl_with_released_sda(dut, 1, 64)
+        await expect_scl_with_released_sda(dut, 0, 32)
+
+    # 模拟发送ACK信号
+    check_scl_is_using_as(dut, 0)
+    check_sda_is_using_as(dut, 1)
+    sda_out_sigs = [1]
+    scl_out_sigs = [0]
+    
+    await receive_signals(dut, scl_out_sigs, sda_out_sigs)
+    assert dut.out_byte_read.value == byte_to_receive
+
+    # 检查ACK输出信号
+    g_iic_verifier.verify(try_to_match_iic_sigs, [ IIC_Checker.Bit_Checker(1) ], scl_out_sigs, sda_out_sigs)
+
+
+def _make_set_instruction_callback(dut, instruction, byte):
+    """生成完成回调：在上一条指令提前拉起完成信号时设置下一条指令，只设置一次"""
+    is_set = False
+    def complete_callback():
+        nonlocal is_set
+        if is_set:
+            return
+        dut.in_enable.value = 1
+        dut.in_instruction.value = instruction
+        if instruction == IIC_INST_SEND_BYTE:
+            dut.in_byte_to_send.value = byte
+        is_set = True
+    return complete_callback
+
+
+async def run_instruction_sequence(dut, sequence):
+    """
+    按顺序执行指令序列，每一条指令在上一条指令的完成回调中设置，和start_send_send_stop等用例的写法一致
+    parameters:
+        sequence: [[指令, 字节], ...]，字节对于IIC_INST_SEND_BYTE是发送的字节，对于IIC_INST_RECV_BYTE是从机返回的字节
+    Raises:
+        指令序列中有不支持的指令时抛出ValueError
+    """
+    for idx, (instruction, byte) in enumerate(sequence):
+        skip_cmd_setting = idx > 0
+        complete_callback = None
+        if idx + 1 < len(sequence):
+            complete_callback = _make_set_instruction_callback(dut, *sequence[idx + 1])
+        if instruction == IIC_INST_START_TX:
+            await _impl_start_signal(dut, skip_cmd_setting, in_complete_callback=complete_callback)
+        elif instruction == IIC_INST_REPEAT_START_TX:
+            await _impl_repeat_start(dut, skip_cmd_setting, in_complete_callback=complete_callback)
+        elif instruction == IIC_INST_STOP_TX:
+            await _impl_stop_signal(dut, skip_cmd_setting, in_complete_callback=complete_callback)
+        elif instruction == IIC_INST_SEND_BYTE:
+            await _impl_send_byte(dut, byte, skip_cmd_setting, in_complete_callback=complete_callback)
+        elif instruction == IIC_INST_RECV_BYTE:
+            await _impl_receive_byte(dut, byte, skip_cmd_setting, in_complete_callback=complete_callback)
+        else:
+            raise ValueError(f"Unsupported instruction {instruction}")
+
+    await RisingEdge(dut.in_clk)
+    if len(sequence) and sequence[-1][0] == IIC_INST_STOP_TX:
+        check_end_of_sigs(dut)
+
+
+# 随机传输中开始信号和停止信号之间可以出现的指令
+IIC_TRANSFER_INSTRUCTIONS = [IIC_INST_SEND_BYTE, IIC_INST_RECV_BYTE, IIC_INST_REPEAT_START_TX]
+
+
+def make_random_instruction_sequence(num_transactions, instructions=IIC_TRANSFER_INSTRUCTIONS):
+    """
+    随机生成num_transactions次完整的传输
+    parameters:
+        instructions: 开始信号和停止信号之间随机选取的指令
+    """
+    sequence = []
+    for _ in range(num_transactions):
+        sequence.append([IIC_INST_START_TX, 0])
+        for _ in range(random.randint(1, 4)):
+            instruction = random.choice(instructions)
+            sequence.append([instruction, random.randint(0, 255)])
+        sequence.append([IIC_INST_STOP_TX, 0])
+    return sequence
@@ -0,0 +1,322 @@
+# -*- coding: UTF-8 -*-
+# IIC_Master.v的逐时钟周期Python模型，配合MockSim在没有仿真器时执行tb_IICMaster中的测试用例
+# 修改IIC_Master.v之后需要同步修改这里，否则两边的行为会不一致
+
+IIC_INST_UNKNOWN = 0
+IIC_INST_START_TX = IIC_INST_UNKNOWN + 1
+IIC_INST_REPEAT_START_TX = IIC_INST_START_TX + 1
+IIC_INST_STOP_TX = IIC_INST_REPEAT_START_TX + 1
+IIC_INST_RECV_BYTE = IIC_INST_STOP_TX + 1
+IIC_INST_SEND_BYTE = IIC_INST_RECV_BYTE + 1
+
+IIC_STATE_IDLE = 0
+IIC_STATE_PRE_SEND_START = IIC_STATE_IDLE + 1
+IIC_STATE_SENDING_START = IIC_STATE_PRE_SEND_START + 1
+IIC_STATE_PRE_SEND_REPEAT_START = IIC_STATE_SENDING_START + 1
+IIC_STATE_SENDING_REPEAT_START = IIC_STATE_PRE_SEND_REPEAT_START + 1
+IIC_STATE_PRE_SEND_STOP = IIC_STATE_SENDING_REPEAT_START + 1
+IIC_STATE_SENDING_STOP = IIC_STATE_PRE_SEND_STOP + 1
+IIC_STATE_PRE_SEND_BYTE = IIC_STATE_SENDING_STOP + 1
+IIC_STATE_SENDING_BYTE = IIC_STATE_PRE_SEND_BYTE + 1
+IIC_STATE_PRE_RECV_BYTE = IIC_STATE_SENDING_BYTE + 1
+IIC_STATE_RECVING_BYTE = IIC_STATE_PRE_RECV_BYTE + 1
+IIC_STATE_SENDING_ACK = IIC_STATE_RECVING_BYTE + 1
+IIC_STATE_RECVING_ACK = IIC_STATE_SENDING_ACK + 1
+IIC_STATE_COMPLETE = IIC_STATE_RECVING_ACK + 1
+
+IIC_PRE_COMPLETE_SIGNAL = 3
+# 7位的时钟分频器：比较时 7'b11_00000 - 3 以及 7'b00_00000 - 3 都按7位回绕
+PRE_COMPLETE_OF_96 = (0b1100000 - IIC_PRE_COMPLETE_SIGNAL) & 0x7F
+PRE_COMPLETE_OF_128 = (0b0000000 - IIC_PRE_COMPLETE_SIGNAL) & 0x7F
+
+_INSTRUCTION_TO_STATE = {
+    IIC_INST_START_TX: IIC_STATE_PRE_SEND_START,
+    IIC_INST_REPEAT_START_TX: IIC_STATE_PRE_SEND_REPEAT_START,
+    IIC_INST_STOP_TX: IIC_STATE_PRE_SEND_STOP,
+    IIC_INST_RECV_BYTE: IIC_STATE_PRE_RECV_BYTE,
+    IIC_INST_SEND_BYTE: IIC_STATE_PRE_SEND_BYTE,
+}
+
+
+def _to_int(binstr):
+    """Returns: 01字符串对应的整数，包含x/z时返回None"""
+    if any(char not in '01' for char in binstr):
+        return None
+    return int(binstr, 2)
+
+
+def _int_to_binstr(value, width):
+    return 'x' * width if value is None else format(value, f'0{width}b')
+
+
+# IIC_Master的寄存器以及组合逻辑。1位的寄存器用'0'/'1'/'x'/'z'表示，多位的寄存器用整数表示，未初始化时是None
+class IIC_Master_Model():
+    clock = 'in_clk'
+    inputs = ('in_clk', 'in_rst', 'in_enable', 'in_byte_to_send', 'in_instruction', 'in_sda_in', 'in_scl_in')
+    ports = {
+        'in_clk': 1, 'in_rst': 1, 'in_enable': 1, 'in_byte_to_send': 8, 'in_instruction': 3,
+        'in_sda_in': 1, 'in_scl_in': 1,
+        'out_byte_read': 8, 'out_ack_read': 1, 'out_sda_out': 1, 'out_scl_out': 1,
+        'out_sda_is_using': 1, 'out_scl_is_using': 1, 'out_is_completed': 1, 'out_is_working': 1,
+        'out_is_clock_stretching': 1,
+        '_r_state': 4, '_r_next_state': 4, '_r_instruction': 3, '_r_clock_Divider': 7,
+        '_r_bit_index_to_process': 4, '_r_byte_to_process': 8, '_r_received_sig_counter': 6,
+    }
+
+    def __init__(self):
+        # 与RTL中的初始值一致，其余寄存器在第一个时钟上升沿之前都是x
+        self.state = IIC_STATE_IDLE
+        self.instruction = None
+        self.bit_index = 0b0111
+        self.byte = None
+        self.divider = 0
+        self.counter = None
+        self.is_completed = 'x'
+        self.is_working = 'x'
+        self.ack_read = 'x'
+        self.sda_is_using = 'x'
+        self.sda_out = 'x'
+        self.scl_is_using = 'x'
+        self.scl_out = 'x'
+
+    def _init_working_vars(self):
+        self.sda_out = 'z'
+        self.scl_out = 'z'
+        self.scl_is_using = '0'
+        self.sda_is_using = '0'
+        self.is_working = '0'
+        self.is_completed = '0'
+        self.divider = 0
+        self.bit_index = 0b0111
+        self.byte = 0
+        self.ack_read = '0'
+        self.counter = 0
+
+    @staticmethod
+    def _output(is_using, value):
+        """out = is_using ? value : 1'bz"""
+        if is_using == '1':
+            return value
+        return 'z' if is_using == '0' else 'x'
+
+    def _is_clock_stretching(self, values):
+        """out_scl_is_using && (out_scl_out == 1) && (in_scl_in == 0)，任何一项为0时结果为0，否则有未知项时为x"""
+        scl_out = self._output(self.scl_is_using, self.scl_out)
+        terms = [self.scl_is_using, scl_out, {'0': '1', '1': '0'}.get(values['in_scl_in'], 'x')]
+        if '0' in terms or 'z' in terms[:2]:
+            return '0'
+        return '1' if all(term == '1' for term in terms) else 'x'
+
+    @staticmethod
+    def _next_state_of(is_enable, instruction):
+        """f_get_next_state_according_to_instruction"""
+        if is_enable and instruction:
+            return _INSTRUCTION_TO_STATE.get(instruction, IIC_STATE_IDLE)
+        return IIC_STATE_IDLE
+
+    def _next_state(self, values):
+        is_enable = values['in_enable'] == '1'
+        instruction = _to_int(values['in_instruction'])
+        chained = self._next_state_of(is_enable, instruction)
+        state = self.state
+        if state == IIC_STATE_IDLE:
+            return chained
+        if state == IIC_STATE_PRE_SEND_START:
+            return IIC_STATE_SENDING_START
+        if state in (IIC_STATE_SENDING_START, IIC_STATE_SENDING_STOP):
+            if self.divider == 0b1100000:
+                return chained if is_enable and instruction else IIC_STATE_COMPLETE
+            return state
+        if state == IIC_STATE_PRE_SEND_REPEAT_START:
+            return IIC_STATE_SENDING_REPEAT_START
+        if state in (IIC_STATE_SENDING_REPEAT_START, IIC_STATE_RECVING_ACK, IIC_STATE_SENDING_ACK):
+            if self.divider == 0:
+                return chained if is_enable and instruction else IIC_STATE_COMPLETE
+            return state
+        if state == IIC_STATE_PRE_SEND_STOP:
+            return IIC_STATE_SENDING_STOP
+        if state == IIC_STATE_PRE_SEND_BYTE:
+            return IIC_STATE_SENDING_BYTE
+        if state == IIC_STATE_SENDING_BYTE:
+            return IIC_STATE_RECVING_ACK if self.divider == 0 and self.bit_index == 0b1111 else state
+        if state == IIC_STATE_PRE_RECV_BYTE:
+            return IIC_STATE_RECVING_BYTE
+        if state == IIC_STATE_RECVING_BYTE:
+            return IIC_STATE_SENDING_ACK if self.divider == 0 and self.bit_index == 0b1111 else state
+        if state == IIC_STATE_COMPLETE:
+            return IIC_STATE_IDLE
+        return state
+
+    def _byte_bit(self, index):
+        if self.byte is None or index > 7:
+            return 'x'
+        return str((self.byte >> index) & 1)
+
+    def _scl_of_bit_phase(self, phase):
+        """发送字节以及发送ACK时每个位的SCL：0~31低，32~95高，96~127低"""
+        return '1' if phase in (1, 2) else '0'
+
+    def on_posedge(self, values):
+        # 所有寄存器都用上升沿之前的值计算，等价于RTL中的非阻塞赋值
+        next_state = self._next_state(values)
+        is_stretching = self._is_clock_stretching(values) == '1'
+        is_reset = values['in_rst'] == '1'
+        if is_reset:
+            self.instruction = 0
+        elif values['in_enable'] == '1':
+            self.instruction = _to_int(values['in_instruction'])
+        old = dict(vars(self))
+        self.state = IIC_STATE_IDLE if is_reset else next_state
+        if is_reset:
+            self._init_working_vars()
+            return
+        divider = old['divider']
+        phase = divider >> 5
+        next_divider = (divider + 1) & 0x7F
+
+        if next_state == IIC_STATE_IDLE:
+            self._init_working_vars()
+        elif next_state in (IIC_STATE_PRE_SEND_START, IIC_STATE_PRE_SEND_REPEAT_START, IIC_STATE_PRE_SEND_STOP):
+            self.is_working = '1'
+            self.is_completed = '0'
+            self.divider = 1
+            self.scl_is_using = '1'
+            self.sda_is_using = '1'
+            self.scl_out, self.sda_out = {
+                IIC_STATE_PRE_SEND_START: ('1', '1'),
+                IIC_STATE_PRE_SEND_REPEAT_START: ('0', '1'),
+                IIC_STATE_PRE_SEND_STOP: ('0', '0'),
+            }[next_state]
+        elif next_state == IIC_STATE_SENDING_START:
+            self._start_bit_cycle(next_divider)
+            if phase == 0:
+                self.scl_out, self.sda_out = '1', '1'
+            elif phase == 1:
+                self.sda_out = '0'
+            elif phase == 2:
+                self.scl_out = '0'
+            self.is_completed = '1' if divider >= PRE_COMPLETE_OF_96 else '0'
+        elif next_state == IIC_STATE_SENDING_REPEAT_START:
+            self._start_bit_cycle(next_divider)
+            self.scl_out, self.sda_out = [('0', '1'), ('1', '1'), ('1', '0'), ('0', '0')][phase]
+            self.is_completed = '1' if divider >= PRE_COMPLETE_OF_128 else '0'
+        elif next_state == IIC_STATE_SENDING_STOP:
+            self._start_bit_cycle(next_divider)
+            if phase == 0:
+                self.scl_out, self.sda_out = '0', '0'
+            elif phase == 1:
+                self.scl_out = '1'
+            elif phase == 2:
+                self.sda_out = '1'
+            self.is_completed = '1' if divider >= PRE_COMPLETE_OF_96 else '0'
+        elif next_state == IIC_STATE_PRE_SEND_BYTE:
+            self.is_working = '1'
+            self.is_completed = '0'
+            self.divider = 1
+            self.scl_is_using = '1'
+            self.sda_is_using = '1'
+            # 未知的位按0处理
+            self.byte = _to_int(values['in_byte_to_send'].replace('x', '0').replace('z', '0'))
+            self.bit_index = 0b0111
+            self.sda_out = str(self.byte >> 7)
+            self.scl_out = '0'
+        elif next_state == IIC_STATE_SENDING_BYTE:
+            self.sda_out = self._byte_bit(old['bit_index'])
+            self._start_bit_cycle(next_divider)
+            self.scl_out = self._scl_of_bit_phase(phase)
+            if is_stretching:
+                self.divider = 1
+                self.scl_out = '0'
+                self.bit_index = 0b0111
+            elif divider == 0x7F:
+                self.bit_index = (old['bit_index'] - 1) & 0xF
+                self.divider = 0
+        elif next_state == IIC_STATE_PRE_RECV_BYTE:
+            self.is_working = '1'
+            self.is_completed = '0'
+            self.scl_is_using = '1'
+            self.sda_is_using = '0'
+            self.divider = 1
+            self.bit_index = 0b0111
+            self.counter = 0
+            self.scl_out = '0'
+        elif next_state in (IIC_STATE_RECVING_BYTE, IIC_STATE_RECVING_ACK):
+            self.scl_is_using = '1'
+            self.sda_is_using = '0'
+            self.is_working = '1'
+            self.divider = next_divider
+            self._receive_phase(values, divider, phase, old['counter'])
+            if next_state == IIC_STATE_RECVING_BYTE:
+                if is_stretching:
+                    self.divider = 1
+                    self.bit_index = 0b0111
+                    self.scl_out = '0'
+                elif divider == 0x7F:
+                    self._set_byte_bit(old['bit_index'], old['counter'])
+                    self.bit_index = (old['bit_index'] - 1) & 0xF
+                    self.divider = 0
+            elif divider >= PRE_COMPLETE_OF_128:
+                self.is_completed = '1'
+                self.ack_read = 'x' if old['counter'] is None else str(old['counter'] >> 5)
+            else:
+                self.is_completed = '0'
+        elif next_state == IIC_STATE_SENDING_ACK:
+            self.scl_is_using = '1'
+            self.sda_is_using = '1'
+            self.is_working = '1'
+            self.divider = next_divider
+            self.sda_out = '0'
+            self.scl_out = self._scl_of_bit_phase(phase)
+            self.is_completed = '1' if divider >= PRE_COMPLETE_OF_128 else '0'
+        elif next_state == IIC_STATE_COMPLETE:
+            self.is_completed = '1'
+            self.is_working = '0'
+            self.scl_is_using = '0'
+            self.sda_is_using = '0'
+            self.divider = 0
+
+    def _start_bit_cycle(self, next_divider):
+        self.is_working = '1'
+        self.divider = next_divider
+        self.scl_is_using = '1'
+        self.sda_is_using = '1'
+
+    def _receive_phase(self, values, divider, phase, counter):
+        """接收字节以及接收ACK：0~31拉低SCL并清零计数器，32~95拉高SCL并统计SDA为1的次数(忽略第32个)，96~127拉低SCL"""
+        if phase == 0:
+            self.counter = 0
+            self.scl_out = '0'
+        elif divider == 0b0100000:
+            self.scl_out = '1'
+        elif phase in (1, 2):
+            self.scl_out = '1'
+            if values['in_sda_in'] == '1' and counter is not None:
+                self.counter = (counter + 1) & 0x3F
+        else:
+            self.scl_out = '0'
+
+    def _set_byte_bit(self, index, counter):
+        if index > 7 or self.byte is None:
+            return
+        bit = 0 if counter is None else counter >> 5
+        self.byte = (self.byte & ~(1 << index)) | (bit << index)
+
+    def evaluate(self, values):
+        return {
+            'out_byte_read': _int_to_binstr(self.byte, 8),
+            'out_ack_read': self.ack_read,
+            'out_sda_out': self._output(self.sda_is_using, self.sda_out),
+            'out_scl_out': self._output(self.scl_is_using, self.scl_out),
+            'out_sda_is_using': self.sda_is_using,
+            'out_scl_is_using': self.scl_is_using,
+            'out_is_completed': self.is_completed,
+            'out_is_working': self.is_working,
+            'out_is_clock_stretching': self._is_clock_stretching(values),
+            '_r_state': _int_to_binstr(self.state, 4),
+            '_r_next_state': _int_to_binstr(self._next_state(values), 4),
+            '_r_instruction': _int_to_binstr(self.instruction, 3),
+            '_r_clock_Divider': _int_to_binstr(self.divider, 7),
+            '_r_bit_index_to_process': _int_to_binstr(self.bit_index, 4),
+            '_r_byte_to_process': _int_to_binstr(self.byte, 8),
+            '_r_received_sig_counter': _int_to_binstr(self.counter, 6),
+        }
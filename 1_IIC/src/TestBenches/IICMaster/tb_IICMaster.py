@@ -1,12 +1,31 @@
+import json
 import os
+import sys
 import cocotb
-from cocotb.clock import Clock
-from cocotb.triggers import FallingEdge, RisingEdge, Timer
+from cocotb.triggers import FallingEdge, First, RisingEdge, Timer
 from cocotb.runner import get_runner
 from IICChecker import *
+from IICMasterModel import IIC_Master_Model
+from IICMasterDriver import *
+from IICMasterDriver import _impl_clock_stretching_receive_byte, _impl_clock_stretching_send_byte, _impl_receive_byte, \
+    _impl_repeat_start, _impl_send_byte, _impl_start_signal, _impl_stop_signal
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../utils/TestBenchUtils'))
+from SignalWait import FastClockCycles, start_clock, wait_cycles_stable
+from TraceCache import Verification_Cache
+from TraceOffload import Trace_Offload, with_offloaded_verdicts
+from GoldenTrace import Golden_Trace_Store, compare_regression_traces, with_bus_trace
+from GlitchDetector import scan_regression_traces
+from BusReleaseMonitor import with_bus_release_monitor
+from OpenDrainBus import Open_Drain_Bus
+from IICTarget import Recording_Target
+from DeltaDebug import Sequence_Reducer, read_failure_signature
+from RegressionRunner import failed_work_items
+from RegressionRunner import Regression_Runner, report_results
+from WorkQueue import run_regression_with_queue
+from MockSim import Mock_Dut, report_mock_results, run_mock_tests
+from WaveDump import WAVE_MODE_FULL, WAVE_MODE_OFF, WAVE_MODE_RING, WAVE_MODE_SCOPED, \
+    prepare_wave_dump, wave_env, wave_plusargs, with_wave_capture
 
-# 提前x个时钟周期拉起完成信号
-ENABLE_SIGNAL_PRE_COMPLETED = 3
 
 ENABLE_DEBUG = False
 def try_debug():
@@ -22,15 +41,69 @@ def try_debug():
     print("Debugger attached, resuming execution...")
 
 
-IIC_INST_UNKNOWN = 0
-IIC_INST_START_TX = IIC_INST_UNKNOWN + 1
-IIC_INST_REPEAT_START_TX = IIC_INST_START_TX + 1
-IIC_INST_STOP_TX = IIC_INST_REPEAT_START_TX + 1
-IIC_INST_RECV_BYTE = IIC_INST_STOP_TX + 1
-IIC_INST_SEND_BYTE = IIC_INST_RECV_BYTE + 1
-
 g_run_all = False
 
+# 为True时不启动仿真器，在MockSim上用Python模型(IICMasterModel.py)执行开启的测试用例，用于快速迭代以及CI冒烟检查
+# 模型只覆盖IIC_Master的端口以及主要的内部寄存器，最终结果以RTL仿真为准
+g_use_mock_dut = False
+
+# 大于0时通过Regression_Runner执行：每个开启的测试用例在独立的进程中执行，按照历史耗时从长到短安排顺序
+g_regression_workers = 0
+# 设置之后回归通过工作队列分发：以.db结尾的是SQLite队列，否则是共享目录上的文件队列
+# 其它机器在同一个共享目录上执行 python utils/TestBenchUtils/WorkQueue.py <队列路径> 即可一起消费
+g_regression_queue_path = None
+
+# 波形模式：off 不记录；scoped 只记录总线以及状态机信号(FST)；full 记录所有信号(FST)；
+# ring 不写波形文件，只在内存中保留最后g_wave_ring_window_us的总线以及状态机信号，测试失败时写出VCD
+g_default_wave_mode = WAVE_MODE_SCOPED
+# 单独指定某些测试用例的波形模式，例如 'start_send_send_stop': WAVE_MODE_RING
+# scoped/full是仿真进程级别的设置，只有通过Regression_Runner执行(每个用例独立进程)时才能按用例区分
+g_wave_mode_settings = {
+}
+g_wave_ring_window_us = 200
+# 回归时先关闭波形执行，只把失败的测试用例(以及随机种子)放到 tb_build_rerun 中打开完整波形和调试日志重新执行
+# 开启后忽略上面的波形模式设置
+g_rerun_failures_with_waves = True
+
+# 验证结果缓存：相同的scl/sda序列配合相同的检查器序列只逐个时钟周期检查一次
+# 结果保存在tb_build中，之后的执行(包括并行回归的其它进程)可以直接复用，检查器的实现修改后自动失效
+g_verification_cache = Verification_Cache(
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tb_build', 'verification_cache.json'))
+# 为True时协议检查在独立的检查进程中执行：仿真进程只把scl/sda的游程记录写入共享内存环形缓冲区，
+# 检查进程取出记录执行IIC检查器，只把结论传回来，多核机器上仿真和检查并行执行
+# 检查失败不会立刻中断测试用例，而是在测试用例结束时统一报告
+g_offload_checking = False
+g_trace_offload = Trace_Offload(cache=g_verification_cache)
+set_iic_verifier(g_trace_offload if g_offload_checking else g_verification_cache)
+
+# scoped/ring模式记录的信号：总线以及状态机相关的信号
+IIC_MASTER_WAVE_SIGNALS = [
+    'in_rst', 'in_enable', 'in_instruction', 'in_byte_to_send',
+    'in_sda_in', 'out_sda_out', 'out_sda_is_using',
+    'in_scl_in', 'out_scl_out', 'out_scl_is_using',
+    'out_byte_read', 'out_ack_read', 'out_is_completed', 'out_is_working', 'out_is_clock_stretching',
+    '_r_state', '_r_next_state', '_r_instruction'
+]
+
+# 每个测试用例都会记录总线信号的游程编码，回归结束后和黄金波形比较，
+# 即使协议检查全部通过，也能发现RTL修改导致的总线波形变化
+IIC_MASTER_TRACE_SIGNALS = ['out_scl_out', 'out_scl_is_using', 'out_sda_out', 'out_sda_is_using']
+g_golden_trace_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden_traces')
+# 确认波形变化符合预期之后，设置为True执行一次回归，用通过的测试单元更新黄金波形
+g_update_golden_traces = False
+# 回归结束后扫描记录的总线信号：短于半个四分之一IIC时钟周期的脉冲，以及开始/结束信号之外SCL高电平期间SDA的翻转
+# 记录的时间单位是step(1ns)，时钟周期是2ns
+IIC_MASTER_QUARTER_TICKS = ONE_FOURTH_IIC_CLOCK_INTERVAL * 2
+
+# random_instruction_sequence用例随机生成的传输次数，每次传输由开始信号、若干字节收发/重复开始信号以及停止信号组成
+g_random_transactions = 4
+# 回归中random_instruction_sequence失败时，自动缩减失败的指令序列，并在当前目录生成可以直接执行的复现用例
+g_reduce_failing_sequences = True
+# 指定random_instruction_sequence执行的指令序列(json)，缩减时通过它传入候选序列
+ENV_IIC_SEQUENCE = 'TB_IIC_SEQUENCE'
+# random_instruction_sequence把实际执行的指令序列写到执行目录下的这个文件中
+SEQUENCE_FILE_NAME = 'instruction_sequence.json'
+
 g_test_case_enable_settings = {
     'idle': False,
     'start': False,
@@ -45,71 +118,25 @@ g_test_case_enable_settings = {
     'start_repeat_start_send_and_stop': False, # 开始信号后再发送开始信号
     'start_receive_stop_start_send_stop': False, # 开始接收停止再开始发送最后停止
     'start_send_send_stop': True,
-    'start_receive_receive_stop': False
+    'start_receive_receive_stop': False,
+    'random_instruction_sequence': False,
+    'bus_write_to_target': True, # 通过开漏总线连接Python从设备，ACK由从设备给出
+    'bus_clock_stretching_by_target': True # 从设备回复地址之后拉低SCL
 }
 
 
-# 通用的复位行为
-async def reset_signal(dut):
-    print("Start Rest")
-    await RisingEdge(dut.in_clk)
-    dut.in_rst.value = 1
-    await RisingEdge(dut.in_clk)
-    dut.in_rst.value = 0
-    print("Finish Reset")
-
-def check_scl_is_using_as(dut, expect_value):
-    assert dut.out_scl_out.value == expect_value
-    assert dut.out_scl_is_using.value == 1
-
-def check_sda_is_using_as(dut, expect_value):
-    assert dut.out_sda_out.value == expect_value
-    assert dut.out_sda_is_using.value == 1
-
-def check_sda_is_in_high_resitance_state(dut):
-    assert dut.out_sda_out.value == 'z'
-    assert dut.out_sda_is_using == 0
-
-# 所有用例结束时候，期望的结束状态的信号
-def check_end_of_sigs(dut):
-    assert dut.out_sda_out.value == 'z'
-    assert dut.out_sda_is_using == 0
-    assert dut.out_scl_out.value == 'z'
-    assert dut.out_scl_is_using == 0
-
-def check_scl_and_sda_is_using_and_not_in_high_resitance_state(dut):
-    assert dut.out_sda_out.value != 'z'
-    assert dut.out_scl_out.value != 'z'
-    assert dut.out_sda_is_using.value == 1
-    assert dut.out_scl_is_using.value == 1
-
-async def receive_signals(dut, scl_out_sigs, sda_out_sigs, timeout=5000, complete_callback=None):
-    iter_count = 0
-    complete_sig_count_down = ENABLE_SIGNAL_PRE_COMPLETED
-    while iter_count < timeout:
-        await RisingEdge(dut.in_clk)
-        if complete_callback is not None and dut.out_is_completed.value == 1:
-            complete_callback()
-        if dut.out_is_completed.value == 1:
-            complete_sig_count_down -= 1
-        check_scl_and_sda_is_using_and_not_in_high_resitance_state(dut)
-        sda_out_sigs.append(int(dut.out_sda_out.value))
-        scl_out_sigs.append(int(dut.out_scl_out.value))
-        iter_count += 1
-        if dut.out_is_completed.value == 1 and complete_sig_count_down == 0:
-            break
-    assert iter_count < 5000
-
-
 @cocotb.test(skip=not g_test_case_enable_settings['idle'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
 async def idle_signal(dut):
     """
     测试用例：用来测试静止状态下的设备输出情况
 
     期望是所有输出都是处于悬空状态
     """
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start())
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     def _assert_im_idle(dut):
@@ -118,32 +145,17 @@ async def idle_signal(dut):
         assert dut.out_scl_out.value == 'z'
         assert dut.out_scl_is_using == 0
     _assert_im_idle(dut)
-    for _ in range(128):
-        await RisingEdge(dut.in_clk)
-        _assert_im_idle(dut)
-
+    # 一次性跳过128个时钟周期，期间输出信号一旦变化就立刻失败
+    await wait_cycles_stable(dut.in_clk,
+        [dut.out_sda_out, dut.out_sda_is_using, dut.out_scl_out, dut.out_scl_is_using], 128)
+    _assert_im_idle(dut)
 
-async def _impl_start_signal(dut, skip_cmd_setting, in_complete_callback=None):
-    if skip_cmd_setting is False:
-        dut.in_instruction.value = IIC_INST_START_TX
-        dut.in_enable.value = 1
-        await RisingEdge(dut.in_clk)
-    # 一个上升沿后恢复命令
-    dut.in_instruction.value = IIC_INST_UNKNOWN
-    dut.in_enable.value = 0
-    await RisingEdge(dut.in_clk)
-    # 指令配置之后的第一个时钟上升沿，检查scl和sda的初始状态
-    check_scl_is_using_as(dut, 1)
-    check_sda_is_using_as(dut, 1)
-    assert dut.out_is_completed.value == 0
-    
-    sda_out_sigs = [1]
-    scl_out_sigs = [1]
-    await receive_signals(dut, scl_out_sigs, sda_out_sigs, complete_callback=in_complete_callback)
-    
-    try_to_match_iic_sigs([ IIC_Checker.Start_Checker() ], scl_out_sigs, sda_out_sigs)
 
 @cocotb.test(skip=not g_test_case_enable_settings['start'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
 async def start_signal(dut):
     """
     测试用例：发送开始信号(标准模式)
@@ -165,8 +177,7 @@ async def start_signal(dut):
     """
     # try_debug()
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     
@@ -179,27 +190,11 @@ async def start_signal(dut):
     check_end_of_sigs(dut)
 
 
-async def _impl_stop_signal(dut, skip_cmd_setting, in_complete_callback=None):
-    if skip_cmd_setting is False:
-        dut.in_instruction.value = IIC_INST_STOP_TX
-        dut.in_enable.value = 1
-        await RisingEdge(dut.in_clk)
-    # 一个上升沿后恢复命令
-    dut.in_instruction.value = IIC_INST_UNKNOWN
-    dut.in_enable.value = 0
-    await RisingEdge(dut.in_clk)
-    # 指令配置之后的第一个时钟上升沿，检查scl和sda的初始状态
-    check_scl_is_using_as(dut, 0)
-    check_sda_is_using_as(dut, 0)
-    assert dut.out_is_completed.value == 0
-    
-    sda_out_sigs = [0]
-    scl_out_sigs = [0]
-    await receive_signals(dut, scl_out_sigs, sda_out_sigs, complete_callback=in_complete_callback)
-    
-    try_to_match_iic_sigs([ IIC_Checker.Stop_Checker() ], scl_out_sigs, sda_out_sigs)
-
 @cocotb.test(skip=not g_test_case_enable_settings['stop'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
 async def stop_signal(dut):
     '''
     测试用例：发送结束信号(标准模式)
@@ -218,8 +213,7 @@ async def stop_signal(dut):
     '''
     # try_debug()
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
 
@@ -233,28 +227,11 @@ async def stop_signal(dut):
     check_end_of_sigs(dut)
 
 
-async def _impl_repeat_start(dut, skip_cmd_setting, in_complete_callback=None):
-    if skip_cmd_setting is False:
-        dut.in_instruction.value = IIC_INST_REPEAT_START_TX
-        dut.in_enable.value = 1
-        await RisingEdge(dut.in_clk)
-    # 一个上升沿后恢复命令
-    dut.in_instruction.value = IIC_INST_UNKNOWN
-    dut.in_enable.value = 0
-    await RisingEdge(dut.in_clk)
-    # 指令配置之后的第一个时钟上升沿，检查scl和sda的初始状态
-    check_scl_is_using_as(dut, 0)
-    check_sda_is_using_as(dut, 1)
-    assert dut.out_is_completed.value == 0
-    
-    sda_out_sigs = [1]
-    scl_out_sigs = [0]
-    await receive_signals(dut, scl_out_sigs, sda_out_sigs, complete_callback=in_complete_callback)
-    
-    try_to_match_iic_sigs([ IIC_Checker.Repeat_Start_Checker() ], scl_out_sigs, sda_out_sigs)
-
-
 @cocotb.test(skip=not g_test_case_enable_settings['repeat_start'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
 async def repeat_start(dut):
     """
     测试用例：发送重复开始信号(标准模式)
@@ -272,8 +249,7 @@ async def repeat_start(dut):
     """
     # try_debug()
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
 
@@ -287,64 +263,11 @@ async def repeat_start(dut):
     check_end_of_sigs(dut)
 
 
-async def _impl_send_byte(dut, byte_to_send, skip_cmd_setting, in_complete_callback=None):
-    if skip_cmd_setting is False:
-        dut.in_instruction.value = IIC_INST_SEND_BYTE
-        dut.in_byte_to_send.value = byte_to_send
-        dut.in_enable.value = 1
-        await RisingEdge(dut.in_clk)
-    # 一个上升沿后恢复命令
-    dut.in_instruction.value = IIC_INST_UNKNOWN
-    dut.in_enable.value = 0
-    await RisingEdge(dut.in_clk)
-    # 指令配置之后的第一个时钟上升沿，检查scl和sda的初始状态
-    check_scl_is_using_as(dut, 0)
-    check_sda_is_using_as(dut, ((byte_to_send >> 7) & 1))
-    assert dut.out_is_completed.value == 0
-
-    sda_out_sigs = [((byte_to_send >> 7) & 1)]
-    scl_out_sigs = [0]
-
-    # 发送一个字节需要8个SCL时钟周期，每个周期单独需要tick 128次，第一个周期提前进行了一次tick所以减一
-    await receive_signals(dut, scl_out_sigs, sda_out_sigs, timeout=128 * 8 - 1)
-    
-    bit_checkers_of_byte_to_send = []
-    for i in range(7, -1, -1):
-        bit_checkers_of_byte_to_send.append(IIC_Checker.Bit_Checker((byte_to_send >> i) & 1))
-
-    try_to_match_iic_sigs(bit_checkers_of_byte_to_send, scl_out_sigs, sda_out_sigs)
-
-    # 开始进入ACK接收状态
-    dut.in_sda_in.value = 1  # 模拟ACK信号为1
-    for _ in range(32):
-        await RisingEdge(dut.in_clk)
-        check_scl_is_using_as(dut, 0)
-        check_sda_is_in_high_resitance_state(dut)
-    for _ in range(64):
-        await RisingEdge(dut.in_clk)
-        check_scl_is_using_as(dut, 1)
-        check_sda_is_in_high_resitance_state(dut)
-    for _ in range(32 - ENABLE_SIGNAL_PRE_COMPLETED):
-        await RisingEdge(dut.in_clk)
-        check_scl_is_using_as(dut, 0)
-        check_sda_is_in_high_resitance_state(dut)
-
-    if ENABLE_SIGNAL_PRE_COMPLETED:
-        for i in range(ENABLE_SIGNAL_PRE_COMPLETED):
-            await RisingEdge(dut.in_clk)
-            # 提前拉起了完成信号
-            assert dut.out_is_completed.value == 1
-            assert dut.out_ack_read.value == 1
-            check_scl_is_using_as(dut, 0)
-            check_sda_is_in_high_resitance_state(dut)
-            if in_complete_callback is not None:
-                in_complete_callback()
-    else:
-        await RisingEdge(dut.in_clk)
-        assert dut.out_is_completed.value == 1
-        assert dut.out_ack_read.value == 1
-
 @cocotb.test(skip=not g_test_case_enable_settings['send_byte'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
 async def send_byte(dut):
     '''
     测试用例：发送一个字节(标准模式)
@@ -352,8 +275,7 @@ async def send_byte(dut):
     预期字节：(MSB) 11011010 (LSB)
     '''
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     try_debug()
@@ -367,66 +289,11 @@ async def send_byte(dut):
     check_end_of_sigs(dut)
 
 
-async def _impl_clock_stretching_send_byte(dut, byte_to_send, time_of_stretching):
-    dut.in_instruction.value = IIC_INST_SEND_BYTE
-    dut.in_byte_to_send.value = byte_to_send
-    dut.in_enable.value = 1
-    await RisingEdge(dut.in_clk)
-    # 一个上升沿后恢复命令
-    dut.in_instruction.value = IIC_INST_UNKNOWN
-    dut.in_enable.value = 0
-    await RisingEdge(dut.in_clk)
-    # 指令配置之后的第一个时钟上升沿，检查scl和sda的初始状态
-    check_scl_is_using_as(dut, 0)
-    check_sda_is_using_as(dut, 1)
-    assert dut.out_is_completed.value == 0
-
-    # 模拟时钟拉伸，将scl总线钳制到低电平
-    for _ in range(time_of_stretching):
-        dut.in_scl_in.value = 0
-        await RisingEdge(dut.in_clk)
-        while dut.out_is_clock_stretching.value != 1:
-            await RisingEdge(dut.in_clk)
-    
-    dut.in_scl_in.value = 1  # 恢复SCL总线
-    await RisingEdge(dut.in_clk)
-    assert dut.out_is_clock_stretching.value == 0
-
-    sda_out_sigs = [1]
-    scl_out_sigs = [0]
-
-    # 发送一个字节需要8个SCL时钟周期，每个周期单独需要tick 128次，第一个周期提前进行了一次tick所以减一
-    await receive_signals(dut, scl_out_sigs, sda_out_sigs, timeout=128 * 8 - 1)
-
-    bit_checkers_of_byte_to_send = []
-    for i in range(7, -1, -1):
-        bit_checkers_of_byte_to_send.append(IIC_Checker.Bit_Checker((byte_to_send >> i) & 1))
-
-    try_to_match_iic_sigs(bit_checkers_of_byte_to_send,
-        scl_out_sigs, sda_out_sigs)
-    
-    # 开始进入ACK接收状态
-    await RisingEdge(dut.in_clk)
-    dut.in_sda_in.value = 1  # 模拟ACK信号为1
-    for _ in range(32):
-        check_scl_is_using_as(dut, 0)
-        check_sda_is_in_high_resitance_state(dut)
-        await RisingEdge(dut.in_clk)
-    for _ in range(64):
-        check_scl_is_using_as(dut, 1)
-        check_sda_is_in_high_resitance_state(dut)
-        await RisingEdge(dut.in_clk)
-    for _ in range(32):
-        check_scl_is_using_as(dut, 0)
-        check_sda_is_in_high_resitance_state(dut)
-        await RisingEdge(dut.in_clk)
-    
-    assert dut.out_is_completed.value == 1
-    assert dut.out_ack_read.value == 1
-
-
-
 @cocotb.test(skip=not g_test_case_enable_settings['clock_stretching_send_byte'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
 async def clock_stretching_send_byte(dut):
     '''
     测试用例：发送一个字节，但是在发送之前遇到了时钟拉伸(标准模式)
@@ -435,8 +302,7 @@ async def clock_stretching_send_byte(dut):
     '''
     # try_debug()
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     
@@ -450,57 +316,11 @@ async def clock_stretching_send_byte(dut):
     check_end_of_sigs(dut)
 
 
-async def _impl_receive_byte(dut, byte_to_receive, skip_cmd_setting, in_complete_callback=None):
-    if skip_cmd_setting is False:
-        dut.in_instruction.value = IIC_INST_RECV_BYTE
-        dut.in_enable.value = 1
-        await RisingEdge(dut.in_clk)
-    # 一个上升沿后恢复命令
-    dut.in_instruction.value = IIC_INST_UNKNOWN
-    dut.in_enable.value = 0
-    await RisingEdge(dut.in_clk)
-    # 指令配置之后的第一个时钟上升沿，检查scl和sda的初始状态
-    check_scl_is_using_as(dut, 0)
-    check_sda_is_in_high_resitance_state(dut)
-    assert dut.out_is_completed.value == 0
-
-    # 模拟接收数据，需要监听SCL的状态，以判断输入的SDA的值
-    for i in range(7, -1, -1):
-        time_scl_in_0 = 0
-        while dut.out_scl_out.value != 1:
-            time_scl_in_0 += 1
-            check_scl_is_using_as(dut, 0)
-            check_sda_is_in_high_resitance_state(dut)
-            await RisingEdge(dut.in_clk)
-        assert time_scl_in_0 == 32
-        # 在SCL为高电平时，设置SDA的输入值
-        time_scl_in_1 = 0
-        while dut.out_scl_out.value != 0:
-            time_scl_in_1 += 1
-            check_scl_is_using_as(dut, 1)
-            check_sda_is_in_high_resitance_state(dut)
-            dut.in_sda_in.value = (byte_to_receive >> i) & 1
-            await RisingEdge(dut.in_clk)
-        assert time_scl_in_1 == 64
-        for _ in range(32):
-            check_scl_is_using_as(dut, 0)
-            check_sda_is_in_high_resitance_state(dut)
-            await RisingEdge(dut.in_clk)
-
-    # 模拟发送ACK信号
-    check_scl_is_using_as(dut, 0)
-    check_sda_is_using_as(dut, 1)
-    sda_out_sigs = [1]
-    scl_out_sigs = [0]
-    
-    await receive_signals(dut, scl_out_sigs, sda_out_sigs, complete_callback=in_complete_callback)
-    assert dut.out_byte_read.value == byte_to_receive
-
-    # 检查ACK输出信号
-    try_to_match_iic_sigs([ IIC_Checker.Bit_Checker(1) ], scl_out_sigs, sda_out_sigs)
-
-
 @cocotb.test(skip=not g_test_case_enable_settings['receive_byte'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
 async def receive_byte(dut):
     '''
     测试用例：模拟接收一个字节(标准模式)
@@ -510,8 +330,7 @@ async def receive_byte(dut):
     byte_to_receive = 0b10011010
     # try_debug()
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
 
@@ -525,66 +344,11 @@ async def receive_byte(dut):
     check_end_of_sigs(dut)
 
 
-async def _impl_clock_stretching_receive_byte(dut, byte_to_receive, clock_stretching_time):
-    dut.in_instruction.value = IIC_INST_RECV_BYTE
-    dut.in_enable.value = 1
-    await RisingEdge(dut.in_clk)
-    # 一个上升沿后恢复命令
-    dut.in_instruction.value = IIC_INST_UNKNOWN
-    dut.in_enable.value = 0
-    await RisingEdge(dut.in_clk)
-    # 指令配置之后的第一个时钟上升沿，检查scl和sda的初始状态
-    check_scl_is_using_as(dut, 0)
-    check_sda_is_in_high_resitance_state(dut)
-    assert dut.out_is_completed.value == 0
-
-    # 模拟时钟拉伸，将scl总线钳制到低电平
-    for _ in range(clock_stretching_time):
-        dut.in_scl_in.value = 0
-        await RisingEdge(dut.in_clk)
-        while dut.out_is_clock_stretching.value != 1:
-            await RisingEdge(dut.in_clk)
-    
-    dut.in_scl_in.value = 1  # 恢复SCL总线
-    await RisingEdge(dut.in_clk)
-    assert dut.out_is_clock_stretching.value == 0
-
-    # 模拟接收数据，需要监听SCL的状态，以判断输入的SDA的值
-    for i in range(7, -1, -1):
-        time_scl_in_0 = 0
-        while dut.out_scl_out.value != 1:
-            time_scl_in_0 += 1
-            check_scl_is_using_as(dut, 0)
-            check_sda_is_in_high_resitance_state(dut)
-            await RisingEdge(dut.in_clk)
-        assert time_scl_in_0 == 32
-        # 在SCL为高电平时，设置SDA的输入值
-        time_scl_in_1 = 0
-        while dut.out_scl_out.value != 0:
-            time_scl_in_1 += 1
-            check_scl_is_using_as(dut, 1)
-            check_sda_is_in_high_resitance_state(dut)
-            dut.in_sda_in.value = (byte_to_receive >> i) & 1
-            await RisingEdge(dut.in_clk)
-        assert time_scl_in_1 == 64
-        for _ in range(32):
-            check_scl_is_using_as(dut, 0)
-            check_sda_is_in_high_resitance_state(dut)
-            await RisingEdge(dut.in_clk)
-
-    # 模拟发送ACK信号
-    check_scl_is_using_as(dut, 0)
-    check_sda_is_using_as(dut, 1)
-    sda_out_sigs = [1]
-    scl_out_sigs = [0]
-    
-    await receive_signals(dut, scl_out_sigs, sda_out_sigs)
-    assert dut.out_byte_read.value == byte_to_receive
-
-    # 检查ACK输出信号
-    try_to_match_iic_sigs([ IIC_Checker.Bit_Checker(1) ], scl_out_sigs, sda_out_sigs)
-
 @cocotb.test(skip=not g_test_case_enable_settings['clock_stretching_receive_byte'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
 async def clock_stretching_receive_byte(dut):
     '''
     测试用例：模拟接收一个字节，但是在接收之前遇到了时钟拉伸(标准模式)
@@ -594,8 +358,7 @@ async def clock_stretching_receive_byte(dut):
     byte_to_receive = 0b10011010
     # try_debug()
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     
@@ -610,6 +373,10 @@ async def clock_stretching_receive_byte(dut):
 
 
 @cocotb.test(skip=not g_test_case_enable_settings['complete_send_and_receive'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
 async def complete_send_and_receive(dut):
     '''
     测试用例：完整地进行一次发送和接收字节流程，包括发送开始和结束信号
@@ -618,8 +385,7 @@ async def complete_send_and_receive(dut):
     byte_to_receive = 0b10011010
     # try_debug()
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
 
@@ -664,6 +430,10 @@ async def complete_send_and_receive(dut):
     check_end_of_sigs(dut)
 
 @cocotb.test(skip=not g_test_case_enable_settings['complete_receive_and_send'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
 async def complete_receive_and_send(dut):
     '''
     测试用例：完整地进行一次发送和接收字节流程，包括发送开始和结束信号
@@ -672,8 +442,7 @@ async def complete_receive_and_send(dut):
     byte_to_receive = 0b10011010
     # try_debug()
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
 
@@ -718,11 +487,14 @@ async def complete_receive_and_send(dut):
     check_end_of_sigs(dut)
 
 @cocotb.test(skip=not g_test_case_enable_settings['start_repeat_start_send_and_stop'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
 async def start_repeat_start_send_and_stop(dut):
 
     byte_to_send = 0b11000101
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
 
@@ -768,12 +540,15 @@ async def start_repeat_start_send_and_stop(dut):
 
 
 @cocotb.test(skip=not g_test_case_enable_settings['start_receive_stop_start_send_stop'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
 async def start_receive_stop_start_send_stop(dut):
 
     byte_to_send = 0b11000101
     byte_to_receive = 0b10011010
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
 
@@ -837,6 +612,10 @@ async def start_receive_stop_start_send_stop(dut):
 
 
 @cocotb.test(skip=not g_test_case_enable_settings['start_send_send_stop'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
 async def start_send_send_stop(dut):
     '''
     测试用例：完整地进行一次发送和接收字节流程，包括发送开始和结束信号
@@ -844,8 +623,7 @@ async def start_send_send_stop(dut):
     byte_to_send = 0b11000101
     # try_debug()
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
 
@@ -891,6 +669,10 @@ async def start_send_send_stop(dut):
 
 
 @cocotb.test(skip=not g_test_case_enable_settings['start_receive_receive_stop'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
 async def start_receive_receive_stop(dut):
     '''
     测试用例：完整地进行一次发送和接收字节流程，包括发送开始和结束信号
@@ -898,8 +680,7 @@ async def start_receive_receive_stop(dut):
     byte_to_receive = 0b10011010
     # try_debug()
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
 
@@ -943,11 +724,241 @@ async def start_receive_receive_stop(dut):
     check_end_of_sigs(dut)
 
 
+# 通过开漏总线连接的从设备地址，另外还有一个地址不同的从设备一直挂在总线上
+BUS_TARGET_ADDRESS = 0x3C
+BUS_BYSTANDER_ADDRESS = 0x3D
+
+
+# 回复地址的ACK之后继续拉低SCL一段时间(例如准备数据)，模拟从设备的时钟拉伸
+class Stretching_Target(Recording_Target):
+    def __init__(self, scl, sda, sda_pull_low, scl_pull_low, address, stretch_ns):
+        super().__init__(scl, sda, sda_pull_low, address)
+        self._scl_pull_low = scl_pull_low
+        self._stretch_ns = stretch_ns
+        self._is_stretch_pending = False
+        self.stretches = 0
+
+    def on_address(self, address, is_read):
+        is_ack = super().on_address(address, is_read)
+        self._is_stretch_pending = is_ack and self._stretch_ns > 0
+        return is_ack
+
+    async def _send_ack(self, is_ack):
+        await super()._send_ack(is_ack)
+        if not self._is_stretch_pending:
+            return
+        self._is_stretch_pending = False
+        # ACK的SCL下降沿之后主机还没有开始下一位，此时拉低SCL
+        self._scl_pull_low.value = 1
+        await Timer(self._stretch_ns, units='ns')
+        self._scl_pull_low.value = 0
+        self.stretches += 1
+
+
+async def _bus_execute(dut, instruction, byte=0, timeout=128 * 12):
+    """
+    设置一条指令并等待完成信号。完成信号是提前拉起的，返回之后立刻设置下一条指令就是指令衔接
+    parameters:
+        timeout: 最多等待的时钟周期数
+    """
+    dut.in_instruction.value = instruction
+    dut.in_byte_to_send.value = byte
+    dut.in_enable.value = 1
+    # 衔接时上一条指令的分频器走完之后才会接收新指令，一直保持到主机开始执行新指令(正在工作并且完成信号被清零)
+    for _ in range(timeout):
+        await RisingEdge(dut.in_clk)
+        if dut.out_is_working.value == 1 and dut.out_is_completed.value == 0:
+            break
+    dut.in_instruction.value = IIC_INST_UNKNOWN
+    dut.in_enable.value = 0
+    completed = RisingEdge(dut.out_is_completed)
+    fired = await First(completed, Timer(timeout * 2, units='ns'))
+    assert fired is completed, f"instruction {instruction} did not complete in {timeout} cycles"
+
+
+async def _count_stretching_cycles(dut, counter):
+    """
+    统计时钟上升沿上主机处于时钟拉伸的周期数
+    out_is_clock_stretching是组合逻辑，主机释放SCL之后到总线电平写回in_scl_in之前会有零宽度的脉冲，因此不能直接统计它的上升沿
+    """
+    while True:
+        await RisingEdge(dut.in_clk)
+        if dut.out_is_clock_stretching.value == 1:
+            counter[0] += 1
+
+
+async def _impl_bus_write_to_target(dut, data, stretch_ns):
+    """
+    主机的scl/sda输入不再由测试代码直接设置，而是由开漏总线根据主机和从设备的驱动计算得到
+    向从设备写入data：开始信号、地址、数据、结束信号，检查从设备收到的数据以及主机读到的ACK
+    """
+    await start_clock(dut.in_clk, 2, units='ns')
+    await reset_signal(dut)
+
+    bus = Open_Drain_Bus()
+    bus.add_iic_master('master', dut)
+    target = Stretching_Target(dut.in_scl_in, dut.in_sda_in, bus.sda.add_driver('target'), bus.scl.add_driver('target'),
+                               BUS_TARGET_ADDRESS, stretch_ns)
+    bystander = Recording_Target(dut.in_scl_in, dut.in_sda_in, bus.sda.add_driver('bystander'), BUS_BYSTANDER_ADDRESS)
+    stretching_cycles = [0]
+    stretching_monitor = cocotb.start_soon(_count_stretching_cycles(dut, stretching_cycles))
+    bus.start()
+    target.start()
+    bystander.start()
+    try:
+        await _bus_execute(dut, IIC_INST_START_TX)
+        await _bus_execute(dut, IIC_INST_SEND_BYTE, BUS_TARGET_ADDRESS << 1, timeout=128 * 12 + stretch_ns // 2)
+        assert dut.out_ack_read.value == 0, "target did not ACK its address"
+        for byte in data:
+            await _bus_execute(dut, IIC_INST_SEND_BYTE, byte)
+            assert dut.out_ack_read.value == 0, f"target did not ACK byte {byte:#04x}"
+        await _bus_execute(dut, IIC_INST_STOP_TX)
+        # 完成信号提前拉起，等结束信号真正出现在总线上
+        await FastClockCycles(dut.in_clk, 128)
+        check_end_of_sigs(dut)
+    finally:
+        stretching_monitor.kill()
+        target.stop()
+        bystander.stop()
+        bus.stop()
+    bus.report(dut._log)
+
+    assert len(target.transactions) == 1, f"target recorded {target.transactions}"
+    transaction = target.transactions[0]
+    assert transaction.address == BUS_TARGET_ADDRESS and not transaction.is_read
+    assert transaction.data == bytes(data), f"target received {transaction.data.hex()}, expected {bytes(data).hex()}"
+    assert len(bystander.transactions) == 0
+    return target, stretching_cycles[0]
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['bus_write_to_target'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
+async def bus_write_to_target(dut):
+    '''
+    测试用例：主机通过开漏总线向Python从设备写入两个字节
+    预期：从设备收到地址和数据并回复ACK，主机读到的ACK为0，地址不同的从设备不响应
+    '''
+    _, stretching_cycles = await _impl_bus_write_to_target(dut, [0b11001010, 0x5A], stretch_ns=0)
+    assert stretching_cycles == 0
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['bus_clock_stretching_by_target'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
+async def bus_clock_stretching_by_target(dut):
+    '''
+    测试用例：从设备回复地址的ACK之后拉低SCL三个IIC时钟周期
+    预期：主机检测到时钟拉伸并等待，拉伸结束后继续发送，数据不受影响
+    '''
+    target, stretching_cycles = await _impl_bus_write_to_target(dut, [0b11001010, 0x5A], stretch_ns=128 * 2 * 3)
+    assert target.stretches == 1
+    assert stretching_cycles > 0, "master never saw the stretched SCL"
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['random_instruction_sequence'] and not g_run_all)
+@with_wave_capture(IIC_MASTER_WAVE_SIGNALS)
+@with_bus_trace(IIC_MASTER_TRACE_SIGNALS)
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+@with_offloaded_verdicts(g_trace_offload)
+async def random_instruction_sequence(dut):
+    '''
+    测试用例：执行一段随机的指令序列，设置了TB_IIC_SEQUENCE时执行指定的指令序列
+    实际执行的指令序列会写到执行目录下，失败时可以用来缩减出最小的复现用例
+    '''
+    if ENV_IIC_SEQUENCE in os.environ:
+        sequence = json.loads(os.environ[ENV_IIC_SEQUENCE])
+    else:
+        sequence = make_random_instruction_sequence(g_random_transactions)
+    with open(SEQUENCE_FILE_NAME, 'w') as f:
+        json.dump(sequence, f)
+
+    await start_clock(dut.in_clk, 2, units='ns')
+    await reset_signal(dut)
+    await run_instruction_sequence(dut, sequence)
+
+
+REPRODUCER_TEMPLATE = '''# -*- coding: UTF-8 -*-
+# 根据 {test} (seed={seed}) 的失败自动缩减得到的最小复现用例，执行 python {module}.py 即可复现
+
+import os
+import cocotb
+from cocotb.runner import get_runner
+from IICMasterDriver import reset_signal, run_instruction_sequence
+from SignalWait import start_clock
+
+MINIMAL_SEQUENCE = {sequence}
+
+
+@cocotb.test()
+async def {module}(dut):
+    await start_clock(dut.in_clk, 2, units='ns')
+    await reset_signal(dut)
+    await run_instruction_sequence(dut, MINIMAL_SEQUENCE)
+
+
+def main():
+    proj_path = os.path.dirname(os.path.abspath(__file__))
+    build_dir = os.path.join(proj_path, 'tb_build')
+    runner = get_runner('icarus')
+    runner.build(
+        verilog_sources=[ os.path.join(proj_path, "../../IIC_Master.v") ],
+        hdl_toplevel='IIC_Master',
+        always=True,
+        build_dir=build_dir,
+        includes=[ os.path.join(proj_path, "../../") ],
+        defines={{'DEBUG_TEST_BENCH': '1'}},
+        timescale=('1us', '1ns')
+    )
+    runner.test(hdl_toplevel='IIC_Master', test_module='{module},')
+
+
+if __name__ == '__main__':
+    main()
+'''
+
+
+def make_mock_dut(simulator):
+    """MockSim使用的dut：信号名以及取值和RTL仿真时的dut一致"""
+    return Mock_Dut(simulator, 'IIC_Master', IIC_Master_Model())
+
+
+def reduce_failed_sequences(regression, results):
+    """
+    缩减回归中失败的random_instruction_sequence的指令序列，在当前目录生成 repro_<用例名>_<随机种子>.py
+    Returns:
+        生成的复现用例文件路径列表
+    """
+    proj_path = os.path.dirname(os.path.abspath(__file__))
+    failed = [r for r in results if not r.passed and r.test == 'random_instruction_sequence']
+    paths = []
+    for result, item in zip(failed, failed_work_items(failed)):
+        sequence_path = os.path.join(result.test_dir, SEQUENCE_FILE_NAME)
+        if not os.path.isfile(sequence_path):
+            continue
+        with open(sequence_path) as f:
+            sequence = json.load(f)
+        reducer = Sequence_Reducer(regression, item.test, item.seed, ENV_IIC_SEQUENCE,
+                                   read_failure_signature(result.test_dir))
+        minimal_sequence = reducer.reduce(sequence)
+        module = f"repro_{item.test}_{item.seed}"
+        path = os.path.join(proj_path, f"{module}.py")
+        with open(path, 'w') as f:
+            f.write(REPRODUCER_TEMPLATE.format(test=item.test, seed=item.seed, module=module,
+                                               sequence=json.dumps(minimal_sequence)))
+        print(f"Reproducer written to {path}")
+        paths.append(path)
+    return paths
+
+
 def main():
     proj_path = os.path.dirname(os.path.abspath(__file__))
 
     always_run_build_step = True
-    generate_wave = True
 
     source_dirs = [ os.path.join(proj_path, "../../IIC_Master.v") ]
     include_dirs = [ os.path.join(proj_path, "../../") ]
@@ -955,19 +966,71 @@ def main():
     pre_defines = {'DEBUG_TEST_BENCH': '1'}
     top_level_module = 'IIC_Master'
 
+    if g_use_mock_dut:
+        results = run_mock_tests(sys.modules[__name__], make_mock_dut, work_dir=os.path.join(proj_path, 'tb_build_mock'))
+        if report_mock_results(results) > 0:
+            sys.exit(1)
+        return
+
+    if g_regression_workers > 0:
+        regression = Regression_Runner(
+            test_module='tb_IICMaster',
+            hdl_toplevel=top_level_module,
+            verilog_sources=source_dirs,
+            build_dir=build_dir,
+            includes=include_dirs,
+            defines=pre_defines,
+            num_workers=g_regression_workers,
+            db_path=os.path.join(proj_path, 'test_durations.db'),
+            wave_signals=IIC_MASTER_WAVE_SIGNALS
+        )
+        regression.build()
+        wave_settings = {
+            'wave_mode': g_default_wave_mode,
+            'wave_modes': g_wave_mode_settings,
+            'ring_window_us': g_wave_ring_window_us
+        }
+        if g_rerun_failures_with_waves:
+            wave_settings = {'wave_mode': WAVE_MODE_OFF}
+        if g_regression_queue_path is not None:
+            results, _ = run_regression_with_queue(regression, g_regression_queue_path, regression.make_work_items(),
+                                                   **wave_settings)
+        else:
+            results = regression.run(regression.make_work_items(), **wave_settings)
+        changed_traces = compare_regression_traces(Golden_Trace_Store(g_golden_trace_dir), 'tb_IICMaster', results,
+                                                   update=g_update_golden_traces)
+        scan_regression_traces(results, ('out_scl_out', 'out_scl_is_using'), ('out_sda_out', 'out_sda_is_using'),
+                               IIC_MASTER_QUARTER_TICKS)
+        if g_reduce_failing_sequences:
+            reduce_failed_sequences(regression, results)
+        rerun_results = []
+        if g_rerun_failures_with_waves:
+            rerun_results = regression.rerun_failures(results)
+        # 测试失败以及总线波形和黄金波形不一致都会让回归以非零状态退出
+        if report_results(results, rerun_results) > 0 or changed_traces > 0:
+            sys.exit(1)
+        return
+
+    # 波形记录模块和被测模块一起编译，记录哪些信号由仿真时的plusargs决定
+    dump_sources, dump_build_args = prepare_wave_dump(build_dir, top_level_module, IIC_MASTER_WAVE_SIGNALS)
     runner = get_runner('icarus')
     runner.build(
-        verilog_sources=source_dirs,
+        verilog_sources=source_dirs + dump_sources,
         hdl_toplevel=top_level_module,
         always=always_run_build_step,
-        waves=generate_wave,
         build_dir=build_dir,
+        build_args=dump_build_args,
         includes=include_dirs,
         defines=pre_defines,
         timescale=('1us', '1ns')
     )
 
-    runner.test(hdl_toplevel=top_level_module, test_module='tb_IICMaster,', waves=generate_wave)
+    runner.test(
+        hdl_toplevel=top_level_module,
+        test_module='tb_IICMaster,',
+        plusargs=wave_plusargs(g_default_wave_mode, os.path.join(build_dir, f"{top_level_module}.fst")),
+        extra_env=wave_env(g_default_wave_mode, build_dir, g_wave_mode_settings, g_wave_ring_window_us)
+    )
 
 
 if __name__ == '__main__':
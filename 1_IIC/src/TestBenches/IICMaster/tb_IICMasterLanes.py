@@ -0,0 +1,89 @@
+# -*- coding: UTF-8 -*-
+# 在同一次仿真中并行执行多个IIC_Master通道：每个通道是一个独立的IIC_Master，所有通道共用时钟，
+# 仿真器每个时间步的固定开销由所有通道分摊。执行 python tb_IICMasterLanes.py 即可
+
+import json
+import os
+import sys
+import cocotb
+from cocotb.runner import get_runner
+from IICMasterDriver import IIC_INST_RECV_BYTE, IIC_INST_STOP_TX, IIC_MASTER_BUS_LINES, IIC_TRANSFER_INSTRUCTIONS, \
+    make_random_instruction_sequence, reset_signal, run_instruction_sequence
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../utils/TestBenchUtils'))
+from SignalWait import start_clock
+from BusReleaseMonitor import with_bus_release_monitor
+from MultiLane import Lane_Scheduler, write_lane_wrapper
+
+# 生成的顶层模块中的通道数量
+g_num_lanes = 8
+# 随机指令序列的数量，每个通道空闲时取下一个序列，序列数量多于通道数量时各通道的负载更均衡
+g_num_sequences = 32
+# 每个指令序列中的传输次数
+g_random_transactions = 4
+# 通道上的随机序列不包含接收字节：接收字节的用例期望主机回复ACK时SDA为1，而IIC_Master.v驱动0，
+# 和tb_IICMaster中关闭receive_byte/random_instruction_sequence的原因相同，修正ACK的期望之后再加回来
+g_lane_instructions = [instruction for instruction in IIC_TRANSFER_INSTRUCTIONS if instruction != IIC_INST_RECV_BYTE]
+
+# 每个工作项的执行结果写到执行目录下的这个文件中
+LANE_RESULTS_FILE_NAME = 'lane_results.json'
+
+g_run_all = False
+
+g_test_case_enable_settings = {
+    'random_sequences_on_lanes': True
+}
+
+
+@with_bus_release_monitor(IIC_MASTER_BUS_LINES, allowed_release_instructions=[IIC_INST_STOP_TX])
+async def run_sequence_on_lane(lane, sequence):
+    """在一个通道上执行一个指令序列，每个序列之前单独复位这个通道"""
+    await reset_signal(lane)
+    await run_instruction_sequence(lane, sequence)
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['random_sequences_on_lanes'] and not g_run_all)
+async def random_sequences_on_lanes(dut):
+    '''
+    测试用例：把g_num_sequences个随机指令序列分给所有通道执行，和random_instruction_sequence的检查完全一致
+    每个序列的结果(通道、是否通过、错误信息、仿真时间)写到执行目录下，失败时可以把序列交给tb_IICMaster复现
+    '''
+    sequences = [make_random_instruction_sequence(g_random_transactions, g_lane_instructions)
+                 for _ in range(g_num_sequences)]
+
+    await start_clock(dut.in_clk, 2, units='ns')
+    scheduler = Lane_Scheduler(dut)
+    results = await scheduler.run(sequences, run_sequence_on_lane)
+    scheduler.report(dut._log)
+
+    with open(LANE_RESULTS_FILE_NAME, 'w') as f:
+        json.dump([dict(result._asdict(), sequence=sequence) for result, sequence in zip(results, sequences)], f, indent=2)
+    failed = [result for result in results if not result.passed]
+    assert len(failed) == 0, f"{len(failed)} of {len(results)} sequences failed, first on lane {failed[0].lane}: {failed[0].error}"
+
+
+def main():
+    proj_path = os.path.dirname(os.path.abspath(__file__))
+    # 所有通道的完整波形很大，需要时再打开
+    generate_wave = False
+
+    source_path = os.path.join(proj_path, "../../IIC_Master.v")
+    include_dirs = [ os.path.join(proj_path, "../../") ]
+    build_dir = os.path.join(proj_path, 'tb_build_lanes')
+    wrapper_path, top_level_module = write_lane_wrapper(build_dir, source_path, 'IIC_Master', g_num_lanes)
+
+    runner = get_runner('icarus')
+    runner.build(
+        verilog_sources=[ wrapper_path ],
+        hdl_toplevel=top_level_module,
+        always=True,
+        waves=generate_wave,
+        build_dir=build_dir,
+        includes=include_dirs,
+        defines={'DEBUG_TEST_BENCH': '1'},
+        timescale=('1us', '1ns')
+    )
+    runner.test(hdl_toplevel=top_level_module, test_module='tb_IICMasterLanes,', waves=generate_wave)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,11 @@
 import os
+import sys
 import cocotb
-from cocotb.clock import Clock
 from cocotb.triggers import FallingEdge, RisingEdge, Timer
 from cocotb.runner import get_runner
 from IICChecker import *
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../utils/TestBenchUtils'))
+from SignalWait import FastClockCycles, start_clock
 
 
 ENABLE_DEBUG = False
@@ -64,15 +66,13 @@ def check_scl_and_sda_is_using_and_not_in_high_resitance_state(dut):
 
 @cocotb.test(skip=not g_test_case_enable_settings['idle'] and not g_run_all)
 async def idle_signal(dut):
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start())
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     dut.in_trigger.value =1
     await RisingEdge(dut.in_clk)
     dut.in_trigger.value = 0
-    for _ in range(1024 * 3):
-        await RisingEdge(dut.in_clk)
+    await FastClockCycles(dut.in_clk, 1024 * 3)
 
 
 def main():
@@ -1,11 +1,14 @@
 # -*- coding: UTF-8 -*-
 
 import os
+import sys
 import cocotb
-from cocotb.clock import Clock
 from cocotb.triggers import FallingEdge, RisingEdge, Timer
 from cocotb.runner import get_runner
 from IICChecker import *
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../utils/TestBenchUtils'))
+from SignalWait import FastClockCycles, start_clock, wait_cycles_stable
+from TraceCache import Verification_Cache
 
 
 ENABLE_DEBUG = True
@@ -28,6 +31,11 @@ IIC_META_INST_SEND_BIT = 2
 IIC_META_INST_RECV_BIT = 3
 IIC_META_INST_UNKNOWN = 4
 
+# 验证结果缓存：相同的scl/sda序列配合相同的检查器序列只逐个时钟周期检查一次
+# 结果保存在tb_build中，之后的执行(包括并行回归的其它进程)可以直接复用，检查器的实现修改后自动失效
+g_verification_cache = Verification_Cache(
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tb_build', 'verification_cache.json'))
+
 g_test_case_enable_settings = {
     'idle': False,
     'start': False,
@@ -95,8 +103,7 @@ async def receive_signals(dut, scl_out_sigs, sda_out_sigs):
 '''
 @cocotb.test(skip=not g_test_case_enable_settings['idle'])
 async def idle_signal(dut):
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start())
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     def assert_im_idle(dut):
@@ -105,9 +112,10 @@ async def idle_signal(dut):
         assert dut.out_scl_out.value == 'z'
         assert dut.out_scl_is_using == 0
     assert_im_idle(dut)
-    for _ in range(128):
-        await RisingEdge(dut.in_clk)
-        assert_im_idle(dut)
+    # 一次性跳过128个时钟周期，期间输出信号一旦变化就立刻失败
+    await wait_cycles_stable(dut.in_clk,
+        [dut.out_sda_out, dut.out_sda_is_using, dut.out_scl_out, dut.out_scl_is_using], 128)
+    assert_im_idle(dut)
 
 '''
 测试用例：发送开始信号(标准模式)
@@ -131,8 +139,7 @@ TODO: 还需要考虑信号的时间情况，一个SCL时钟周期在10us左右
 async def start_signal(dut):
     # try_debug()
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     dut.in_instruction.value = IIC_META_INST_START_TX
@@ -148,7 +155,7 @@ async def start_signal(dut):
     scl_out_sigs = [1]
     await receive_signals(dut, scl_out_sigs, sda_out_sigs)
     
-    try_to_match_iic_sigs([ IIC_Checker.Start_Checker() ], scl_out_sigs, sda_out_sigs)
+    g_verification_cache.verify(try_to_match_iic_sigs, [ IIC_Checker.Start_Checker() ], scl_out_sigs, sda_out_sigs)
     # 再过一个时钟上升沿，上层器件设置下一步命令
     await RisingEdge(dut.in_clk)
     # 上层器件不设置任何命令
@@ -175,8 +182,7 @@ async def start_signal(dut):
 async def stop_signal(dut):
     # try_debug()
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     dut.in_instruction.value = IIC_META_INST_STOP_TX
@@ -192,7 +198,7 @@ async def stop_signal(dut):
     scl_out_sigs = [0]
     await receive_signals(dut, scl_out_sigs, sda_out_sigs)
     
-    try_to_match_iic_sigs([ IIC_Checker.Stop_Checker() ], scl_out_sigs, sda_out_sigs)
+    g_verification_cache.verify(try_to_match_iic_sigs, [ IIC_Checker.Stop_Checker() ], scl_out_sigs, sda_out_sigs)
     # 再过一个时钟上升沿，上层器件设置下一步命令
     await RisingEdge(dut.in_clk)
     # 上层器件不设置任何命令
@@ -214,8 +220,7 @@ SDA一直处于高电平状态，而SCL则先处于低电平状态(1/4 周期)
 @cocotb.test(skip=not g_test_case_enable_settings['send_1_bit'])
 async def send_1_bit_signal(dut):
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     dut.in_instruction.value = IIC_META_INST_SEND_BIT
@@ -233,7 +238,7 @@ async def send_1_bit_signal(dut):
     scl_out_sigs = [0]
     await receive_signals(dut, scl_out_sigs, sda_out_sigs)
     
-    try_to_match_iic_sigs([ IIC_Checker.Bit_Checker(1) ], scl_out_sigs, sda_out_sigs)
+    g_verification_cache.verify(try_to_match_iic_sigs, [ IIC_Checker.Bit_Checker(1) ], scl_out_sigs, sda_out_sigs)
     # 再过一个时钟上升沿，上层器件设置下一步命令
     await RisingEdge(dut.in_clk)
     # 上层器件不设置任何命令
@@ -249,8 +254,7 @@ async def send_1_bit_signal(dut):
 @cocotb.test(skip=not g_test_case_enable_settings['send_0_bit'])
 async def send_0_bit_signal(dut):
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     dut.in_instruction.value = IIC_META_INST_SEND_BIT
@@ -268,7 +272,7 @@ async def send_0_bit_signal(dut):
     scl_out_sigs = [0]
     await receive_signals(dut, scl_out_sigs, sda_out_sigs)
     
-    try_to_match_iic_sigs([ IIC_Checker.Bit_Checker(0) ], scl_out_sigs, sda_out_sigs)
+    g_verification_cache.verify(try_to_match_iic_sigs, [ IIC_Checker.Bit_Checker(0) ], scl_out_sigs, sda_out_sigs)
     # 再过一个时钟上升沿，上层器件设置下一步命令
     await RisingEdge(dut.in_clk)
     # 上层器件不设置任何命令
@@ -287,8 +291,7 @@ async def send_byte(dut):
     # try_debug()
     TARGET_BYTE_BITS = [0, 1, 0, 1, 1, 0, 1, 0]
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     sda_out_sigs = []
@@ -310,7 +313,7 @@ async def send_byte(dut):
 
         await receive_signals(dut, scl_out_sigs, sda_out_sigs)
 
-    try_to_match_iic_sigs([ 
+    g_verification_cache.verify(try_to_match_iic_sigs, [ 
         IIC_Checker.Bit_Checker(0), IIC_Checker.Bit_Checker(1), IIC_Checker.Bit_Checker(0), IIC_Checker.Bit_Checker(1),
         IIC_Checker.Bit_Checker(1), IIC_Checker.Bit_Checker(0), IIC_Checker.Bit_Checker(1), IIC_Checker.Bit_Checker(0)],
         scl_out_sigs, sda_out_sigs)
@@ -336,8 +339,7 @@ async def send_common(dut):
                            IIC_META_INST_SEND_BIT, IIC_META_INST_SEND_BIT, IIC_META_INST_SEND_BIT, IIC_META_INST_SEND_BIT,
                            IIC_META_INST_STOP_TX]
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     sda_out_sigs = []
@@ -363,7 +365,7 @@ async def send_common(dut):
 
         await receive_signals(dut, scl_out_sigs, sda_out_sigs)
 
-    try_to_match_iic_sigs([
+    g_verification_cache.verify(try_to_match_iic_sigs, [
         IIC_Checker.Start_Checker(),
         IIC_Checker.Bit_Checker(0), IIC_Checker.Bit_Checker(1), IIC_Checker.Bit_Checker(0), IIC_Checker.Bit_Checker(1),
         IIC_Checker.Bit_Checker(1), IIC_Checker.Bit_Checker(0), IIC_Checker.Bit_Checker(1), IIC_Checker.Bit_Checker(0),
@@ -383,8 +385,7 @@ async def send_common(dut):
 @cocotb.test(skip=not g_test_case_enable_settings['recv_1_bit'])
 async def recv_1_bit_sig(dut):
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     sda_in_sigs = []
@@ -415,7 +416,7 @@ async def recv_1_bit_sig(dut):
     assert iter_count < 5000
 
     assert dut.out_bit_read.value == 1
-    try_to_match_iic_sigs([ IIC_Checker.Bit_Checker(1) ], scl_out_sigs, sda_in_sigs)
+    g_verification_cache.verify(try_to_match_iic_sigs, [ IIC_Checker.Bit_Checker(1) ], scl_out_sigs, sda_in_sigs)
 
 
 '''
@@ -426,8 +427,7 @@ async def recv_1_bit_sig(dut):
 async def sending_while_clock_stretching(dut):
     try_debug()
     # 创建一个时钟对象，驱动in_clk输入信号，每2ns为一个周期
-    c = Clock(dut.in_clk, 2, units='ns')
-    await cocotb.start(c.start()) # 告诉时钟对象可以开始工作，并直接返回。此时时钟就绪，模拟器还没开始运作
+    await start_clock(dut.in_clk, 2, units='ns')
     await reset_signal(dut)
     print("Start Simulate")
     dut.in_instruction.value = IIC_META_INST_SEND_BIT
@@ -447,11 +447,9 @@ async def sending_while_clock_stretching(dut):
     clk_count_for_send = 2**6
     clk_count_for_end = 2**5
     clk_count_initial = 2 # IICMeta模块的时钟周期初始值为2
-    for _ in range(clk_count_for_start - clk_count_initial - 2): # '-1'是为了增加一点容错，我怕算错周期，延后了钳制时机
-        await RisingEdge(dut.in_clk)
-    for _ in range(50):
-        dut.in_scl_in.value = 0 # 模拟钳制SCL总线
-        await RisingEdge(dut.in_clk)
+    await FastClockCycles(dut.in_clk, clk_count_for_start - clk_count_initial - 2) # '-1'是为了增加一点容错，我怕算错周期，延后了钳制时机
+    dut.in_scl_in.value = 0 # 模拟钳制SCL总线
+    await FastClockCycles(dut.in_clk, 50)
     dut.in_scl_in.value = 1 # 恢复SCL总线
     await RisingEdge(dut.in_clk) # 执行一个tick，给IICMeta模块一个时钟周期的时间来从钳制转成“重启”
     # 这里会存在一个问题是，一旦从机解除钳制，scl主线会被主机直接拉高。因为主机在时钟延展期间一直在尝试拉高总线
@@ -467,7 +465,7 @@ async def sending_while_clock_stretching(dut):
         if dut.out_is_completed.value == 1:
             break
     # 校验sda和scl的输出信号
-    try_to_match_iic_sigs([ IIC_Checker.Bit_Checker(1) ], scl_out_sigs, sda_out_sigs)
+    g_verification_cache.verify(try_to_match_iic_sigs, [ IIC_Checker.Bit_Checker(1) ], scl_out_sigs, sda_out_sigs)
     
 
 def main():
@@ -0,0 +1,306 @@
+# -*- coding: UTF-8 -*-
+
+import json
+import os
+import random
+import sys
+from collections import deque
+import cocotb
+from cocotb.triggers import RisingEdge
+from cocotb.utils import get_sim_time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../utils/TestBenchUtils'))
+from SignalWait import start_clock
+from MemoryBackdoor import Memory_Backdoor, find_memory
+from BuildMatrix import Build_Matrix, config_name, expand_matrix, find_smallest_config, load_sweep_statistics
+
+# 仿真进程通过环境变量得知当前编译的参数
+ENV_FIFO_BIT_WIDTH = 'TB_FIFO_BIT_WIDTH'
+ENV_FIFO_DEPTH = 'TB_FIFO_DEPTH'
+
+# 每个测试用例随机读写的时钟周期数量
+g_cycles = 20000
+
+# 参数扫描：展开所有组合，每一组参数单独编译到自己的构建目录，源文件和参数不变时复用之前的编译结果
+# 注意DEPTH需要是2的幂，SyncFIFO用$clog2(DEPTH)位的索引，读写位置在2^n处回绕
+g_parameter_axes = {
+    'BIT_WIDTH': [8, 16],
+    'DEPTH': [2, 4, 8, 16, 32],
+}
+
+# 吞吐量要求：balanced_traffic中因为队列满而被丢弃的写入请求比例不超过这个值
+# 扫描结束后在满足要求的参数中找出存储量(BIT_WIDTH * DEPTH)最小的一组
+g_requirement_test = 'balanced_traffic'
+g_max_blocked_write_ratio = 0.01
+
+g_run_all = False
+
+g_test_case_enable_settings = {
+    'balanced_traffic': True,
+    'write_heavy_traffic': True,
+    'read_heavy_traffic': True,
+    'backdoor_memory': True
+}
+
+
+# SyncFIFO的参考模型，逐个时钟周期与RTL保持一致
+# 读写都是由使能信号的上升沿发起的(EdgeDetection)，满的时候写入被忽略，空的时候读取被忽略
+class SyncFIFO_Model():
+    def __init__(self, depth):
+        self.depth = depth
+        self.queue = deque()
+        self._last_write_enable = 0
+        self._last_read_enable = 0
+
+    def reset(self):
+        self.queue.clear()
+        self._last_write_enable = 0
+        self._last_read_enable = 0
+
+    def step(self, write_enable, write_data, read_enable):
+        """
+        计算当前时钟周期内的期望输出，并在时钟上升沿更新状态
+        Returns:
+            (期望的输出, 是否发起了写入, 是否发起了读取, 是否真正写入, 是否真正读取)
+            期望的输出中out_read_data为None表示这个周期内读取数据无意义(队列为空或者读走了最后一个元素)
+        """
+        size = len(self.queue)
+        is_full = size == self.depth
+        is_empty = size == 0
+        write_request = write_enable and not self._last_write_enable
+        read_request = read_enable and not self._last_read_enable
+        do_write = write_request and not is_full
+        do_read = read_request and not is_empty
+        # 发起读取的周期内，out_read_data已经提前指向了下一个元素
+        read_data = None
+        if do_read:
+            read_data = self.queue[1] if size > 1 else None
+        elif not is_empty:
+            read_data = self.queue[0]
+        expected = {
+            'out_is_full': int(is_full),
+            'out_is_empty': int(is_empty),
+            'out_about_to_be_empty': int(size == 1),
+            'out_read_data': read_data,
+        }
+        if do_read:
+            self.queue.popleft()
+        if do_write:
+            self.queue.append(write_data)
+        self._last_write_enable = write_enable
+        self._last_read_enable = read_enable
+        return expected, write_request, read_request, do_write, do_read
+
+
+# 统计队列占用以及背压情况
+class FIFO_Statistics():
+    def __init__(self, depth):
+        self.occupancy_histogram = [0] * (depth + 1)
+        self.cycles = 0
+        self.write_requests = 0
+        self.read_requests = 0
+        self.writes = 0
+        self.reads = 0
+
+    def update(self, occupancy, write_request, read_request, do_write, do_read):
+        self.occupancy_histogram[occupancy] += 1
+        self.cycles += 1
+        self.write_requests += write_request
+        self.read_requests += read_request
+        self.writes += do_write
+        self.reads += do_read
+
+    def to_dict(self):
+        return {
+            'cycles': self.cycles,
+            'occupancy_histogram': self.occupancy_histogram,
+            'mean_occupancy': sum(idx * count for idx, count in enumerate(self.occupancy_histogram)) / max(self.cycles, 1),
+            'full_ratio': self.occupancy_histogram[-1] / max(self.cycles, 1),
+            'empty_ratio': self.occupancy_histogram[0] / max(self.cycles, 1),
+            # 队列满导致被丢弃的写入请求比例，即背压
+            'blocked_write_ratio': (self.write_requests - self.writes) / max(self.write_requests, 1),
+            'blocked_read_ratio': (self.read_requests - self.reads) / max(self.read_requests, 1),
+            'writes_per_cycle': self.writes / max(self.cycles, 1),
+            'reads_per_cycle': self.reads / max(self.cycles, 1),
+        }
+
+
+# 通用的复位行为
+async def reset_signal(dut):
+    dut.in_write_enable.value = 0
+    dut.in_read_enable.value = 0
+    dut.in_write_data.value = 0
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 1
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 0
+
+
+def check_outputs(dut, expected, cycle):
+    for name in ['out_is_full', 'out_is_empty', 'out_about_to_be_empty']:
+        actual = getattr(dut, name).value
+        assert actual == expected[name], f"cycle {cycle}: {name} is {actual}, expected {expected[name]}"
+    if expected['out_read_data'] is not None:
+        actual = dut.out_read_data.value
+        assert actual == expected['out_read_data'], \
+            f"cycle {cycle}: out_read_data is {actual}, expected {expected['out_read_data']}"
+
+
+async def _impl_random_traffic(dut, write_probability, read_probability, stats_name):
+    """
+    每个时钟周期随机设置读写使能(读写可以同时发生)，与参考模型逐周期比较输出，并统计队列占用
+    统计结果写到执行目录下的 <stats_name>.json
+    """
+    bit_width = int(os.environ.get(ENV_FIFO_BIT_WIDTH, len(dut.in_write_data)))
+    depth = int(os.environ.get(ENV_FIFO_DEPTH, 8))
+    model = SyncFIFO_Model(depth)
+    stats = FIFO_Statistics(depth)
+
+    await start_clock(dut.in_clk, 2, units='ns')
+    await reset_signal(dut)
+
+    max_data = (1 << bit_width) - 1
+    for cycle in range(g_cycles):
+        write_enable = int(random.random() < write_probability)
+        read_enable = int(random.random() < read_probability)
+        write_data = random.randint(0, max_data)
+        dut.in_write_enable.value = write_enable
+        dut.in_read_enable.value = read_enable
+        dut.in_write_data.value = write_data
+        occupancy = len(model.queue)
+        expected, write_request, read_request, do_write, do_read = model.step(write_enable, write_data, read_enable)
+        # 上升沿读取到的是这个周期内稳定下来的输出，之后才会更新
+        await RisingEdge(dut.in_clk)
+        check_outputs(dut, expected, cycle)
+        stats.update(occupancy, write_request, read_request, do_write, do_read)
+
+    result = stats.to_dict()
+    result.update({'bit_width': bit_width, 'depth': depth,
+                   'write_probability': write_probability, 'read_probability': read_probability})
+    with open(f"{stats_name}.json", 'w') as f:
+        json.dump(result, f, indent=2)
+    dut._log.info(f"occupancy histogram: {stats.occupancy_histogram}")
+    dut._log.info(f"mean occupancy {result['mean_occupancy']:.2f}/{depth}, "
+                  f"full {result['full_ratio'] * 100:.1f}%, empty {result['empty_ratio'] * 100:.1f}%, "
+                  f"blocked writes {result['blocked_write_ratio'] * 100:.1f}%, "
+                  f"throughput {result['reads_per_cycle']:.3f} reads/cycle")
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['balanced_traffic'] and not g_run_all)
+async def balanced_traffic(dut):
+    """
+    测试用例：读写使能各自以50%的概率随机拉高
+    """
+    await _impl_random_traffic(dut, 0.5, 0.5, 'balanced_traffic')
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['write_heavy_traffic'] and not g_run_all)
+async def write_heavy_traffic(dut):
+    """
+    测试用例：写入比读取频繁，测试写满以及背压的情况
+    """
+    await _impl_random_traffic(dut, 0.8, 0.3, 'write_heavy_traffic')
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['read_heavy_traffic'] and not g_run_all)
+async def read_heavy_traffic(dut):
+    """
+    测试用例：读取比写入频繁，测试读空的情况
+    """
+    await _impl_random_traffic(dut, 0.3, 0.8, 'read_heavy_traffic')
+
+
+async def _drive_cycle(dut, model, write_enable, write_data, read_enable, cycle):
+    """驱动一个时钟周期的读写使能，并与参考模型比较输出"""
+    dut.in_write_enable.value = write_enable
+    dut.in_read_enable.value = read_enable
+    dut.in_write_data.value = write_data
+    expected = model.step(write_enable, write_data, read_enable)[0]
+    await RisingEdge(dut.in_clk)
+    check_outputs(dut, expected, cycle)
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['backdoor_memory'] and not g_run_all)
+async def backdoor_memory(dut):
+    """
+    测试用例：通过前门写满队列后用后门读出_r_memories比较；再用后门整体改写存储，从前门逐个读出检查
+    """
+    depth = int(os.environ.get(ENV_FIFO_DEPTH, 8))
+    model = SyncFIFO_Model(depth)
+    await start_clock(dut.in_clk, 2, units='ns')
+    await reset_signal(dut)
+    backdoor = Memory_Backdoor(find_memory(dut, '_memory._r_memories'))
+    assert backdoor.depth == depth
+
+    # 写使能需要先拉低再拉高才会发起下一次写入，因此每个数据占用两个时钟周期
+    max_data = (1 << backdoor.word_bits) - 1
+    written = [random.randint(0, max_data) for _ in range(depth)]
+    cycle = 0
+    for value in written:
+        await _drive_cycle(dut, model, 1, value, 0, cycle)
+        await _drive_cycle(dut, model, 0, value, 0, cycle + 1)
+        cycle += 2
+    dumped = backdoor.dump().tolist()
+    assert dumped == written, f"backdoor dump {dumped}, expected {written}"
+
+    # 读写位置不变，只替换存储的内容，参考模型中的队列内容同步替换
+    replaced = [random.randint(0, max_data) for _ in range(depth)]
+    start_sim_time = get_sim_time('ns')
+    backdoor.load(replaced)
+    assert get_sim_time('ns') == start_sim_time
+    model.queue = deque(replaced)
+    for _ in range(depth):
+        await _drive_cycle(dut, model, 0, 0, 1, cycle)
+        await _drive_cycle(dut, model, 0, 0, 0, cycle + 1)
+        cycle += 2
+    assert len(model.queue) == 0 and dut.out_is_empty.value == 1
+
+
+def print_sweep_summary(statistics):
+    """打印参数扫描中每一组参数的统计结果"""
+    print(f"{'config':<24} {'test':<22} {'mean':>6} {'full%':>6} {'blocked%':>8} {'reads/cyc':>9}")
+    for config in sorted(statistics, key=config_name):
+        for test, stats in statistics[config].items():
+            print(f"{config_name(config):<24} {test:<22} {stats['mean_occupancy']:>6.2f} "
+                  f"{stats['full_ratio'] * 100:>6.1f} {stats['blocked_write_ratio'] * 100:>8.1f} "
+                  f"{stats['reads_per_cycle']:>9.3f}")
+
+
+def fifo_parameter_env(config):
+    parameters = dict(config.parameters)
+    return {ENV_FIFO_BIT_WIDTH: str(parameters['BIT_WIDTH']), ENV_FIFO_DEPTH: str(parameters['DEPTH'])}
+
+
+def fifo_storage_bits(config):
+    parameters = dict(config.parameters)
+    return parameters['BIT_WIDTH'] * parameters['DEPTH']
+
+
+def main():
+    proj_path = os.path.dirname(os.path.abspath(__file__))
+
+    source_dirs = [ os.path.join(proj_path, "../../SyncFIFO.v") ]
+    include_dirs = [ os.path.join(proj_path, "../../") ]
+    top_level_module = 'SyncFIFO'
+
+    matrix = Build_Matrix(top_level_module, source_dirs, os.path.join(proj_path, 'tb_build'), includes=include_dirs)
+    build_dirs = matrix.build_all(expand_matrix(g_parameter_axes))
+    results = matrix.run('tb_SyncFIFO', build_dirs, extra_env_func=fifo_parameter_env)
+
+    statistics = load_sweep_statistics(results)
+    print_sweep_summary(statistics)
+
+    # 所有用例都通过并且满足吞吐量要求的参数
+    candidates = [config for config, config_results in results.items()
+                  if all(result.passed for result in config_results)
+                  and g_requirement_test in statistics[config]
+                  and statistics[config][g_requirement_test]['blocked_write_ratio'] <= g_max_blocked_write_ratio]
+    smallest = find_smallest_config(candidates, fifo_storage_bits)
+    if smallest is None:
+        print(f"No configuration meets blocked write ratio <= {g_max_blocked_write_ratio} in {g_requirement_test}")
+    else:
+        print(f"Smallest configuration meeting the requirement: {config_name(smallest)} "
+              f"({fifo_storage_bits(smallest)} bits)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+`ifndef UART_LOOPBACK_V
+`define UART_LOOPBACK_V
+
+`include "UART_TX.v"
+`include "UART_RX.v"
+
+/**
+ * @brief cocotb测试使用的顶层模块，把UART_TX的输出总线接到UART_RX的输入总线上
+ * @param in_use_external_rx 为高电平时UART_RX使用in_external_rx作为输入总线，否则使用UART_TX的输出
+ * @param in_external_rx 外部驱动的UART接收总线
+ * @note
+ * 其余端口与UART_TX/UART_RX一致
+ */
+module UART_Loopback(
+    input wire in_clk,
+    input wire in_rst,
+    // UART_TX
+    input wire in_send_enable,
+    input wire [7:0] in_send_byte,
+    output wire out_send_finished,
+    output wire out_is_sending,
+    output wire out_tx,
+    // UART_RX
+    input wire in_use_external_rx,
+    input wire in_external_rx,
+    output wire out_receive_finish,
+    output wire [7:0] out_received_byte
+);
+
+    UART_TX _inst_uart_tx(.in_clk(in_clk), .in_rst(in_rst)
+        , .out_tx(out_tx)
+        , .in_send_enable(in_send_enable)
+        , .in_send_byte(in_send_byte)
+        , .out_send_finished(out_send_finished)
+        , .out_is_sending(out_is_sending));
+
+    wire _w_rx = in_use_external_rx ? in_external_rx : out_tx;
+    UART_RX _inst_uart_rx(.in_clk(in_clk), .in_rst(in_rst)
+        , .in_rx(_w_rx)
+        , .out_receive_finish(out_receive_finish)
+        , .out_received_byte(out_received_byte));
+
+endmodule
+
+`endif ///< UART_LOOPBACK_V
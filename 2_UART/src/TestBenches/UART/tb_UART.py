@@ -0,0 +1,184 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import random
+import sys
+import time
+import cocotb
+from cocotb.triggers import Event, First, RisingEdge
+from cocotb.runner import get_runner
+from cocotb.utils import get_sim_time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../utils/TestBenchUtils'))
+from SignalWait import FastClockCycles, start_clock
+from UARTComponents import BOARD_FREQ, Stream_Scoreboard, UART_RX_Driver, UART_TX_Monitor, \
+    collect_received_bytes, uart_bit_cycles
+
+CLOCK_PERIOD_NS = 2
+# 一个字节(10个位)对应的时钟周期数量
+FRAME_CYCLES = uart_bit_cycles() * 10
+
+# loopback_stream用例发送的字节数，需要测量长时间的错误率时可以调整到若干MB
+g_loopback_bytes = 16 * 1024
+
+g_run_all = False
+
+g_test_case_enable_settings = {
+    'tx_monitor_decode': True,
+    'rx_driver_encode': True,
+    'loopback_stream': True
+}
+
+
+# 通用的复位行为
+async def reset_signal(dut):
+    dut.in_send_enable.value = 0
+    dut.in_send_byte.value = 0
+    dut.in_use_external_rx.value = 0
+    dut.in_external_rx.value = 1
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 1
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 0
+    await RisingEdge(dut.in_clk)
+
+
+async def send_stream(dut, data):
+    """通过UART_TX连续发送data，每次发送完成信号拉高时立刻设置下一个字节，与Top中的连续发送方式一致"""
+    for value in data:
+        dut.in_send_byte.value = value
+        dut.in_send_enable.value = 1
+        await RisingEdge(dut.in_clk)
+        dut.in_send_enable.value = 0
+        await RisingEdge(dut.out_send_finished)
+
+
+async def wait_scoreboards(dut, scoreboards, done_event, num_bytes):
+    """等待所有计分板接收完毕，超过预计时间的两倍时直接返回，由计分板报告丢失的字节"""
+    deadline = get_sim_time('ns') + FRAME_CYCLES * (num_bytes + 2) * 2 * CLOCK_PERIOD_NS
+    while not all(scoreboard.is_done() for scoreboard in scoreboards):
+        remaining_cycles = int((deadline - get_sim_time('ns')) // CLOCK_PERIOD_NS)
+        if remaining_cycles <= 0:
+            return
+        timeout = FastClockCycles(dut.in_clk, remaining_cycles)
+        done_event.clear()
+        fired = await First(done_event.wait(), timeout)
+        if fired is timeout:
+            return
+
+
+def check_report(dut, name, report):
+    dut._log.info(f"{name}: {report}")
+    assert report['lost'] == 0 and report['overflow'] == 0, f"{name} lost or extra bytes"
+    assert report['byte_errors'] == 0, f"{name} has {report['byte_errors']} corrupted bytes"
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['tx_monitor_decode'] and not g_run_all)
+async def tx_monitor_decode(dut):
+    """
+    测试用例：UART_TX连续发送随机字节，由Python监视器在位中间采样解码
+    """
+    await start_clock(dut.in_clk, CLOCK_PERIOD_NS, units='ns')
+    await reset_signal(dut)
+
+    data = random.randbytes(64)
+    scoreboard = Stream_Scoreboard(data)
+    done_event = Event()
+    monitor = UART_TX_Monitor(dut.in_clk, dut.out_tx)
+    monitor.start(lambda value: (scoreboard.push(value), done_event.set()))
+
+    await send_stream(dut, data)
+    await wait_scoreboards(dut, [scoreboard], done_event, len(data))
+    monitor.stop()
+
+    assert monitor.framing_errors == 0
+    check_report(dut, 'tx monitor', scoreboard.report())
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['rx_driver_encode'] and not g_run_all)
+async def rx_driver_encode(dut):
+    """
+    测试用例：由Python驱动器发送随机字节到UART_RX，检查out_received_byte
+    """
+    await start_clock(dut.in_clk, CLOCK_PERIOD_NS, units='ns')
+    await reset_signal(dut)
+    dut.in_use_external_rx.value = 1
+
+    data = random.randbytes(64)
+    scoreboard = Stream_Scoreboard(data)
+    done_event = Event()
+    collector = cocotb.start_soon(collect_received_bytes(
+        dut.out_receive_finish, dut.out_received_byte, lambda value: (scoreboard.push(value), done_event.set())))
+
+    driver = UART_RX_Driver(dut.in_clk, dut.in_external_rx)
+    await driver.send_bytes(data)
+    await wait_scoreboards(dut, [scoreboard], done_event, 1)
+    collector.kill()
+
+    check_report(dut, 'rx', scoreboard.report())
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['loopback_stream'] and not g_run_all)
+async def loopback_stream(dut):
+    """
+    测试用例：UART_TX的输出直接接到UART_RX，连续发送g_loopback_bytes个随机字节
+    同时用UART_RX的输出以及Python监视器的解码结果比较，统计持续的字节速率以及错误率
+    """
+    await start_clock(dut.in_clk, CLOCK_PERIOD_NS, units='ns')
+    await reset_signal(dut)
+
+    data = random.randbytes(g_loopback_bytes)
+    rx_scoreboard = Stream_Scoreboard(data)
+    monitor_scoreboard = Stream_Scoreboard(data)
+    done_event = Event()
+    collector = cocotb.start_soon(collect_received_bytes(
+        dut.out_receive_finish, dut.out_received_byte, lambda value: (rx_scoreboard.push(value), done_event.set())))
+    monitor = UART_TX_Monitor(dut.in_clk, dut.out_tx)
+    monitor.start(lambda value: (monitor_scoreboard.push(value), done_event.set()))
+
+    start_wall_time = time.perf_counter()
+    start_sim_time = get_sim_time('ns')
+    sender = cocotb.start_soon(send_stream(dut, data))
+    await wait_scoreboards(dut, [rx_scoreboard, monitor_scoreboard], done_event, len(data))
+    sim_cycles = (get_sim_time('ns') - start_sim_time) / CLOCK_PERIOD_NS
+    wall_time = time.perf_counter() - start_wall_time
+    sender.kill()
+    collector.kill()
+    monitor.stop()
+
+    # 按照板上的时钟频率换算实际的字节速率，与理论上限(波特率 / 10)比较
+    byte_rate = rx_scoreboard.received_count * BOARD_FREQ / sim_cycles
+    max_byte_rate = BOARD_FREQ / FRAME_CYCLES
+    dut._log.info(f"Sustained {byte_rate:.1f} bytes/s ({byte_rate / max_byte_rate * 100:.2f}% of {max_byte_rate:.1f}), "
+                  f"simulated {rx_scoreboard.received_count / wall_time:.1f} bytes per wall second")
+    assert monitor.framing_errors == 0
+    check_report(dut, 'loopback rx', rx_scoreboard.report())
+    check_report(dut, 'loopback tx monitor', monitor_scoreboard.report())
+
+
+def main():
+    proj_path = os.path.dirname(os.path.abspath(__file__))
+
+    always_run_build_step = True
+    generate_wave = False
+
+    source_dirs = [ os.path.join(proj_path, "UART_Loopback.v") ]
+    include_dirs = [ os.path.join(proj_path, "../../"), proj_path ]
+    build_dir = os.path.join(proj_path, 'tb_build')
+    top_level_module = 'UART_Loopback'
+
+    runner = get_runner('icarus')
+    runner.build(
+        verilog_sources=source_dirs,
+        hdl_toplevel=top_level_module,
+        always=always_run_build_step,
+        waves=generate_wave,
+        build_dir=build_dir,
+        includes=include_dirs,
+        timescale=('1us', '1ns')
+    )
+
+    runner.test(hdl_toplevel=top_level_module, test_module='tb_UART,', waves=generate_wave)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,8 @@
 
 /**
  * @breif 信号(按钮)除抖模块
+ * @param COUNTER_WIDTH 除抖计数器的位宽，信号需要保持2^COUNTER_WIDTH个时钟周期才认为发生了变化
+ *
  * @param in_clk 时钟信号
  * @param in_sig 目标信号
  * @param out_sig_state 当前信号的状态，供内部系统直接使用
@@ -12,7 +14,9 @@
  * 超过时间就认为信号发生了变化。上升沿和下降沿的检测信号只会维持一个时钟周期。在out_sig_state发生翻转的前一个时钟周期可以
  * 读取到out_sig_down/up被拉高
  */
-module Debouncer(
+module Debouncer #(
+    parameter COUNTER_WIDTH = 16
+)(
     input wire in_clk,
     input wire in_sig,
     output wire out_sig_state,
@@ -27,7 +31,7 @@ reg _r_sig_sync_1;  always @(posedge in_clk) _r_sig_sync_1 <= _r_sig_sync_0;
 reg _r_sig_state;
 assign out_sig_state = _r_sig_state;
 
-reg [15:0] _r_sig_counter;
+reg [COUNTER_WIDTH-1:0] _r_sig_counter;
 
 // N+2时刻的信号和目前的状态一致，认为信号没有发生变化
 wire _w_sig_idle = (_r_sig_state==_r_sig_sync_1);
@@ -37,16 +41,16 @@ always @(posedge in_clk) begin
 if(_w_sig_idle)
     _r_sig_counter <= 0;
 else begin
-    /// 假如_r_sig_sync_1信号和当前状态不一致，那么有可能是发生了信号转变，开始计数，只要在2^16次时钟周期之后，这个信号不一致的情况依旧存在
+    /// 假如_r_sig_sync_1信号和当前状态不一致，那么有可能是发生了信号转变，开始计数，只要在2^COUNTER_WIDTH次时钟周期之后，这个信号不一致的情况依旧存在
     /// 就认为信号状态发生了变化
-    _r_sig_counter <= _r_sig_counter + 16'd1;
+    _r_sig_counter <= _r_sig_counter + 1'b1;
     if(_w_sig_count_max) _r_sig_state <= ~_r_sig_state;
 end
 end
 
-// 当_r_sig_sync_1信号与当前状态不一致，同时已经过了2^16个时钟周期，同时之前的状态是高电平，那么认为检测到了下降沿
+// 当_r_sig_sync_1信号与当前状态不一致，同时已经过了2^COUNTER_WIDTH个时钟周期，同时之前的状态是高电平，那么认为检测到了下降沿
 assign out_sig_down = ~_w_sig_idle & _w_sig_count_max & _r_sig_state;
-// 当_r_sig_sync_1信号与当前状态不一致，同时已经过了2^16个时钟周期，同时之前的状态是低电平，那么认为检测到了上升沿
+// 当_r_sig_sync_1信号与当前状态不一致，同时已经过了2^COUNTER_WIDTH个时钟周期，同时之前的状态是低电平，那么认为检测到了上升沿
 assign out_sig_up   = ~_w_sig_idle & _w_sig_count_max & ~_r_sig_state;
 endmodule
 
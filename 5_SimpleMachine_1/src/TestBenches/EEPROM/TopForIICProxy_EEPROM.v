@@ -0,0 +1,44 @@
+`ifndef TOP_FOR_IIC_PROXY_EEPROM_V
+`define TOP_FOR_IIC_PROXY_EEPROM_V
+
+`include "topForIICProxy.v"
+
+/**
+ * @brief cocotb测试使用的顶层模块，把TopForIICProxy接到一条带上拉电阻的IIC总线上，总线上的从设备由Python模型实现
+ * @param in_target_sda_pull_low 从设备拉低SDA(高电平有效)，否则释放SDA
+ * @return out_bus_scl 线与之后的SCL总线
+ * @return out_bus_sda 线与之后的SDA总线
+ * @note
+ * 主机没有占用总线，或者输出的不是确定的低电平(例如高阻态)时，认为主机释放了总线，由上拉电阻拉高
+ */
+module TopForIICProxy_EEPROM(
+    input wire in_clk,
+    input wire in_rst,
+    input wire in_start,
+    input wire in_target_sda_pull_low,
+    output wire out_bus_scl,
+    output wire out_bus_sda
+);
+
+    wire _w_sda_out;
+    wire _w_sda_is_using;
+    wire _w_scl_out;
+    wire _w_scl_is_using;
+
+    wire _w_master_pull_sda_low = _w_sda_is_using && (_w_sda_out === 1'b0);
+    wire _w_master_pull_scl_low = _w_scl_is_using && (_w_scl_out === 1'b0);
+    assign out_bus_sda = ~(_w_master_pull_sda_low | in_target_sda_pull_low);
+    assign out_bus_scl = ~_w_master_pull_scl_low;
+
+    TopForIICProxy _inst_top_for_iic_proxy(.in_clk(in_clk), .in_rst(in_rst)
+        , .in_start(in_start)
+        , .in_sda(out_bus_sda)
+        , .in_scl(out_bus_scl)
+        , .out_sda(_w_sda_out)
+        , .out_sda_is_using(_w_sda_is_using)
+        , .out_scl(_w_scl_out)
+        , .out_scl_is_using(_w_scl_is_using));
+
+endmodule
+
+`endif ///< TOP_FOR_IIC_PROXY_EEPROM_V
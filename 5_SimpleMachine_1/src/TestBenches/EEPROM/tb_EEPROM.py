@@ -0,0 +1,125 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import random
+import sys
+import cocotb
+from cocotb.triggers import RisingEdge
+from cocotb.runner import get_runner
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../utils/TestBenchUtils'))
+from SignalWait import FastClockCycles, start_clock
+from MemoryBackdoor import Memory_Backdoor, find_memory
+from IICTarget import EEPROM_Target
+
+CLOCK_PERIOD_NS = 2
+# TopForIICProxy中固定的请求：从器件地址0x04读取14个字节到RAM[2:16]，再把RAM[3:16]写到字地址RAM[2]
+IIC_PROXY_DEVICE_ADDRESS = 0x04
+IIC_PROXY_BYTE_COUNT = 14
+RAM_PATH = '_inst_top_for_iic_proxy._inst_fake_ram._r_data'
+
+# 镜像大小：2KB，1个字节的字地址，器件地址的低3位作为块选择(与24C16一致)
+g_image_size = 2 * 1024
+g_page_size = 16
+g_write_cycle_ns = 10_000
+# 等待TopForIICProxy完成读写请求的最长时钟周期数量
+g_timeout_cycles = 200_000
+
+g_run_all = False
+
+g_test_case_enable_settings = {
+    'boot_read_and_page_write': True
+}
+
+
+# 通用的复位行为
+async def reset_signal(dut):
+    dut.in_start.value = 0
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 1
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 0
+    await RisingEdge(dut.in_clk)
+
+
+def make_image(path):
+    """
+    生成随机镜像，第0个字节是写入请求使用的字地址
+    IICProxy对读取的最后一个字节也会回复ACK，EEPROM会继续发送下一个字节，
+    因此第IIC_PROXY_BYTE_COUNT个字节的最高位需要是1，保证主机发送结束信号时SDA没有被从设备拉低
+    """
+    image = bytearray(random.randbytes(g_image_size))
+    image[0] = random.randrange(0, 256 - IIC_PROXY_BYTE_COUNT) & 0xF0
+    image[IIC_PROXY_BYTE_COUNT] |= 0x80
+    with open(path, 'wb') as f:
+        f.write(image)
+    return bytes(image)
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['boot_read_and_page_write'] and not g_run_all)
+async def boot_read_and_page_write(dut):
+    """
+    测试用例：TopForIICProxy先从EEPROM当前地址顺序读取14个字节，再把其中13个字节页写入到EEPROM
+    读取的结果通过后门从RAM中导出比较，写入的结果直接检查EEPROM的mmap
+    """
+    await start_clock(dut.in_clk, CLOCK_PERIOD_NS, units='ns')
+    image = make_image('eeprom.bin')
+    eeprom = EEPROM_Target(dut.out_bus_scl, dut.out_bus_sda, dut.in_target_sda_pull_low, 'eeprom.bin',
+                           address=IIC_PROXY_DEVICE_ADDRESS, address_bytes=1, page_size=g_page_size,
+                           write_cycle_ns=g_write_cycle_ns)
+    await reset_signal(dut)
+    eeprom.start()
+    dut.in_start.value = 1
+
+    # 每次跳过一大段时钟周期再检查，EEPROM模型本身只在总线边沿被唤醒
+    waited_cycles = 0
+    while eeprom.statistics['write_cycles'] == 0 and waited_cycles < g_timeout_cycles:
+        await FastClockCycles(dut.in_clk, 1024)
+        waited_cycles += 1024
+    dut.in_start.value = 0
+    dut._log.info(f"EEPROM statistics: {eeprom.statistics}, finished after {waited_cycles} cycles")
+    assert eeprom.statistics['write_cycles'] == 1, "page write did not finish"
+
+    ram = Memory_Backdoor(find_memory(dut, RAM_PATH)).dump_bytes()
+    read_back = ram[2:2 + IIC_PROXY_BYTE_COUNT]
+    assert read_back == image[:IIC_PROXY_BYTE_COUNT], f"read {read_back.hex()}, expected {image[:IIC_PROXY_BYTE_COUNT].hex()}"
+
+    block = IIC_PROXY_DEVICE_ADDRESS & ((g_image_size >> 8) - 1)
+    write_address = (block << 8) | image[0]
+    written = eeprom.memory[write_address:write_address + IIC_PROXY_BYTE_COUNT - 1]
+    assert written == image[1:IIC_PROXY_BYTE_COUNT], f"wrote {written.hex()}, expected {image[1:IIC_PROXY_BYTE_COUNT].hex()}"
+    # 镜像文件本身没有被修改(persist=False)
+    with open('eeprom.bin', 'rb') as f:
+        assert f.read() == image
+    assert eeprom.is_busy()
+    eeprom.close()
+
+
+def main():
+    proj_path = os.path.dirname(os.path.abspath(__file__))
+
+    always_run_build_step = True
+    generate_wave = False
+
+    source_dirs = [ os.path.join(proj_path, "TopForIICProxy_EEPROM.v") ]
+    include_dirs = [ os.path.join(proj_path, "../../"), proj_path ]
+    build_dir = os.path.join(proj_path, 'tb_build')
+    pre_defines = {'DEBUG_TEST_BENCH': '1'}
+    top_level_module = 'TopForIICProxy_EEPROM'
+
+    runner = get_runner('icarus')
+    runner.build(
+        verilog_sources=source_dirs,
+        hdl_toplevel=top_level_module,
+        always=always_run_build_step,
+        waves=generate_wave,
+        build_dir=build_dir,
+        includes=include_dirs,
+        defines=pre_defines,
+        timescale=('1us', '1ns')
+    )
+
+    runner.test(hdl_toplevel=top_level_module, test_module='tb_EEPROM,', waves=generate_wave)
+
+
+if __name__ == '__main__':
+    main()
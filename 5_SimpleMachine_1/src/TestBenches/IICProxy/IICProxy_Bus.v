@@ -0,0 +1,56 @@
+`ifndef IIC_PROXY_BUS_V
+`define IIC_PROXY_BUS_V
+
+`include "IICProxy.v"
+
+/**
+ * @brief cocotb测试使用的顶层模块，把IICProxy接到带上拉电阻的IIC总线上，外部存储和总线上的从设备都由Python模型实现
+ * @param in_target_sda_pull_low 从设备拉低SDA(高电平有效)，否则释放SDA
+ * @return out_bus_scl 线与之后的SCL总线
+ * @return out_bus_sda 线与之后的SDA总线
+ * @note
+ * 其余端口与IICProxy一致。主机没有占用总线，或者输出的不是确定的低电平(例如高阻态)时，认为主机释放了总线
+ */
+module IICProxy_Bus(
+    input wire in_clk,
+    input wire in_rst,
+    input wire in_enable,
+    output wire out_is_completed,
+    input wire [7:0] in_mem_data,
+    output wire [7:0] out_mem_data,
+    output wire [7:0] out_mem_addr,
+    output wire out_mem_write,
+    output wire out_mem_enable,
+    input wire in_target_sda_pull_low,
+    output wire out_bus_scl,
+    output wire out_bus_sda
+);
+
+    wire _w_sda_out;
+    wire _w_sda_is_using;
+    wire _w_scl_out;
+    wire _w_scl_is_using;
+
+    wire _w_master_pull_sda_low = _w_sda_is_using && (_w_sda_out === 1'b0);
+    wire _w_master_pull_scl_low = _w_scl_is_using && (_w_scl_out === 1'b0);
+    assign out_bus_sda = ~(_w_master_pull_sda_low | in_target_sda_pull_low);
+    assign out_bus_scl = ~_w_master_pull_scl_low;
+
+    IICProxy _inst_iic_proxy(.in_clk(in_clk), .in_rst(in_rst)
+        , .in_enable(in_enable)
+        , .out_is_completed(out_is_completed)
+        , .in_sda_in(out_bus_sda)
+        , .in_scl_in(out_bus_scl)
+        , .out_sda_out(_w_sda_out)
+        , .out_scl(_w_scl_out)
+        , .out_sda_is_using(_w_sda_is_using)
+        , .out_scl_is_using(_w_scl_is_using)
+        , .in_mem_data(in_mem_data)
+        , .out_mem_data(out_mem_data)
+        , .out_mem_addr(out_mem_addr)
+        , .out_mem_write(out_mem_write)
+        , .out_mem_enable(out_mem_enable));
+
+endmodule
+
+`endif ///< IIC_PROXY_BUS_V
@@ -0,0 +1,257 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import random
+import sys
+import time
+import numpy as np
+import cocotb
+from cocotb.triggers import Edge, First, ReadOnly, RisingEdge
+from cocotb.runner import get_runner
+from cocotb.utils import get_sim_time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../utils/TestBenchUtils'))
+from SignalWait import FastClockCycles, start_clock
+from IICTarget import Recording_Target
+
+CLOCK_PERIOD_NS = 2
+TARGET_ADDRESS = 0x50
+# IICProxy的out_mem_addr是8位，每条指令占用一个256字节的存储槽：[参数1, 参数2, 数据/返回数据...]
+COMMAND_SLOT_SIZE = 256
+# 参数2的最高位为1时不发送结束信号
+PARAM_NO_STOP = 0x80
+MAX_OP_BYTE_COUNT = 127
+
+# 每个批次的指令数量
+g_batch_size = 16
+# 每条指令的最大字节数
+g_max_bytes_per_command = 8
+# 等待一条指令完成的最长时钟周期数量
+g_timeout_cycles = 200_000
+
+g_run_all = False
+
+g_test_case_enable_settings = {
+    'write_commands': True,
+    'read_commands': True
+}
+
+
+def make_descriptor(address, is_read, count, data=b'', send_stop=True):
+    """
+    生成一条指令在存储槽中的内容
+    parameters:
+        address: 7位器件地址
+        count: 读写的字节数
+        data: 写指令要发送的数据
+    """
+    assert 0 < count <= MAX_OP_BYTE_COUNT
+    param1 = (address << 1) | int(is_read)
+    param2 = count | (0 if send_stop else PARAM_NO_STOP)
+    return bytes([param1, param2]) + bytes(data)
+
+
+# IICProxy的外部存储：由NumPy数组保存所有批次的指令，out_mem_addr加上当前存储槽的起始地址就是实际的地址
+# 读取没有等待周期：out_mem_addr变化时立刻给出in_mem_data；写入在out_mem_write有效的时钟周期内记录
+class Command_Memory():
+    def __init__(self, dut, num_slots):
+        self._dut = dut
+        self.memory = np.zeros(num_slots * COMMAND_SLOT_SIZE, dtype=np.uint8)
+        self.base = 0
+        self.reads = 0
+        self.writes = 0
+        self._tasks = []
+
+    def preload(self, descriptors):
+        """把一批指令一次写入到连续的存储槽中，第idx条指令位于第idx个存储槽"""
+        slots = self.memory.reshape(-1, COMMAND_SLOT_SIZE)
+        slots[:len(descriptors)] = 0
+        for idx, descriptor in enumerate(descriptors):
+            slots[idx, :len(descriptor)] = np.frombuffer(descriptor, dtype=np.uint8)
+
+    def slot(self, idx):
+        return self.memory[idx * COMMAND_SLOT_SIZE:(idx + 1) * COMMAND_SLOT_SIZE]
+
+    def select(self, idx):
+        """切换到第idx个存储槽，之后IICProxy的访问都相对于这个存储槽"""
+        self.base = idx * COMMAND_SLOT_SIZE
+        self._drive_read_data()
+
+    def reset_counters(self):
+        self.reads = 0
+        self.writes = 0
+
+    def _drive_read_data(self):
+        addr = self._dut.out_mem_addr.value
+        if addr.is_resolvable:
+            self._dut.in_mem_data.value = int(self.memory[self.base + int(addr)])
+
+    async def _serve_reads(self):
+        while True:
+            self._drive_read_data()
+            await Edge(self._dut.out_mem_addr)
+
+    async def _serve_accesses(self):
+        dut = self._dut
+        while True:
+            await RisingEdge(dut.out_mem_enable)
+            await ReadOnly()
+            # 每个使能的时钟周期都是一次访问，在下一个时钟上升沿生效
+            while dut.out_mem_enable.value == 1:
+                if dut.out_mem_write.value == 1:
+                    self.memory[self.base + int(dut.out_mem_addr.value)] = int(dut.out_mem_data.value)
+                    self.writes += 1
+                else:
+                    self.reads += 1
+                await RisingEdge(dut.in_clk)
+                await ReadOnly()
+
+    def start(self):
+        self._tasks = [cocotb.start_soon(self._serve_reads()), cocotb.start_soon(self._serve_accesses())]
+
+    def stop(self):
+        for task in self._tasks:
+            task.kill()
+        self._tasks = []
+
+
+# 通用的复位行为
+async def reset_signal(dut):
+    dut.in_enable.value = 0
+    dut.in_mem_data.value = 0
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 1
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 0
+    await RisingEdge(dut.in_clk)
+
+
+async def setup(dut, read_source=None):
+    await start_clock(dut.in_clk, CLOCK_PERIOD_NS, units='ns')
+    target = Recording_Target(dut.out_bus_scl, dut.out_bus_sda, dut.in_target_sda_pull_low, TARGET_ADDRESS, read_source)
+    memory = Command_Memory(dut, g_batch_size)
+    await reset_signal(dut)
+    memory.start()
+    target.start()
+    return memory, target
+
+
+async def run_batch(dut, memory, num_commands):
+    """
+    逐条执行已经预先加载好的指令
+    Returns:
+        每条指令的统计：{'cycles', 'reads', 'writes', 'start_ns', 'finish_ns'}
+    """
+    statistics = []
+    start_wall_time = time.perf_counter()
+    for idx in range(num_commands):
+        memory.select(idx)
+        memory.reset_counters()
+        start_ns = get_sim_time('ns')
+        dut.in_enable.value = 1
+        await RisingEdge(dut.in_clk)
+        dut.in_enable.value = 0
+        timeout = FastClockCycles(dut.in_clk, g_timeout_cycles)
+        fired = await First(RisingEdge(dut.out_is_completed), timeout)
+        assert fired is not timeout, f"command {idx} did not complete in {g_timeout_cycles} cycles"
+        finish_ns = get_sim_time('ns')
+        await RisingEdge(dut.in_clk)
+        statistics.append({'cycles': (finish_ns - start_ns) / CLOCK_PERIOD_NS, 'reads': memory.reads,
+                           'writes': memory.writes, 'start_ns': start_ns, 'finish_ns': finish_ns})
+    wall_time = time.perf_counter() - start_wall_time
+    dut._log.info(f"{num_commands} commands in {wall_time:.2f}s ({num_commands / wall_time:.1f} commands per wall second)")
+    return statistics
+
+
+def report_overhead(dut, statistics, transactions, byte_counts):
+    """
+    比较每条指令的总时钟周期与总线上实际传输(开始信号到结束信号)的时钟周期，估计三层结构的额外开销
+    """
+    total_cycles = sum(s['cycles'] for s in statistics)
+    bus_cycles = sum((t.stop_ns - t.start_ns) / CLOCK_PERIOD_NS for t in transactions)
+    # 每个字节9个位(包括ACK)，加上地址字节
+    total_bits = sum(9 * (count + 1) for count in byte_counts)
+    sim_seconds = (statistics[-1]['finish_ns'] - statistics[0]['start_ns']) * 1e-9
+    dut._log.info(f"cycles/command {total_cycles / len(statistics):.1f}, bus cycles/bit {bus_cycles / total_bits:.1f}, "
+                  f"overhead outside START..STOP {(total_cycles - bus_cycles) / len(statistics):.1f} cycles/command "
+                  f"({(total_cycles - bus_cycles) / total_cycles * 100:.1f}%)")
+    dut._log.info(f"memory reads/command {sum(s['reads'] for s in statistics) / len(statistics):.2f}, "
+                  f"writes/command {sum(s['writes'] for s in statistics) / len(statistics):.2f}, "
+                  f"{len(statistics) / sim_seconds:.1f} commands per simulated second")
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['write_commands'] and not g_run_all)
+async def write_commands(dut):
+    """
+    测试用例：一批随机长度的写指令，检查从设备收到的数据与存储槽中的数据一致
+    """
+    memory, target = await setup(dut)
+    payloads = [random.randbytes(random.randint(1, g_max_bytes_per_command)) for _ in range(g_batch_size)]
+    memory.preload([make_descriptor(TARGET_ADDRESS, False, len(data), data) for data in payloads])
+
+    statistics = await run_batch(dut, memory, len(payloads))
+    memory.stop()
+    target.stop()
+
+    assert len(target.transactions) == len(payloads), f"target saw {len(target.transactions)} transactions"
+    for idx, (transaction, data) in enumerate(zip(target.transactions, payloads)):
+        assert not transaction.is_read
+        assert transaction.data == data, f"command {idx}: target received {transaction.data.hex()}, expected {data.hex()}"
+        # 参数1、参数2以及每个数据字节各读取一次
+        assert statistics[idx]['reads'] >= len(data) + 2
+    report_overhead(dut, statistics, target.transactions, [len(data) for data in payloads])
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['read_commands'] and not g_run_all)
+async def read_commands(dut):
+    """
+    测试用例：一批随机长度的读指令，检查存储槽中的返回数据与从设备发送的数据一致
+    IICProxy对读取的最后一个字节也会回复ACK，从设备会继续发送下一个字节，
+    因此每条指令之后额外提供一个0xFF，保证主机发送结束信号时SDA没有被从设备拉低
+    """
+    counts = [random.randint(1, g_max_bytes_per_command) for _ in range(g_batch_size)]
+    expected = [random.randbytes(count) for count in counts]
+    stream = iter(b''.join(data + b'\xff' for data in expected))
+    memory, target = await setup(dut, lambda: next(stream))
+    memory.preload([make_descriptor(TARGET_ADDRESS, True, count) for count in counts])
+
+    statistics = await run_batch(dut, memory, len(counts))
+    memory.stop()
+    target.stop()
+
+    assert len(target.transactions) == len(counts), f"target saw {len(target.transactions)} transactions"
+    for idx, (transaction, data) in enumerate(zip(target.transactions, expected)):
+        assert transaction.is_read
+        assert transaction.data == data, f"command {idx}: target sent {transaction.data.hex()}, expected {data.hex()}"
+        returned = memory.slot(idx)[2:2 + len(data)].tobytes()
+        assert returned == data, f"command {idx}: memory holds {returned.hex()}, expected {data.hex()}"
+        assert statistics[idx]['writes'] == len(data)
+    report_overhead(dut, statistics, target.transactions, counts)
+
+
+def main():
+    proj_path = os.path.dirname(os.path.abspath(__file__))
+
+    always_run_build_step = True
+    generate_wave = False
+
+    source_dirs = [ os.path.join(proj_path, "IICProxy_Bus.v") ]
+    include_dirs = [ os.path.join(proj_path, "../../"), proj_path ]
+    build_dir = os.path.join(proj_path, 'tb_build')
+    top_level_module = 'IICProxy_Bus'
+
+    runner = get_runner('icarus')
+    runner.build(
+        verilog_sources=source_dirs,
+        hdl_toplevel=top_level_module,
+        always=always_run_build_step,
+        waves=generate_wave,
+        build_dir=build_dir,
+        includes=include_dirs,
+        timescale=('1us', '1ns')
+    )
+
+    runner.test(hdl_toplevel=top_level_module, test_module='tb_IICProxy,', waves=generate_wave)
+
+
+if __name__ == '__main__':
+    main()
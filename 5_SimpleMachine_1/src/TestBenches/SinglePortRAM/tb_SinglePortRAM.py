@@ -0,0 +1,145 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import random
+import sys
+import numpy as np
+import cocotb
+from cocotb.triggers import RisingEdge
+from cocotb.runner import get_runner
+from cocotb.utils import get_sim_time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../utils/TestBenchUtils'))
+from SignalWait import start_clock
+from MemoryBackdoor import Memory_Backdoor, find_memory
+
+# 与SinglePortRAM的默认参数保持一致：容量为2^DEPTH个字节
+RAM_DEPTH = 8
+
+g_run_all = False
+
+g_test_case_enable_settings = {
+    'backdoor_load_frontdoor_read': True,
+    'frontdoor_write_backdoor_dump': True,
+    'program_image_from_file': True
+}
+
+
+# 通用的复位行为
+async def reset_signal(dut):
+    dut.in_addr.value = 0
+    dut.in_write_enable.value = 0
+    dut.in_write_data.value = 0
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 1
+    await RisingEdge(dut.in_clk)
+    dut.in_rst.value = 0
+    await RisingEdge(dut.in_clk)
+
+
+async def read_frontdoor(dut, addr):
+    """通过读端口读取一个字节：in_addr在时钟上升沿设置，下一个时钟上升沿读取out_data"""
+    dut.in_addr.value = addr
+    await RisingEdge(dut.in_clk)
+    return int(dut.out_data.value)
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['backdoor_load_frontdoor_read'] and not g_run_all)
+async def backdoor_load_frontdoor_read(dut):
+    """
+    测试用例：通过后门一次写入整个RAM，然后从读端口逐个地址读取比较
+    """
+    await start_clock(dut.in_clk, 2, units='ns')
+    await reset_signal(dut)
+
+    backdoor = Memory_Backdoor(find_memory(dut, '_r_data'))
+    assert backdoor.depth == 2 ** RAM_DEPTH
+    image = random.randbytes(backdoor.depth)
+    start_sim_time = get_sim_time('ns')
+    backdoor.load(image)
+    assert get_sim_time('ns') == start_sim_time
+
+    for addr in range(backdoor.depth):
+        value = await read_frontdoor(dut, addr)
+        assert value == image[addr], f"addr {addr:#04x}: read {value:#04x}, expected {image[addr]:#04x}"
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['frontdoor_write_backdoor_dump'] and not g_run_all)
+async def frontdoor_write_backdoor_dump(dut):
+    """
+    测试用例：通过写端口逐个地址写入，然后通过后门一次读出整个RAM比较
+    """
+    await start_clock(dut.in_clk, 2, units='ns')
+    await reset_signal(dut)
+
+    backdoor = Memory_Backdoor(find_memory(dut, '_r_data'))
+    image = random.randbytes(backdoor.depth)
+    dut.in_write_enable.value = 1
+    for addr, value in enumerate(image):
+        dut.in_addr.value = addr
+        dut.in_write_data.value = value
+        await RisingEdge(dut.in_clk)
+    dut.in_write_enable.value = 0
+    await RisingEdge(dut.in_clk)
+
+    dumped = backdoor.dump_bytes()
+    assert dumped == image, f"first mismatch at {next(i for i in range(len(image)) if dumped[i] != image[i]):#04x}"
+
+
+@cocotb.test(skip=not g_test_case_enable_settings['program_image_from_file'] and not g_run_all)
+async def program_image_from_file(dut):
+    """
+    测试用例：模拟SimpleMachine加载程序镜像，镜像文件通过mmap映射后写入RAM的后半部分，
+    前半部分用NumPy数组写入，最后把整个RAM导出到文件再比较
+    """
+    await start_clock(dut.in_clk, 2, units='ns')
+    await reset_signal(dut)
+
+    backdoor = Memory_Backdoor(find_memory(dut, '_r_data'))
+    half = backdoor.depth // 2
+    image = random.randbytes(half)
+    with open('program.bin', 'wb') as f:
+        f.write(image)
+    header = np.arange(half, dtype=np.uint8)
+
+    start_sim_time = get_sim_time('ns')
+    backdoor.load(header)
+    backdoor.load_file('program.bin', offset=half)
+    assert get_sim_time('ns') == start_sim_time
+
+    backdoor.dump_file('ram_dump.bin')
+    with open('ram_dump.bin', 'rb') as f:
+        assert f.read() == header.tobytes() + image
+    for addr in [0, half - 1, half, backdoor.depth - 1]:
+        value = await read_frontdoor(dut, addr)
+        expected = header[addr] if addr < half else image[addr - half]
+        assert value == expected, f"addr {addr:#04x}: read {value:#04x}, expected {expected:#04x}"
+
+
+def main():
+    proj_path = os.path.dirname(os.path.abspath(__file__))
+
+    always_run_build_step = True
+    generate_wave = False
+
+    source_dirs = [ os.path.join(proj_path, "../../SinglePortRam.v") ]
+    include_dirs = [ os.path.join(proj_path, "../../") ]
+    build_dir = os.path.join(proj_path, 'tb_build')
+    top_level_module = 'SinglePortRAM'
+
+    runner = get_runner('icarus')
+    runner.build(
+        verilog_sources=source_dirs,
+        hdl_toplevel=top_level_module,
+        always=always_run_build_step,
+        waves=generate_wave,
+        build_dir=build_dir,
+        includes=include_dirs,
+        parameters={'DEPTH': RAM_DEPTH},
+        timescale=('1us', '1ns')
+    )
+
+    runner.test(hdl_toplevel=top_level_module, test_module='tb_SinglePortRAM,', waves=generate_wave)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+# -*- coding: UTF-8 -*-
+
+import hashlib
+import itertools
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cocotb.runner import get_runner
+
+from RegressionRunner import Work_Item, _run_work_item, collect_tests, make_run_settings
+
+# 一组编译配置：parameters和defines都是(名字, 值)的元组，可以作为dict的key
+Build_Config = namedtuple('Build_Config', ['parameters', 'defines'])
+# 记录编译配置以及源文件指纹的文件，内容一致时直接复用之前的编译结果
+BUILD_KEY_FILE_NAME = 'build_key.json'
+
+
+def make_build_config(parameters=None, defines=None):
+    return Build_Config(tuple(sorted((parameters or {}).items())), tuple(sorted((defines or {}).items())))
+
+
+def expand_matrix(parameter_axes=None, define_axes=None):
+    """
+    把每个参数/宏的候选值展开成所有组合
+    parameters:
+        parameter_axes: 参数名 -> 候选值列表
+        define_axes: 宏名 -> 候选值列表
+    Returns:
+        Build_Config列表
+    """
+    parameter_axes = parameter_axes or {}
+    define_axes = define_axes or {}
+    parameter_names = list(parameter_axes)
+    define_names = list(define_axes)
+    configs = []
+    for values in itertools.product(*parameter_axes.values(), *define_axes.values()):
+        parameters = dict(zip(parameter_names, values[:len(parameter_names)]))
+        defines = dict(zip(define_names, values[len(parameter_names):]))
+        configs.append(make_build_config(parameters, defines))
+    return configs
+
+
+def config_name(config):
+    """由编译配置生成可读的目录名，例如 BIT_WIDTH_8_DEPTH_16"""
+    items = list(config.parameters) + list(config.defines)
+    if len(items) == 0:
+        return 'default'
+    return '_'.join(f"{name}_{value}" for name, value in items)
+
+
+def _sources_fingerprint(paths):
+    """源文件内容的指纹，include目录下的文件也包括在内"""
+    hasher = hashlib.blake2b(digest_size=16)
+    for path in sorted(paths):
+        hasher.update(path.encode())
+        with open(path, 'rb') as f:
+            hasher.update(f.read())
+    return hasher.hexdigest()
+
+
+def _build_config(settings, config, build_dir):
+    """
+    在独立的进程中编译一组配置，配置以及源文件都没有变化时跳过编译
+    Returns:
+        (build_dir, 是否真正进行了编译)
+    """
+    build_key = {
+        'hdl_toplevel': settings['hdl_toplevel'],
+        # 保存成json之后元组会变成列表，这里直接用列表，才能和读回来的记录比较
+        'parameters': [list(parameter) for parameter in config.parameters],
+        'defines': [list(define) for define in config.defines],
+        'timescale': list(settings['timescale']),
+        'sources': settings['sources_fingerprint'],
+    }
+    key_path = os.path.join(build_dir, BUILD_KEY_FILE_NAME)
+    if os.path.isfile(key_path):
+        with open(key_path) as f:
+            if json.load(f) == build_key:
+                return build_dir, False
+    runner = get_runner(settings['simulator'])
+    runner.build(
+        verilog_sources=settings['verilog_sources'],
+        hdl_toplevel=settings['hdl_toplevel'],
+        always=True,
+        build_dir=build_dir,
+        includes=settings['includes'],
+        defines=dict(config.defines),
+        parameters=dict(config.parameters),
+        timescale=tuple(settings['timescale'])
+    )
+    with open(key_path, 'w') as f:
+        json.dump(build_key, f)
+    return build_dir, True
+
+
+# 编译矩阵：每组参数/宏组合编译到自己的构建目录中，并行编译，并在所有组合上并行执行测试用例
+class Build_Matrix():
+    def __init__(self, hdl_toplevel, verilog_sources, build_root, includes=(), timescale=('1us', '1ns'),
+                 num_workers=None, simulator='icarus'):
+        self.hdl_toplevel = hdl_toplevel
+        self.verilog_sources = [os.path.abspath(path) for path in verilog_sources]
+        self.build_root = os.path.abspath(build_root)
+        self.includes = [os.path.abspath(path) for path in includes]
+        self.timescale = timescale
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.simulator = simulator
+
+    def get_build_dir(self, config):
+        return os.path.join(self.build_root, config_name(config))
+
+    def _source_files(self):
+        files = list(self.verilog_sources)
+        for include_dir in self.includes:
+            for name in os.listdir(include_dir):
+                if name.endswith(('.v', '.vh', '.sv')):
+                    files.append(os.path.join(include_dir, name))
+        return files
+
+    def build_all(self, configs):
+        """
+        并行编译所有配置
+        Returns:
+            Build_Config -> 构建目录
+        """
+        settings = {
+            'simulator': self.simulator,
+            'hdl_toplevel': self.hdl_toplevel,
+            'verilog_sources': self.verilog_sources,
+            'includes': self.includes,
+            'timescale': list(self.timescale),
+            'sources_fingerprint': _sources_fingerprint(self._source_files()),
+        }
+        build_dirs = {}
+        with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+            futures = {executor.submit(_build_config, settings, config, self.get_build_dir(config)): config
+                       for config in configs}
+            for future in as_completed(futures):
+                build_dir, is_built = future.result()
+                build_dirs[futures[future]] = build_dir
+                print(f"{'BUILT' if is_built else 'CACHED'} {config_name(futures[future])}")
+        return build_dirs
+
+    def run(self, test_module, build_dirs, work_items=None, extra_env_func=None, plusargs=()):
+        """
+        在所有配置上并行执行测试单元
+        parameters:
+            build_dirs: build_all的返回值
+            work_items: Work_Item列表，默认是模块中所有没有被skip的用例
+            extra_env_func: Build_Config -> 额外的环境变量，用于告诉测试代码当前的参数
+        Returns:
+            Build_Config -> Test_Result列表
+        """
+        if work_items is None:
+            work_items = [Work_Item(test, None) for test in collect_tests(test_module)]
+        results = {config: [] for config in build_dirs}
+        with ProcessPoolExecutor(max_workers=self.num_workers, max_tasks_per_child=1) as executor:
+            futures = {}
+            for config, build_dir in build_dirs.items():
+                extra_env = extra_env_func(config) if extra_env_func is not None else None
+                settings = make_run_settings(self.simulator, test_module, self.hdl_toplevel, build_dir,
+                                             extra_env=extra_env, plusargs=plusargs)
+                for item in work_items:
+                    futures[executor.submit(_run_work_item, settings, item)] = config
+            for future in as_completed(futures):
+                result = future.result()
+                config = futures[future]
+                results[config].append(result)
+                print(f"{'PASS' if result.passed else 'FAIL'} {config_name(config)} {result.test} "
+                      f"wall={result.wall_time:.2f}s")
+        return results
+
+
+def find_smallest_config(candidates, cost):
+    """
+    在满足要求的配置中找到代价最小的一个
+    parameters:
+        candidates: 满足要求的Build_Config列表
+        cost: Build_Config -> 代价，例如 BIT_WIDTH * DEPTH
+    Returns:
+        代价最小的Build_Config，没有满足要求的配置时返回None
+    """
+    if len(candidates) == 0:
+        return None
+    return min(candidates, key=cost)
+
+
+def load_sweep_statistics(results):
+    """
+    读取每一组参数下各个用例写出的统计结果，用例需要把统计结果写到执行目录下的"<用例名>.json"
+    失败的用例只要写出了统计结果也会被读取，失败往往正是扫描想要观察的结果，是否通过由调用者根据Test_Result判断
+    parameters:
+        results: Build_Matrix.run的返回值
+    Returns:
+        Build_Config -> {用例名: 统计结果}
+    """
+    statistics = {}
+    for config, config_results in results.items():
+        statistics[config] = {}
+        for result in config_results:
+            path = os.path.join(result.test_dir, f"{result.test}.json")
+            if not os.path.isfile(path):
+                continue
+            with open(path) as f:
+                statistics[config][result.test] = json.load(f)
+    return statistics
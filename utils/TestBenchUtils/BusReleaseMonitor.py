@@ -0,0 +1,146 @@
+# -*- coding: UTF-8 -*-
+
+import functools
+from collections import deque, namedtuple
+
+import cocotb
+from cocotb.triggers import Edge, ReadOnly
+from cocotb.utils import get_sim_time
+
+# 默认保留最近多少次信号变化，出现违规时一起打印
+DEFAULT_HISTORY = 32
+
+# 指令之间的一次违规：kind是'release'(放弃了总线或者输出高阻)或者'level_change'(完成信号有效期间电平发生变化)
+Bus_Gap_Violation = namedtuple('Bus_Gap_Violation', ['kind', 'line', 'time_ns', 'completed_ns', 'values', 'history'])
+
+
+# 指令衔接处的总线监视器：上一条指令拉起完成信号之后，到下一条指令第一次改变总线之前，
+# 器件应该一直占用总线并保持电平不变。只通过边沿回调记录变化，开销和信号变化次数相关，和时钟周期数无关
+class Bus_Release_Monitor():
+    def __init__(self, dut, lines, completed_name='out_is_completed', enable_name='in_enable',
+                 instruction_name='in_instruction', allowed_release_instructions=(), history=DEFAULT_HISTORY):
+        """
+        parameters:
+            lines: {总线名: (输出信号名, 占用信号名)}
+            allowed_release_instructions: 这些指令完成之后允许释放总线，例如结束信号
+        """
+        self._lines = {name: (dut._id(out_name, extended=False), dut._id(using_name, extended=False))
+                       for name, (out_name, using_name) in lines.items()}
+        self._completed = dut._id(completed_name, extended=False)
+        self._enable = dut._id(enable_name, extended=False)
+        self._instruction = dut._id(instruction_name, extended=False)
+        self._allowed_release_instructions = set(allowed_release_instructions)
+        self._history = deque(maxlen=history)
+        self._tasks = []
+        self.violations = []
+        self._current_instruction = None
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_open = False
+        self._window_completed_ns = None
+        self._is_chained = False
+        self._window_instruction = None
+        self._candidates = []
+
+    def start(self):
+        self._tasks = [cocotb.start_soon(self._watch_completed()), cocotb.start_soon(self._watch_enable())]
+        for name, handles in self._lines.items():
+            for handle in handles:
+                self._tasks.append(cocotb.start_soon(self._watch_line(name, handle)))
+
+    def stop(self):
+        for task in self._tasks:
+            task.kill()
+        self._tasks = []
+        self._close_window()
+
+    def _line_values(self, name):
+        out_handle, using_handle = self._lines[name]
+        return out_handle.value.binstr, using_handle.value.binstr
+
+    def _close_window(self):
+        """窗口结束：只有下一条指令在完成信号有效期间被设置(指令衔接)时，窗口内的变化才是违规"""
+        if self._window_open and self._is_chained:
+            self.violations += self._candidates
+        self._reset_window()
+
+    async def _watch_enable(self):
+        edge = Edge(self._enable)
+        while True:
+            await edge
+            if self._enable.value.binstr != '1':
+                continue
+            instruction = self._instruction.value
+            self._current_instruction = int(instruction) if instruction.is_resolvable else None
+            if self._window_open and self._completed.value.binstr == '1':
+                self._is_chained = True
+
+    async def _watch_completed(self):
+        edge = Edge(self._completed)
+        while True:
+            await edge
+            now = get_sim_time('ns')
+            self._history.append((now, 'completed', self._completed.value.binstr))
+            if self._completed.value.binstr == '1':
+                self._close_window()
+                self._window_open = True
+                self._window_completed_ns = now
+                self._window_instruction = self._current_instruction
+
+    async def _watch_line(self, name, handle):
+        edge = Edge(handle)
+        while True:
+            await edge
+            # 同一时刻其它信号(包括完成信号)也可能在变化，等到这个时刻的所有变化都结束之后再判断
+            await ReadOnly()
+            now = get_sim_time('ns')
+            out_value, using_value = self._line_values(name)
+            self._history.append((now, name, (out_value, using_value)))
+            # 和完成信号同一时刻的变化属于刚刚完成的指令
+            if not self._window_open or now == self._window_completed_ns:
+                continue
+            is_release = using_value != '1' or out_value not in ('0', '1')
+            if is_release:
+                if self._window_instruction not in self._allowed_release_instructions:
+                    self._add_candidate('release', name, now, out_value, using_value)
+            elif self._completed.value.binstr == '1':
+                self._add_candidate('level_change', name, now, out_value, using_value)
+            else:
+                # 完成信号撤销之后第一次改变总线：下一条指令已经开始
+                self._close_window()
+
+    def _add_candidate(self, kind, name, now, out_value, using_value):
+        # 输出和占用信号同一时刻变化时只记录一次
+        if len(self._candidates) and self._candidates[-1].line == name and self._candidates[-1].time_ns == now:
+            return
+        self._candidates.append(Bus_Gap_Violation(kind, name, now, self._window_completed_ns,
+                                                  (out_value, using_value), list(self._history)))
+
+    def report(self, log):
+        for violation in self.violations:
+            log.error(f"{violation.kind} of {violation.line} at {violation.time_ns}ns "
+                      f"(completed at {violation.completed_ns}ns): out/using={violation.values}")
+            for time_ns, name, value in violation.history:
+                log.error(f"    {time_ns:>10}ns {name:<10} {value}")
+
+
+def with_bus_release_monitor(lines, allowed_release_instructions=(), **kwargs):
+    """
+    测试用例装饰器(放在@cocotb.test之下)：监视整个测试用例中所有指令衔接处的总线，测试结束时有违规则失败
+    """
+    def decorator(test_func):
+        @functools.wraps(test_func)
+        async def wrapper(dut, *args, **inner_kwargs):
+            monitor = Bus_Release_Monitor(dut, lines, allowed_release_instructions=allowed_release_instructions, **kwargs)
+            monitor.start()
+            try:
+                result = await test_func(dut, *args, **inner_kwargs)
+            finally:
+                monitor.stop()
+            monitor.report(dut._log)
+            assert len(monitor.violations) == 0, \
+                f"{len(monitor.violations)} bus changes between chained instructions, first at {monitor.violations[0].time_ns}ns"
+            return result
+        return wrapper
+    return decorator
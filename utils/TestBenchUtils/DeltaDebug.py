@@ -0,0 +1,134 @@
+# -*- coding: UTF-8 -*-
+
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from RegressionRunner import Work_Item, _run_work_item
+
+# cocotb打印的异常调用栈中的一帧
+TRACEBACK_FRAME_PATTERN = re.compile(r'File "([^"]+)", line (\d+), in (\S+)')
+# 调用栈最后的异常类型，例如 AssertionError: ...
+EXCEPTION_LINE_PATTERN = re.compile(r'^\s*(\w+(?:Error|Exception))\b')
+
+
+def read_failure_signature(test_dir):
+    """
+    从仿真日志中读取失败的位置：最后一个异常的类型以及抛出它的代码位置
+    缩减过程中只有失败在同一个位置的子序列才被认为复现了问题，避免缩减到另外一个不相关的失败上
+    Returns:
+        (文件名, 行号, 函数名, 异常类型)，日志不存在或者没有找到异常时返回None
+    """
+    log_path = os.path.join(test_dir, 'sim.log')
+    if not os.path.isfile(log_path):
+        return None
+    signature = None
+    last_frame = None
+    with open(log_path, errors='replace') as f:
+        for line in f:
+            frame = TRACEBACK_FRAME_PATTERN.search(line)
+            if frame is not None:
+                last_frame = (os.path.basename(frame.group(1)), int(frame.group(2)), frame.group(3))
+                continue
+            exception = EXCEPTION_LINE_PATTERN.match(line)
+            if exception is not None and last_frame is not None:
+                signature = last_frame + (exception.group(1),)
+                last_frame = None
+    return signature
+
+
+def _split(items, n):
+    """把列表尽量均匀地切成n份"""
+    chunks = []
+    begin = 0
+    for idx in range(n):
+        end = begin + (len(items) - begin) // (n - idx)
+        chunks.append(items[begin:end])
+        begin = end
+    return chunks
+
+
+def ddmin(items, are_failing):
+    """
+    Zeller的delta debugging最小化算法：找到一个仍然失败、并且去掉任意一段都不再失败的子序列
+    同一粒度下的所有候选一次性交给are_failing，由它并行执行
+    parameters:
+        items: 会失败的完整序列
+        are_failing: 候选序列列表 -> 与之对应的是否失败列表
+    Returns:
+        缩减之后的序列
+    """
+    n = 2
+    while len(items) >= 2:
+        n = min(n, len(items))
+        subsets = _split(items, n)
+        complements = [[item for chunk in subsets[:idx] + subsets[idx + 1:] for item in chunk] for idx in range(n)]
+        # n为2时补集和子集是一样的，不需要重复执行
+        candidates = subsets + (complements if n > 2 else [])
+        failing = are_failing(candidates)
+        if any(failing[:n]):
+            items = subsets[failing.index(True)]
+            n = 2
+        elif any(failing[n:]):
+            items = complements[failing.index(True, n) - n]
+            n = max(n - 1, 2)
+        elif n < len(items):
+            n = min(n * 2, len(items))
+        else:
+            break
+    return items
+
+
+# 通过Regression_Runner缩减失败的指令序列：候选序列通过环境变量传给测试用例，
+# 复用已经编译好的仿真模型，每个候选在独立的进程中并行执行
+class Sequence_Reducer():
+    def __init__(self, regression, test, seed, env_name, failure_signature=None):
+        """
+        parameters:
+            regression: 已经完成编译的Regression_Runner
+            test: 根据环境变量执行指令序列的测试用例名
+            seed: 复现时使用的随机种子
+            env_name: 传递指令序列(json)的环境变量名
+            failure_signature: read_failure_signature的返回值，为None时任何失败都被认为复现了问题
+        """
+        self._regression = regression
+        self._item = Work_Item(test, seed)
+        self._env_name = env_name
+        self._failure_signature = failure_signature
+        self._known_results = {}
+        self._round = 0
+        self.num_simulations = 0
+
+    def _key(self, sequence):
+        return json.dumps(sequence)
+
+    def are_failing(self, candidates):
+        """并行执行所有还没有执行过的候选序列，返回它们是否以同样的方式失败"""
+        pending = [c for c in candidates if self._key(c) not in self._known_results]
+        self._round += 1
+        with ProcessPoolExecutor(max_workers=self._regression.num_workers, max_tasks_per_child=1) as executor:
+            futures = {}
+            for idx, candidate in enumerate(pending):
+                settings = self._regression.make_settings(
+                    extra_env={self._env_name: self._key(candidate)},
+                    runs_dir=os.path.join('reduce', f"{self._item.test}_{self._item.seed}", f"{self._round}_{idx}"))
+                futures[self._key(candidate)] = executor.submit(_run_work_item, settings, self._item)
+            for key, future in futures.items():
+                result = future.result()
+                self.num_simulations += 1
+                failing = not result.passed
+                if failing and self._failure_signature is not None:
+                    failing = read_failure_signature(result.test_dir) == self._failure_signature
+                self._known_results[key] = failing
+        return [self._known_results[self._key(c)] for c in candidates]
+
+    def reduce(self, sequence):
+        """
+        Returns:
+            缩减之后的指令序列
+        """
+        minimal = ddmin(list(sequence), self.are_failing)
+        print(f"Reduced {self._item.test} (seed={self._item.seed}) from {len(sequence)} to {len(minimal)} "
+              f"instructions with {self.num_simulations} simulations")
+        return minimal
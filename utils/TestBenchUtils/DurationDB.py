@@ -0,0 +1,83 @@
+# -*- coding: UTF-8 -*-
+
+import sqlite3
+import statistics
+import time
+
+# 估算耗时的时候，只参考最近多少次的执行记录
+HISTORY_WINDOW = 10
+# 本次耗时超过历史中位数的多少倍，认为耗时出现了退化
+REGRESSION_RATIO = 1.5
+# 耗时差距小于这个值(秒)的时候不认为是退化，避免很短的用例因为抖动被误报
+REGRESSION_MIN_SECONDS = 1.0
+
+
+# 记录每个测试用例(以及随机种子)的历史执行情况，用于安排执行顺序以及发现耗时退化
+class Test_Duration_DB():
+    def __init__(self, db_path):
+        self._db_path = db_path
+        self._conn = sqlite3.connect(db_path, timeout=30)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS test_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                module TEXT NOT NULL,
+                test TEXT NOT NULL,
+                seed INTEGER,
+                passed INTEGER NOT NULL,
+                wall_time REAL NOT NULL,
+                sim_time_ns REAL,
+                peak_memory_kb INTEGER,
+                recorded_at REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS test_runs_by_test ON test_runs (module, test)")
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def record(self, module, test, seed, passed, wall_time, sim_time_ns, peak_memory_kb):
+        """记录一次测试用例的执行结果，返回记录的id"""
+        cursor = self._conn.execute(
+            "INSERT INTO test_runs (module, test, seed, passed, wall_time, sim_time_ns, peak_memory_kb, recorded_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (module, test, seed, int(bool(passed)), wall_time, sim_time_ns, peak_memory_kb, time.time()))
+        self._conn.commit()
+        return cursor.lastrowid
+
+    def history(self, module, test, before_id=None, limit=HISTORY_WINDOW):
+        """获取一个测试用例最近的执行耗时(秒)，从新到旧排列。before_id用来排除某次记录之后的数据"""
+        if before_id is None:
+            rows = self._conn.execute(
+                "SELECT wall_time FROM test_runs WHERE module = ? AND test = ? ORDER BY id DESC LIMIT ?",
+                (module, test, limit)).fetchall()
+        else:
+            rows = self._conn.execute(
+                "SELECT wall_time FROM test_runs WHERE module = ? AND test = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (module, test, before_id, limit)).fetchall()
+        return [row[0] for row in rows]
+
+    def estimate(self, module, test):
+        """
+        估算测试用例的执行耗时(秒)，取最近几次执行耗时的中位数
+        Returns:
+            None: 没有历史记录
+        """
+        durations = self.history(module, test)
+        if len(durations) == 0:
+            return None
+        return statistics.median(durations)
+
+    def is_regressed(self, record_id):
+        """
+        检查某次执行记录相对于它之前的历史记录，耗时是否出现了明显的退化
+        Returns:
+            (是否退化, 历史耗时中位数)，没有历史记录时中位数为None
+        """
+        module, test, wall_time = self._conn.execute(
+            "SELECT module, test, wall_time FROM test_runs WHERE id = ?", (record_id,)).fetchone()
+        durations = self.history(module, test, before_id=record_id)
+        if len(durations) == 0:
+            return False, None
+        baseline = statistics.median(durations)
+        regressed = wall_time > baseline * REGRESSION_RATIO and wall_time - baseline > REGRESSION_MIN_SECONDS
+        return regressed, baseline
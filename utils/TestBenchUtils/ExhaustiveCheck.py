@@ -0,0 +1,92 @@
+# -*- coding: UTF-8 -*-
+
+import time
+import numpy as np
+from cocotb.triggers import Timer
+from cocotb.utils import get_sim_time
+
+# 输出为x/z等无法解析的值时记录为-1，与任何参考值都不相等
+UNRESOLVED_VALUE = -1
+
+
+def input_grid(input_widths):
+    """
+    生成所有输入组合
+    parameters:
+        input_widths: {输入信号名: 位宽}，第一个输入变化最慢
+    Returns:
+        {输入信号名: 长度为所有组合数量的NumPy数组}
+    """
+    names = list(input_widths)
+    shape = [1 << input_widths[name] for name in names]
+    grid = np.indices(shape, dtype=np.int64).reshape(len(names), -1)
+    return {name: grid[idx] for idx, name in enumerate(names)}
+
+
+async def sweep_combinational(dut, inputs, output_names, settle_ns=1):
+    """
+    逐个输入向量驱动组合逻辑，每次等待settle_ns之后读取所有输出
+    parameters:
+        inputs: {输入信号名: NumPy数组}，所有数组的长度相同
+        output_names: 需要读取的输出信号名
+    Returns:
+        {输出信号名: NumPy数组}
+    """
+    input_handles = [(getattr(dut, name), values.tolist()) for name, values in inputs.items()]
+    output_handles = [getattr(dut, name) for name in output_names]
+    num_vectors = len(next(iter(inputs.values())))
+    outputs = np.full((len(output_names), num_vectors), UNRESOLVED_VALUE, dtype=np.int64)
+    settle = Timer(settle_ns, units='ns')
+
+    for idx in range(num_vectors):
+        for handle, values in input_handles:
+            handle.value = values[idx]
+        await settle
+        for out_idx, handle in enumerate(output_handles):
+            value = handle.value
+            if value.is_resolvable:
+                outputs[out_idx, idx] = int(value)
+    return {name: outputs[idx] for idx, name in enumerate(output_names)}
+
+
+def find_mismatches(actual, expected):
+    """
+    一次性比较所有输出
+    Returns:
+        至少有一个输出不一致的输入向量下标
+    """
+    mismatch = np.zeros(len(next(iter(actual.values()))), dtype=bool)
+    for name, values in expected.items():
+        mismatch |= actual[name] != np.asarray(values, dtype=np.int64)
+    return np.nonzero(mismatch)[0]
+
+
+def format_mismatch(inputs, actual, expected, idx):
+    stimulus = ', '.join(f"{name}={int(values[idx])}" for name, values in inputs.items())
+    results = ', '.join(f"{name}={int(actual[name][idx])} (expected {int(values[idx])})"
+                        for name, values in expected.items() if actual[name][idx] != values[idx])
+    return f"{stimulus}: {results}"
+
+
+async def check_exhaustive(dut, input_widths, reference, settle_ns=1):
+    """
+    穷举所有输入组合，与向量化的Python参考模型比较，报告所有不一致的输入向量
+    parameters:
+        input_widths: {输入信号名: 位宽}
+        reference: 参考模型，参数为{输入信号名: NumPy数组}，返回{输出信号名: NumPy数组}
+    Returns:
+        不一致的数量，每个不一致都已经写到日志中
+    """
+    inputs = input_grid(input_widths)
+    expected = reference(inputs)
+    start_sim_time = get_sim_time('ns')
+    start_wall_time = time.perf_counter()
+    actual = await sweep_combinational(dut, inputs, list(expected), settle_ns)
+    wall_time = time.perf_counter() - start_wall_time
+
+    mismatches = find_mismatches(actual, expected)
+    for idx in mismatches:
+        dut._log.error(format_mismatch(inputs, actual, expected, idx))
+    dut._log.info(f"{len(mismatches)} mismatches in {len(inputs[next(iter(inputs))])} vectors, "
+                  f"{get_sim_time('ns') - start_sim_time}ns simulated in {wall_time:.2f}s")
+    return len(mismatches)
@@ -0,0 +1,252 @@
+# -*- coding: UTF-8 -*-
+
+import argparse
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from GoldenTrace import TRACE_FILE_SUFFIX, read_trace
+
+GLITCH_SHORT_PULSE = 'short_pulse'
+GLITCH_SDA_WHILE_SCL_HIGH = 'sda_while_scl_high'
+# 默认把短于四分之一IIC时钟周期一半的脉冲认为是毛刺
+DEFAULT_FRACTION = 0.5
+
+# 总线信号的变化点：times[i]开始总线的电平是(scl[i], sda[i])，一直保持到times[i + 1]或者end_tick
+Bus_Trace = namedtuple('Bus_Trace', ['times', 'scl', 'sda', 'end_tick'])
+# 一个有问题的时间窗口[start_tick, end_tick)，level是窗口内signal的电平
+Glitch_Window = namedtuple('Glitch_Window', ['kind', 'signal', 'start_tick', 'end_tick', 'level'])
+
+
+def _make_bus_trace(times, scl, sda, end_tick):
+    """同一时刻的多个变化只保留最后一个，去掉两个信号都没有变化的点"""
+    times = np.asarray(times, dtype=np.int64)
+    scl = np.asarray(scl, dtype=np.int8)
+    sda = np.asarray(sda, dtype=np.int8)
+    if len(times) == 0:
+        return Bus_Trace(times, scl, sda, int(end_tick))
+    is_last_at_time = np.append(times[1:] != times[:-1], True)
+    times, scl, sda = times[is_last_at_time], scl[is_last_at_time], sda[is_last_at_time]
+    is_changed = np.ones(len(times), dtype=bool)
+    is_changed[1:] = (scl[1:] != scl[:-1]) | (sda[1:] != sda[:-1])
+    return Bus_Trace(times[is_changed], scl[is_changed], sda[is_changed], int(end_tick))
+
+
+def bus_from_samples(scl, sda, start_tick=0):
+    """
+    逐个tick采样的scl/sda序列，例如逻辑分析仪导出的采样或者检查器收集的信号序列
+    """
+    scl = np.asarray(scl, dtype=np.int8)
+    sda = np.asarray(sda, dtype=np.int8)
+    changes = np.flatnonzero((scl[1:] != scl[:-1]) | (sda[1:] != sda[:-1])) + 1
+    starts = np.concatenate(([0], changes))
+    return Bus_Trace(starts.astype(np.int64) + start_tick, scl[starts], sda[starts], start_tick + len(scl))
+
+
+def _resolve_levels(values):
+    """'0'是低电平，其余('1'、'z'以及无法确定的'x')都当作被上拉的高电平"""
+    return (np.asarray(values) != '0').astype(np.int8)
+
+
+def _resolve_line(columns, line):
+    """
+    得到一条总线的电平
+    parameters:
+        line: 总线信号名，或者(输出信号名, 占用信号名)：占用并且输出低电平时拉低总线，其余时候释放总线
+    """
+    if isinstance(line, str):
+        return _resolve_levels(columns[line])
+    out_name, using_name = line
+    return 1 - ((np.asarray(columns[out_name]) == '0') & (np.asarray(columns[using_name]) == '1')).astype(np.int8)
+
+
+def bus_from_runs(trace, scl_line, sda_line):
+    """
+    GoldenTrace记录的游程编码
+    parameters:
+        trace: read_trace的返回值
+        scl_line/sda_line: 总线信号名，或者(输出信号名, 占用信号名)
+    """
+    runs = trace['runs']
+    durations = np.fromiter((run[1] for run in runs), dtype=np.int64, count=len(runs))
+    times = np.concatenate(([0], np.cumsum(durations)))
+    values = [run[0].split(',') for run in runs]
+    columns = {name: [value[idx] for value in values] for idx, name in enumerate(trace['signals'])}
+    return _make_bus_trace(times[:-1], _resolve_line(columns, scl_line), _resolve_line(columns, sda_line), times[-1])
+
+
+def bus_from_vcd(path, scl_name, sda_name):
+    """
+    VCD文件中的两个1位信号，信号名可以带上层级前缀，也可以只写最后一级
+    没有初始值的信号当作高电平(总线空闲)
+    """
+    ids = {}
+    events = [] # (时间, 0: scl / 1: sda, 电平)
+    now = 0
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            if line.startswith('$var'):
+                fields = line.split()
+                name = fields[4]
+                for target, wanted in [(0, scl_name), (1, sda_name)]:
+                    if name == wanted or wanted.endswith('.' + name):
+                        ids[fields[3]] = target
+            elif line[0] == '#':
+                now = int(line[1:])
+            elif line[0] in '01xXzZ' and line[1:] in ids:
+                events.append((now, ids[line[1:]], line[0]))
+    if len(events) == 0:
+        return _make_bus_trace([], [], [], now)
+    times = np.array([event[0] for event in events], dtype=np.int64)
+    targets = np.array([event[1] for event in events], dtype=np.int8)
+    levels = _resolve_levels([event[2] for event in events])
+    bus = []
+    for target in [0, 1]:
+        # 每个事件时刻该信号最近一次的取值
+        is_target = targets == target
+        last_idx = np.maximum.accumulate(np.where(is_target, np.arange(len(events)), -1))
+        bus.append(np.where(last_idx >= 0, levels[np.maximum(last_idx, 0)], 1))
+    return _make_bus_trace(times, bus[0], bus[1], max(now, times[-1]))
+
+
+def _edges(times, levels):
+    """一个信号所有翻转的时刻以及翻转之后的电平"""
+    changed = np.flatnonzero(levels[1:] != levels[:-1]) + 1
+    return times[changed], levels[changed]
+
+
+def _neighbour_times(edge_times, ticks):
+    """edge_times中严格早于/严格晚于每个tick的最近时刻，没有时分别是-inf和+inf"""
+    padded = np.concatenate(([-np.inf], edge_times.astype(np.float64), [np.inf]))
+    prev = padded[np.searchsorted(edge_times, ticks, side='left')]
+    next_ = padded[np.searchsorted(edge_times, ticks, side='right') + 1]
+    return prev, next_
+
+
+def find_short_pulses(bus, min_ticks):
+    """
+    两个信号中持续时间小于min_ticks的电平(两次翻转之间的部分)
+    Returns:
+        Glitch_Window列表
+    """
+    windows = []
+    for name, levels in [('scl', bus.scl), ('sda', bus.sda)]:
+        edge_times, edge_levels = _edges(bus.times, levels)
+        widths = np.diff(edge_times)
+        for idx in np.flatnonzero(widths < min_ticks):
+            windows.append(Glitch_Window(GLITCH_SHORT_PULSE, name, int(edge_times[idx]), int(edge_times[idx + 1]),
+                                         int(edge_levels[idx])))
+    return windows
+
+
+def find_sda_while_scl_high(bus, min_ticks):
+    """
+    SCL保持高电平时SDA的翻转。只有前后至少min_ticks之内SCL和SDA都没有其它变化的翻转，
+    才认为是开始信号(下降沿)或者结束信号(上升沿)，其余的都是违规
+    Returns:
+        Glitch_Window列表，窗口是这次翻转前后最近的两次其它变化
+    """
+    if len(bus.times) < 2:
+        return []
+    sda_edge_idx = np.flatnonzero(bus.sda[1:] != bus.sda[:-1]) + 1
+    # 同一时刻SCL也在变化的翻转交给脉冲宽度检查
+    is_scl_high = (bus.scl[sda_edge_idx] == 1) & (bus.scl[sda_edge_idx - 1] == 1)
+    sda_edge_idx = sda_edge_idx[is_scl_high]
+    ticks = bus.times[sda_edge_idx]
+
+    scl_edge_times, _ = _edges(bus.times, bus.scl)
+    sda_edge_times, _ = _edges(bus.times, bus.sda)
+    prev_scl, next_scl = _neighbour_times(scl_edge_times, ticks)
+    prev_sda, next_sda = _neighbour_times(sda_edge_times, ticks)
+    prev_change = np.maximum(prev_scl, prev_sda)
+    # 记录开始之前以及结束之后都当作没有变化
+    next_change = np.minimum(next_scl, next_sda)
+    is_condition = (ticks - prev_change >= min_ticks) & (next_change - ticks >= min_ticks)
+
+    windows = []
+    for idx in np.flatnonzero(~is_condition):
+        start = int(max(prev_change[idx], bus.times[0]))
+        end = int(min(next_change[idx], bus.end_tick))
+        windows.append(Glitch_Window(GLITCH_SDA_WHILE_SCL_HIGH, 'sda', start, end,
+                                     int(bus.sda[sda_edge_idx[idx]])))
+    return windows
+
+
+def scan_bus(bus, quarter_ticks, fraction=DEFAULT_FRACTION):
+    """
+    扫描整个总线信号，阈值是fraction个四分之一IIC时钟周期
+    Returns:
+        按开始时刻排序的Glitch_Window列表
+    """
+    min_ticks = quarter_ticks * fraction
+    windows = find_short_pulses(bus, min_ticks) + find_sda_while_scl_high(bus, min_ticks)
+    return sorted(windows, key=lambda window: (window.start_tick, window.kind))
+
+
+def report_glitches(name, windows, limit=None):
+    """打印所有有问题的时间窗口，limit限制打印的数量"""
+    if len(windows) == 0:
+        return 0
+    print(f"GLITCH {name}: {len(windows)} offending windows")
+    for window in windows[:limit]:
+        print(f"  {window.kind:<20} {window.signal} level={window.level} "
+              f"ticks [{window.start_tick}, {window.end_tick}) width={window.end_tick - window.start_tick}")
+    if limit is not None and len(windows) > limit:
+        print(f"  ... {len(windows) - limit} more")
+    return len(windows)
+
+
+def scan_regression_traces(results, scl_line, sda_line, quarter_ticks, fraction=DEFAULT_FRACTION, limit=20):
+    """
+    扫描一次回归中每个测试单元通过with_bus_trace记录的总线信号
+    parameters:
+        results: Test_Result列表
+        scl_line/sda_line: 见bus_from_runs
+    Returns:
+        有毛刺的测试单元数量
+    """
+    affected = 0
+    for result in results:
+        trace_path = os.path.join(result.test_dir, f"{result.test}{TRACE_FILE_SUFFIX}")
+        if not os.path.isfile(trace_path):
+            continue
+        windows = scan_bus(bus_from_runs(read_trace(trace_path), scl_line, sda_line), quarter_ticks, fraction)
+        affected += int(report_glitches(f"{result.test} seed={result.seed}", windows, limit) > 0)
+    return affected
+
+
+def _parse_line(text):
+    """命令行中的总线信号：'name'或者'out_name:using_name'"""
+    return tuple(text.split(':')) if ':' in text else text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="扫描记录的scl/sda信号中的毛刺以及SCL高电平期间SDA的违规翻转")
+    parser.add_argument('paths', nargs='+', help=f"VCD文件(.vcd)、游程编码文件({TRACE_FILE_SUFFIX})或者逐tick采样的.npz(包含scl和sda两个数组)")
+    parser.add_argument('--scl', default='scl', help="SCL信号名，或者 输出信号名:占用信号名")
+    parser.add_argument('--sda', default='sda', help="SDA信号名，或者 输出信号名:占用信号名")
+    parser.add_argument('--quarter-ticks', type=float, required=True, help="四分之一IIC时钟周期对应的tick数量")
+    parser.add_argument('--fraction', type=float, default=DEFAULT_FRACTION, help="短于fraction个四分之一周期的脉冲认为是毛刺")
+    parser.add_argument('--limit', type=int, default=None, help="每个文件最多打印的窗口数量")
+    args = parser.parse_args()
+
+    affected = 0
+    for path in args.paths:
+        if path.endswith(TRACE_FILE_SUFFIX):
+            bus = bus_from_runs(read_trace(path), _parse_line(args.scl), _parse_line(args.sda))
+        elif path.endswith('.npz'):
+            samples = np.load(path)
+            bus = bus_from_samples(samples['scl'], samples['sda'])
+        else:
+            bus = bus_from_vcd(path, args.scl, args.sda)
+        windows = scan_bus(bus, args.quarter_ticks, args.fraction)
+        affected += int(report_glitches(path, windows, args.limit) > 0)
+    return 1 if affected else 0
+
+
+if __name__ == '__main__':
+    exit(main())
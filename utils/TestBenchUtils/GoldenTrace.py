@@ -0,0 +1,238 @@
+# -*- coding: UTF-8 -*-
+
+import argparse
+import functools
+import gzip
+import json
+import os
+import shutil
+
+import cocotb
+from cocotb.triggers import Edge
+from cocotb.utils import get_sim_time
+
+# 测试用例把总线信号的游程编码写到这个目录下，默认是仿真的执行目录
+ENV_TRACE_DIR = 'TB_TRACE_DIR'
+TRACE_FILE_SUFFIX = '.trace.gz'
+
+
+# 通过边沿回调记录若干信号组合值的游程编码，时间单位是step
+# 只在信号变化时产生回调，开销和信号变化次数相关，和时钟周期数无关
+class Bus_Trace_Recorder():
+    def __init__(self, dut, signal_names):
+        self._handles = [dut._id(name, extended=False) for name in signal_names]
+        self._names = list(signal_names)
+        self._runs = [] # [组合值, 开始时间]
+        self._start_time = 0
+        self._tasks = []
+
+    def _current_value(self):
+        return ','.join(handle.value.binstr for handle in self._handles)
+
+    def start(self):
+        self._start_time = get_sim_time('step')
+        self._runs = [[self._current_value(), self._start_time]]
+        for handle in self._handles:
+            self._tasks.append(cocotb.start_soon(self._watch(handle)))
+
+    def stop(self):
+        for task in self._tasks:
+            task.kill()
+        self._tasks = []
+
+    async def _watch(self, handle):
+        edge = Edge(handle)
+        while True:
+            await edge
+            now = get_sim_time('step')
+            value = self._current_value()
+            if value == self._runs[-1][0]:
+                continue
+            if self._runs[-1][1] == now:
+                # 同一时刻多个信号先后变化，只保留最终的组合值
+                self._runs[-1][0] = value
+                if len(self._runs) > 1 and self._runs[-2][0] == value:
+                    self._runs.pop()
+            else:
+                self._runs.append([value, now])
+
+    def get_trace(self):
+        """
+        Returns:
+            {'signals': 信号名列表, 'runs': [[组合值, 持续时间], ...]}，时间从记录开始的时刻算起
+        """
+        now = get_sim_time('step')
+        runs = []
+        for idx, (value, begin) in enumerate(self._runs):
+            end = self._runs[idx + 1][1] if idx + 1 < len(self._runs) else now
+            if end > begin:
+                runs.append([value, end - begin])
+        return {'signals': self._names, 'runs': runs}
+
+
+def write_trace(path, trace):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with gzip.open(path, 'wt') as f:
+        json.dump(trace, f)
+
+
+def read_trace(path):
+    with gzip.open(path, 'rt') as f:
+        return json.load(f)
+
+
+def with_bus_trace(signal_names):
+    """
+    测试用例装饰器(放在@cocotb.test之下)：记录signal_names的游程编码，
+    测试结束后(无论是否通过)写出 <TB_TRACE_DIR>/<测试用例名>.trace.gz
+    """
+    def decorator(test_func):
+        @functools.wraps(test_func)
+        async def wrapper(dut, *args, **kwargs):
+            recorder = Bus_Trace_Recorder(dut, signal_names)
+            recorder.start()
+            try:
+                return await test_func(dut, *args, **kwargs)
+            finally:
+                recorder.stop()
+                path = os.path.join(os.environ.get(ENV_TRACE_DIR, '.'), f"{test_func.__name__}{TRACE_FILE_SUFFIX}")
+                write_trace(path, recorder.get_trace())
+        return wrapper
+    return decorator
+
+
+def find_first_divergence(golden_runs, actual_runs):
+    """
+    同时遍历两组游程编码，找到第一个不一致的时刻，每一步跳过一整段相同的游程，而不是逐个时钟周期比较
+    Returns:
+        None: 两组信号完全一致
+        (时间, 期望的组合值, 实际的组合值)，其中一组先结束时对应的值为None
+    """
+    golden_idx = actual_idx = 0
+    golden_left = golden_runs[0][1] if len(golden_runs) else 0
+    actual_left = actual_runs[0][1] if len(actual_runs) else 0
+    time = 0
+    while golden_idx < len(golden_runs) and actual_idx < len(actual_runs):
+        golden_value = golden_runs[golden_idx][0]
+        actual_value = actual_runs[actual_idx][0]
+        if golden_value != actual_value:
+            return time, golden_value, actual_value
+        step = min(golden_left, actual_left)
+        time += step
+        golden_left -= step
+        actual_left -= step
+        if golden_left == 0:
+            golden_idx += 1
+            golden_left = golden_runs[golden_idx][1] if golden_idx < len(golden_runs) else 0
+        if actual_left == 0:
+            actual_idx += 1
+            actual_left = actual_runs[actual_idx][1] if actual_idx < len(actual_runs) else 0
+    if golden_idx < len(golden_runs):
+        return time, golden_runs[golden_idx][0], None
+    if actual_idx < len(actual_runs):
+        return time, None, actual_runs[actual_idx][0]
+    return None
+
+
+# 黄金波形库：按照 测试模块/测试用例_随机种子 保存总线信号的游程编码
+class Golden_Trace_Store():
+    def __init__(self, root_dir):
+        self._root_dir = root_dir
+
+    def get_path(self, module, test, seed):
+        return os.path.join(self._root_dir, module, f"{test}_{seed}{TRACE_FILE_SUFFIX}")
+
+    def has(self, module, test, seed):
+        return os.path.isfile(self.get_path(module, test, seed))
+
+    def load(self, module, test, seed):
+        return read_trace(self.get_path(module, test, seed))
+
+    def update(self, module, test, seed, trace_path):
+        """用一次执行记录的信号替换黄金波形"""
+        path = self.get_path(module, test, seed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(trace_path, path)
+
+    def compare(self, module, test, seed, trace_path):
+        """
+        和黄金波形比较
+        Returns:
+            'missing': 黄金波形库中还没有这个测试单元
+            None: 完全一致
+            (时间, 期望的组合值, 实际的组合值): 第一个不一致的地方
+        """
+        if not self.has(module, test, seed):
+            return 'missing'
+        golden = self.load(module, test, seed)
+        actual = read_trace(trace_path)
+        if golden['signals'] != actual['signals']:
+            return 0, ','.join(golden['signals']), ','.join(actual['signals'])
+        return find_first_divergence(golden['runs'], actual['runs'])
+
+
+def report_divergence(test, seed, divergence):
+    """打印比较结果，返回信号是否发生了变化"""
+    if divergence == 'missing':
+        print(f"NO GOLDEN TRACE: {test} (seed={seed})")
+        return False
+    if divergence is None:
+        return False
+    time, expected, actual = divergence
+    print(f"TRACE CHANGED: {test} (seed={seed}) at +{time} steps, expected {expected}, got {actual}")
+    return True
+
+
+def compare_regression_traces(store, module, results, update=False):
+    """
+    把一次回归中每个测试单元记录的信号和黄金波形比较，update为True时把通过的测试单元的信号写入黄金波形库
+    parameters:
+        store: Golden_Trace_Store
+        module: 测试模块名
+        results: Test_Result列表
+    Returns:
+        信号发生变化的测试单元数量(不包括黄金波形库中不存在的)
+    """
+    changed = 0
+    for result in results:
+        trace_path = os.path.join(result.test_dir, f"{result.test}{TRACE_FILE_SUFFIX}")
+        if not os.path.isfile(trace_path):
+            continue
+        if update:
+            if result.passed:
+                store.update(module, result.test, result.seed, trace_path)
+            continue
+        divergence = store.compare(module, result.test, result.seed, trace_path)
+        changed += report_divergence(result.test, result.seed, divergence)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把回归记录的总线信号和黄金波形比较，或者更新黄金波形")
+    parser.add_argument('action', choices=['check', 'update'])
+    parser.add_argument('golden_dir', help="黄金波形库目录")
+    parser.add_argument('module', help="测试模块名")
+    parser.add_argument('runs_dir', help="回归的执行目录，即 <build_dir>/runs")
+    args = parser.parse_args()
+
+    store = Golden_Trace_Store(args.golden_dir)
+    changed = 0
+    for run_name in sorted(os.listdir(args.runs_dir)):
+        run_dir = os.path.join(args.runs_dir, run_name)
+        for file_name in os.listdir(run_dir):
+            if not file_name.endswith(TRACE_FILE_SUFFIX):
+                continue
+            test = file_name[:-len(TRACE_FILE_SUFFIX)]
+            # 执行目录的名字是 <测试用例名>_<随机种子>
+            seed = run_name[len(test) + 1:]
+            trace_path = os.path.join(run_dir, file_name)
+            if args.action == 'update':
+                store.update(args.module, test, seed, trace_path)
+                continue
+            divergence = store.compare(args.module, test, seed, trace_path)
+            changed += report_divergence(test, seed, divergence)
+    return 1 if changed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,400 @@
+# -*- coding: UTF-8 -*-
+
+import mmap
+from collections import namedtuple
+
+import cocotb
+from cocotb.triggers import Edge, Event, FallingEdge, First, RisingEdge
+from cocotb.utils import get_sim_time
+
+# _receive_bit在SCL高电平期间检测到SDA变化时的返回值
+IIC_CONDITION_START = 'start'
+IIC_CONDITION_STOP = 'stop'
+
+
+# 边沿驱动的IIC从设备：只在SCL/SDA的边沿被唤醒，一个位只需要几次回调，与主机的分频系数无关
+# 子类通过重写on_xxx接口实现具体器件的行为
+class IIC_Target():
+    def __init__(self, scl, sda, sda_pull_low):
+        """
+        parameters:
+            scl: 线与之后的SCL总线(只读)
+            sda: 线与之后的SDA总线(只读)
+            sda_pull_low: 从设备对SDA的驱动，1表示拉低SDA，0表示释放SDA(由上拉电阻拉高)
+        """
+        self._scl = scl
+        self._sda = sda
+        self._sda_pull_low = sda_pull_low
+        self._sda_pull_low.value = 0
+        self._task = None
+
+    # >>> BEG: 子类需要实现的接口
+    def on_start(self):
+        """检测到开始信号(包括重复开始信号)"""
+
+    def on_stop(self):
+        """检测到结束信号"""
+
+    def on_address(self, address, is_read):
+        """
+        接收到地址字节
+        Returns:
+            是否回复ACK，回复NACK之后直到下一个开始信号之前都不再参与总线
+        """
+        return False
+
+    def on_write_byte(self, value):
+        """
+        接收到主机写入的字节
+        Returns:
+            是否回复ACK
+        """
+        return True
+
+    def on_read_byte(self):
+        """
+        主机读取一个字节
+        Returns:
+            需要发送的字节
+        """
+        return 0xFF
+
+    def on_read_ack(self, is_ack):
+        """主机对读取的字节回复了ACK(is_ack为True)或者NACK"""
+    # <<< END: 子类需要实现的接口
+
+    def start(self):
+        self._task = cocotb.start_soon(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.kill()
+            self._task = None
+        self._sda_pull_low.value = 0
+
+    async def _wait_start(self):
+        """等待SCL高电平期间SDA的下降沿"""
+        while True:
+            await FallingEdge(self._sda)
+            if self._scl.value == 1:
+                return
+
+    async def _receive_bit(self):
+        """
+        在SCL上升沿采样一位，并等待SCL的下降沿
+        Returns:
+            采样到的位；SCL高电平期间SDA发生变化时返回IIC_CONDITION_START或者IIC_CONDITION_STOP
+        """
+        await RisingEdge(self._scl)
+        bit = int(self._sda.value)
+        scl_falling = FallingEdge(self._scl)
+        fired = await First(scl_falling, Edge(self._sda))
+        if fired is scl_falling:
+            return bit
+        return IIC_CONDITION_START if self._sda.value == 0 else IIC_CONDITION_STOP
+
+    async def _receive_byte(self):
+        """Returns: 接收到的字节，或者中途检测到的开始/结束信号"""
+        value = 0
+        for _ in range(8):
+            bit = await self._receive_bit()
+            if isinstance(bit, str):
+                return bit
+            value = (value << 1) | bit
+        return value
+
+    async def _send_ack(self, is_ack):
+        """在第9个时钟周期回复ACK/NACK，调用时SCL处于低电平"""
+        self._sda_pull_low.value = int(is_ack)
+        await RisingEdge(self._scl)
+        await FallingEdge(self._scl)
+        self._sda_pull_low.value = 0
+
+    async def _send_byte(self, value):
+        """
+        高位先发送，每个位在SCL的下降沿之后设置，调用时SCL处于低电平
+        Returns:
+            None；SCL高电平期间SDA发生变化时(主机在没有回复NACK的情况下直接发送了开始/结束信号)，
+            立刻释放SDA并返回IIC_CONDITION_START或者IIC_CONDITION_STOP
+        """
+        for idx in range(7, -1, -1):
+            self._sda_pull_low.value = 1 - ((value >> idx) & 1)
+            await RisingEdge(self._scl)
+            scl_falling = FallingEdge(self._scl)
+            fired = await First(scl_falling, Edge(self._sda))
+            if fired is not scl_falling:
+                self._sda_pull_low.value = 0
+                return IIC_CONDITION_START if self._sda.value == 0 else IIC_CONDITION_STOP
+        self._sda_pull_low.value = 0
+        return None
+
+    async def _transaction(self):
+        """
+        处理一次开始信号之后的传输
+        Returns:
+            结束这次传输的信号：IIC_CONDITION_START或者IIC_CONDITION_STOP
+        """
+        self.on_start()
+        address_byte = await self._receive_byte()
+        if isinstance(address_byte, str):
+            return address_byte
+        is_read = bool(address_byte & 1)
+        is_ack = self.on_address(address_byte >> 1, is_read)
+        await self._send_ack(is_ack)
+        if is_ack and is_read:
+            while True:
+                condition = await self._send_byte(self.on_read_byte())
+                if condition is not None:
+                    return condition
+                bit = await self._receive_bit()
+                if isinstance(bit, str):
+                    return bit
+                self.on_read_ack(bit == 0)
+                if bit != 0:
+                    break
+        elif is_ack:
+            while True:
+                value = await self._receive_byte()
+                if isinstance(value, str):
+                    return value
+                await self._send_ack(self.on_write_byte(value))
+        # 被NACK之后只等待总线上的开始/结束信号
+        while True:
+            bit = await self._receive_bit()
+            if isinstance(bit, str):
+                return bit
+
+    async def _run(self):
+        while True:
+            await self._wait_start()
+            condition = IIC_CONDITION_START
+            while condition == IIC_CONDITION_START:
+                condition = await self._transaction()
+            self.on_stop()
+
+
+# 从设备记录的一次传输：从开始信号(或者重复开始信号)到结束信号(或者下一个重复开始信号)
+# data是写入的字节，或者读取时被主机回复了ACK/NACK的字节
+IIC_Transaction = namedtuple('IIC_Transaction', ['address', 'is_read', 'data', 'start_ns', 'stop_ns'])
+
+
+# 记录总线上所有发给自己的传输，用于检查主机发出的请求；读取的数据由read_source提供
+class Recording_Target(IIC_Target):
+    def __init__(self, scl, sda, sda_pull_low, address, read_source=None):
+        """
+        parameters:
+            address: 7位器件地址
+            read_source: 无参数的函数，每次主机读取时返回下一个要发送的字节，默认一直返回0xFF
+        """
+        super().__init__(scl, sda, sda_pull_low)
+        self.address = address
+        self._read_source = read_source or (lambda: 0xFF)
+        self.transactions = []
+        self._current = None
+        self._start_ns = 0
+        self._pending_read = None
+
+    def _close_current(self):
+        if self._current is not None:
+            address, is_read, data, start_ns = self._current
+            self.transactions.append(IIC_Transaction(address, is_read, bytes(data), start_ns, get_sim_time('ns')))
+        self._current = None
+
+    def on_start(self):
+        self._close_current()
+        self._start_ns = get_sim_time('ns')
+
+    def on_stop(self):
+        self._close_current()
+
+    def on_address(self, address, is_read):
+        if address != self.address:
+            return False
+        self._current = (address, is_read, bytearray(), self._start_ns)
+        return True
+
+    def on_write_byte(self, value):
+        self._current[2].append(value)
+        return True
+
+    def on_read_byte(self):
+        self._pending_read = self._read_source()
+        return self._pending_read
+
+    def on_read_ack(self, is_ack):
+        # 只记录完整发送完毕(收到了ACK/NACK)的字节
+        self._current[2].append(self._pending_read)
+
+
+# 24Cxx系列EEPROM的行为模型，存储直接使用镜像文件的mmap，读写都不需要复制镜像
+# 支持：当前地址读、随机读、顺序读、页写入(写入周期内对地址回复NACK，即ACK polling)
+class EEPROM_Target(IIC_Target):
+    def __init__(self, scl, sda, sda_pull_low, image_path, address=0x50, address_bytes=2, page_size=32,
+                 write_cycle_ns=5_000_000, persist=False):
+        """
+        parameters:
+            image_path: 镜像文件，文件大小就是EEPROM的容量
+            address: 7位器件地址
+            address_bytes: 字地址的字节数，24C01~24C16是1个字节，24C32及以上是2个字节
+                容量超过字地址的范围时，超出的高位由器件地址的低位给出(24C04~24C16的块选择)
+            page_size: 页写入的大小，写入地址在页内回绕
+            write_cycle_ns: 结束信号之后的内部写入周期，期间对地址回复NACK
+            persist: 写入是否保存到镜像文件中，否则只修改内存中的副本
+        """
+        super().__init__(scl, sda, sda_pull_low)
+        self._file = open(image_path, 'r+b' if persist else 'rb')
+        self.memory = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if persist else mmap.ACCESS_COPY)
+        self.size = len(self.memory)
+        self.address_bytes = address_bytes
+        self.page_size = page_size
+        self.write_cycle_ns = write_cycle_ns
+        self._block_bits = max(0, (self.size - 1).bit_length() - 8 * address_bytes)
+        self.address = address & ~((1 << self._block_bits) - 1)
+        # 当前地址指针，顺序读和当前地址读都从这里开始
+        self.pointer = 0
+        self._busy_until_ns = 0
+        self._block = 0
+        self._word_address = 0
+        self._pending_address_bytes = 0
+        self._page_base = 0
+        self._page_offset = 0
+        self._page_writes = {}
+        self.statistics = {'reads': 0, 'writes': 0, 'write_cycles': 0, 'busy_nacks': 0}
+
+    def close(self):
+        self.stop()
+        self.memory.close()
+        self._file.close()
+
+    def is_busy(self):
+        return get_sim_time('ns') < self._busy_until_ns
+
+    def on_start(self):
+        # 重复开始信号之前写入的数据不会生效
+        self._page_writes.clear()
+
+    def on_stop(self):
+        if not self._page_writes:
+            return
+        for addr, value in self._page_writes.items():
+            self.memory[addr] = value
+        self._page_writes.clear()
+        self.statistics['write_cycles'] += 1
+        self._busy_until_ns = get_sim_time('ns') + self.write_cycle_ns
+
+    def on_address(self, address, is_read):
+        if address >> self._block_bits != self.address >> self._block_bits:
+            return False
+        if self.is_busy():
+            self.statistics['busy_nacks'] += 1
+            return False
+        self._block = address & ((1 << self._block_bits) - 1)
+        self._pending_address_bytes = 0 if is_read else self.address_bytes
+        self._word_address = 0
+        return True
+
+    def on_write_byte(self, value):
+        if self._pending_address_bytes > 0:
+            self._word_address = (self._word_address << 8) | value
+            self._pending_address_bytes -= 1
+            if self._pending_address_bytes == 0:
+                address = ((self._block << (8 * self.address_bytes)) | self._word_address) % self.size
+                self.pointer = address
+                self._page_base = address - address % self.page_size
+                self._page_offset = address % self.page_size
+            return True
+        self._page_writes[self._page_base + self._page_offset] = value
+        self._page_offset = (self._page_offset + 1) % self.page_size
+        self.pointer = self._page_base + self._page_offset
+        self.statistics['writes'] += 1
+        return True
+
+    def on_read_byte(self):
+        value = self.memory[self.pointer]
+        self.pointer = (self.pointer + 1) % self.size
+        self.statistics['reads'] += 1
+        return value
+
+
+# TM1650的命令地址(7位)：显示控制命令以及DIG1~DIG4的显存地址，与1_IIC/sample_for_TM1650/top.v保持一致
+TM1650_CONTROL_ADDRESS = 0x24
+TM1650_KEY_ADDRESS = 0x27
+TM1650_DIGIT_ADDRESSES = (0x34, 0x35, 0x36, 0x37)
+# 共阴极数码管的段码(不带小数点)，小数点是最高位
+TM1650_SEGMENT_CODES = {
+    0x3F: '0', 0x06: '1', 0x5B: '2', 0x4F: '3', 0x66: '4', 0x6D: '5', 0x7D: '6', 0x07: '7', 0x7F: '8', 0x6F: '9',
+    0x77: 'A', 0x7C: 'B', 0x39: 'C', 0x5E: 'D', 0x79: 'E', 0x71: 'F', 0x40: '-', 0x00: ' ',
+}
+TM1650_DECIMAL_POINT = 0x80
+
+# 某一时刻的显示状态：digits是DIG1~DIG4的段码，brightness是1~8级亮度
+TM1650_State = namedtuple('TM1650_State', ['display_on', 'brightness', 'is_seven_segment', 'digits'])
+
+
+def decode_segments(code):
+    """把段码翻译成字符，无法识别的段码返回'?'，带小数点时在字符后面加上'.'"""
+    text = TM1650_SEGMENT_CODES.get(code & ~TM1650_DECIMAL_POINT, '?')
+    return text + '.' if code & TM1650_DECIMAL_POINT else text
+
+
+# TM1650数码管驱动芯片的行为模型：对命令地址和显存地址回复ACK，记录显示状态以及每次更新的时间线
+class TM1650_Target(IIC_Target):
+    def __init__(self, scl, sda, sda_pull_low, key_code=0x2E):
+        """
+        parameters:
+            key_code: 读取按键地址时返回的按键码，默认是没有按键按下
+        """
+        super().__init__(scl, sda, sda_pull_low)
+        self.key_code = key_code
+        self.display_on = False
+        self.brightness = 8
+        self.is_seven_segment = False
+        self.digits = [0x00] * len(TM1650_DIGIT_ADDRESSES)
+        # (仿真时间ns, TM1650_State)，每次显示状态发生变化时追加一项
+        self.timeline = []
+        # 每次显示状态发生变化时触发，等待之前需要先clear
+        self.updated = Event()
+        self._command = None
+
+    def state(self):
+        return TM1650_State(self.display_on, self.brightness, self.is_seven_segment, tuple(self.digits))
+
+    def text(self):
+        """
+        当前DIG1~DIG4显示的字符，显示关闭时返回空字符串
+        e.g. 显示0x2A时返回 '002A'
+        """
+        if not self.display_on:
+            return ''
+        return ''.join(decode_segments(code) for code in self.digits)
+
+    def on_start(self):
+        self._command = None
+
+    def on_address(self, address, is_read):
+        if is_read:
+            return address == TM1650_KEY_ADDRESS
+        if address != TM1650_CONTROL_ADDRESS and address not in TM1650_DIGIT_ADDRESSES:
+            return False
+        self._command = address
+        return True
+
+    def on_write_byte(self, value):
+        # 每个命令只带一个数据字节
+        if self._command is None:
+            return False
+        if self._command == TM1650_CONTROL_ADDRESS:
+            self.display_on = bool(value & 0x01)
+            self.is_seven_segment = bool(value & 0x08)
+            self.brightness = (value >> 4) & 0x07 or 8
+        else:
+            self.digits[TM1650_DIGIT_ADDRESSES.index(self._command)] = value
+        self._command = None
+        state = self.state()
+        if not self.timeline or self.timeline[-1][1] != state:
+            self.timeline.append((get_sim_time('ns'), state))
+            self.updated.set()
+        return True
+
+    def on_read_byte(self):
+        return self.key_code
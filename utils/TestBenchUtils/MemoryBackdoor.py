@@ -0,0 +1,139 @@
+# -*- coding: UTF-8 -*-
+
+import mmap
+
+import numpy as np
+
+# GPI的写入方式，与cocotb.handle中的_check_for_set_action保持一致
+GPI_DEPOSIT = 0
+# 值中未知的位(x/z)按0处理，例如还没有被写入过的RAM
+_UNKNOWN_BITS_TO_ZERO = str.maketrans('xXzZuUwWlLhH-', '0000000000110')
+
+
+def find_memory(root, path):
+    """
+    按照层级路径找到存储数组的句柄，路径中可以包含下划线开头的内部信号
+    parameters:
+        root: 起始的层级句柄，通常是dut
+        path: 以'.'分隔的路径，例如 '_inst_top_for_iic_proxy._inst_fake_ram._r_data'
+    """
+    handle = root
+    for name in path.split('.'):
+        handle = handle._id(name, extended=False)
+    return handle
+
+
+def _word_dtype(word_bytes):
+    """每个字的字节数对应的小端无符号整数类型，没有对应的NumPy类型时返回None"""
+    if word_bytes in (1, 2, 4, 8):
+        return np.dtype(f'<u{word_bytes}')
+    return None
+
+
+def words_from_buffer(data, word_bits):
+    """
+    把原始字节(小端，每个字占 ceil(word_bits / 8) 个字节)转换成字的列表
+    parameters:
+        data: bytes/bytearray/memoryview/mmap等支持缓冲区协议的对象，或者NumPy数组(每个元素是一个字)
+        word_bits: 每个字的位宽
+    Returns:
+        Python int的列表
+    """
+    if isinstance(data, np.ndarray):
+        return data.ravel().tolist()
+    word_bytes = (word_bits + 7) // 8
+    view = memoryview(data).cast('B')
+    count = len(view) // word_bytes
+    dtype = _word_dtype(word_bytes)
+    if dtype is not None:
+        return np.frombuffer(view, dtype=dtype, count=count).tolist()
+    return [int.from_bytes(view[idx * word_bytes:(idx + 1) * word_bytes], 'little') for idx in range(count)]
+
+
+# 存储数组的后门访问：不经过RTL的读写端口，直接通过仿真器句柄整体写入或者读出存储的内容，不消耗仿真时间
+# 支持SinglePortRAM的_r_data以及SyncFIFO_Memory的_r_memories这类一维的reg数组
+class Memory_Backdoor():
+    def __init__(self, memory):
+        """
+        parameters:
+            memory: 存储数组的句柄，可以通过find_memory获取
+        """
+        self._memory = memory
+        low, high = sorted(memory._range)
+        # 地址0对应数组中下标最小的元素；元素句柄只在这里创建一次，之后的读写直接调用GPI
+        self._elements = [memory[idx] for idx in range(low, high + 1)]
+        self._gpi_handles = [element._handle for element in self._elements]
+        self.depth = len(self._elements)
+        self.word_bits = len(self._elements[0])
+        self.word_bytes = (self.word_bits + 7) // 8
+
+    def _check_range(self, offset, count):
+        if offset < 0 or offset + count > self.depth:
+            raise IndexError(f"{self._memory._path}: range [{offset}, {offset + count}) out of depth {self.depth}")
+
+    def load(self, data, offset=0):
+        """
+        从offset开始立刻写入data，写入的值在当前时刻就可以被组合逻辑读取到
+        注意带复位清零的存储(例如4_DRAM中的SinglePortRAM)需要在复位之后再写入
+        parameters:
+            data: 原始字节(小端)、NumPy数组或者字的列表
+            offset: 写入的起始地址(字)
+        Returns:
+            写入的字数
+        """
+        words = data if isinstance(data, list) else words_from_buffer(data, self.word_bits)
+        self._check_range(offset, len(words))
+        mask = (1 << self.word_bits) - 1
+        if self.word_bits <= 32:
+            for gpi_handle, word in zip(self._gpi_handles[offset:offset + len(words)], words):
+                gpi_handle.set_signal_val_int(GPI_DEPOSIT, word & mask)
+        else:
+            for element, word in zip(self._elements[offset:offset + len(words)], words):
+                element.setimmediatevalue(word & mask)
+        return len(words)
+
+    def load_file(self, path, offset=0, file_offset=0, length=None):
+        """
+        把文件映射到内存后整体写入，适用于较大的程序镜像
+        parameters:
+            file_offset: 文件中的起始字节
+            length: 读取的字节数，默认到文件结尾
+        """
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                end = len(mapped) if length is None else file_offset + length
+                with memoryview(mapped) as view:
+                    return self.load(view[file_offset:end], offset)
+
+    def fill(self, value=0):
+        """把整个存储填充成同一个值"""
+        return self.load([value] * self.depth)
+
+    def dump(self, offset=0, count=None):
+        """
+        立刻读出从offset开始的count个字，未知的位按0处理
+        Returns:
+            NumPy数组，位宽超过64时元素类型是object(Python int)
+        """
+        if count is None:
+            count = self.depth - offset
+        self._check_range(offset, count)
+        words = [int(gpi_handle.get_signal_val_binstr().translate(_UNKNOWN_BITS_TO_ZERO), 2)
+                 for gpi_handle in self._gpi_handles[offset:offset + count]]
+        if self.word_bits > 64:
+            return np.array(words, dtype=object)
+        # 能容纳一个字的最小的NumPy整数类型
+        item_bytes = 1 << (self.word_bytes - 1).bit_length()
+        return np.array(words, dtype=_word_dtype(item_bytes))
+
+    def dump_bytes(self, offset=0, count=None):
+        """读出存储的内容，转换成原始字节(小端，每个字占word_bytes个字节)"""
+        words = self.dump(offset, count)
+        if words.dtype != object and words.dtype.itemsize == self.word_bytes:
+            return words.tobytes()
+        return b''.join(int(word).to_bytes(self.word_bytes, 'little') for word in words)
+
+    def dump_file(self, path, offset=0, count=None):
+        """读出存储的内容并写入文件，格式与load_file一致"""
+        with open(path, 'wb') as f:
+            f.write(self.dump_bytes(offset, count))
@@ -0,0 +1,466 @@
+# -*- coding: UTF-8 -*-
+
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque, namedtuple
+
+import cocotb
+import cocotb.outcomes as outcomes
+import cocotb.utils
+from cocotb.binary import BinaryValue
+from cocotb.task import Task
+from cocotb.triggers import Edge, FallingEdge, Join, NextTimeStep, ReadOnly, ReadWrite, RisingEdge, Timer, Trigger, \
+    Waitable, First
+
+# 默认的仿真精度，和各个测试平台的timescale=('1us', '1ns')一致，1个step是1ns
+DEFAULT_PRECISION = -9
+# 测试用例没有设置超时时，最多仿真的时间
+DEFAULT_TIMEOUT_NS = 50_000_000
+
+# 一个测试用例在模拟器上的执行结果
+Mock_Test_Result = namedtuple('Mock_Test_Result', ['test', 'passed', 'skipped', 'error', 'sim_time_ns', 'wall_time'])
+
+
+class Mock_Deadlock(Exception):
+    """所有协程都在等待，但是再也不会有任何事件发生"""
+
+
+class Mock_Timeout(Exception):
+    """仿真时间超过了测试用例的超时设置"""
+
+
+def to_binstr(value, width):
+    """
+    把写入信号的值转换成width位的01xz字符串
+    parameters:
+        value: 整数、bool、BinaryValue或者字符串('z'这样的单个字符会扩展到所有位)
+    """
+    if isinstance(value, BinaryValue):
+        value = value.binstr
+    if isinstance(value, str):
+        value = value.lower()
+        if len(value) == 1 and width > 1:
+            return value * width
+        return value.rjust(width, '0')[-width:]
+    return format(int(value) & ((1 << width) - 1), f'0{width}b')
+
+
+# 模拟的信号句柄，用法和cocotb的句柄一致：读取.value得到BinaryValue，写入.value在当前时间步的写入阶段生效
+class Mock_Signal():
+    def __init__(self, dut, name, width, is_input):
+        self._dut = dut
+        self._name = name
+        self._path = f"{dut._name}.{name}"
+        self._width = width
+        self._is_input = is_input
+        self._binstr = 'z' * width if is_input else 'x' * width
+        self._value = None
+
+    @property
+    def value(self):
+        if self._value is None:
+            self._value = BinaryValue(self._binstr, n_bits=self._width, bigEndian=False)
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._dut._simulator.schedule_write(self, to_binstr(value, self._width))
+
+    def setimmediatevalue(self, value):
+        self._dut._simulator.apply_immediately(self, to_binstr(value, self._width))
+
+    def _set(self, binstr):
+        """Returns: 值是否发生了变化"""
+        if binstr == self._binstr:
+            return False
+        self._binstr = binstr
+        self._value = None
+        return True
+
+    def __len__(self):
+        return self._width
+
+    def __int__(self):
+        return int(self.value)
+
+    def __eq__(self, other):
+        if isinstance(other, Mock_Signal):
+            return self is other
+        return self.value == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = object.__hash__
+
+    def __repr__(self):
+        return f"{type(self).__qualname__}({self._path})"
+
+
+# 由Python模型驱动的dut：输入信号由测试代码写入，输出以及内部信号由模型计算
+# 模型需要提供：
+#   ports: {信号名: 位宽}，包括输入、输出以及希望暴露给测试代码的内部信号
+#   inputs: 输入信号名的集合
+#   clock: 时钟输入的信号名
+#   on_posedge(values): 时钟上升沿，values是所有输入信号的01xz字符串
+#   evaluate(values): Returns: {非输入信号名: 01xz字符串}
+class Mock_Dut():
+    def __init__(self, simulator, name, model):
+        self._simulator = simulator
+        self._name = name
+        self._path = name
+        self._model = model
+        self._log = logging.getLogger(f"cocotb.{name}")
+        self._signals = {signal_name: Mock_Signal(self, signal_name, width, signal_name in model.inputs)
+                         for signal_name, width in model.ports.items()}
+        self._inputs = [self._signals[signal_name] for signal_name in model.inputs]
+        self._clock = self._signals[model.clock]
+        simulator.add_dut(self)
+        self._update_outputs()
+
+    def _id(self, name, extended=True):
+        try:
+            return self._signals[name]
+        except KeyError:
+            raise AttributeError(f"{self._name} contains no object named {name}") from None
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name not in self.__dict__.get('_signals', {}):
+            raise AttributeError(name)
+        return self._signals[name]
+
+    def __setattr__(self, name, value):
+        # 与cocotb的HierarchyObject一致：dut.信号名 = 值 等价于 dut.信号名.value = 值
+        if name.startswith('_'):
+            return object.__setattr__(self, name, value)
+        self._id(name).value = value
+
+    def _input_values(self):
+        return {signal._name: signal._binstr for signal in self._inputs}
+
+    def _update_outputs(self):
+        """Returns: 发生变化的信号列表"""
+        changed = []
+        for name, binstr in self._model.evaluate(self._input_values()).items():
+            signal = self._signals[name]
+            if signal._set(binstr):
+                changed.append(signal)
+        return changed
+
+    def _after_inputs_changed(self, changed):
+        """输入写入并且等待这些输入边沿的协程执行完之后调用：时钟上升沿时先更新模型的寄存器，再计算输出"""
+        if self._clock in changed and self._clock._binstr == '1':
+            self._model.on_posedge(self._input_values())
+        return self._update_outputs()
+
+
+# 没有仿真器时代替cocotb.simulator提供仿真时间和精度
+class _Simulator_Clock():
+    def __init__(self, simulator):
+        self._simulator = simulator
+
+    def get_sim_time(self):
+        now = self._simulator.now
+        return now >> 32, now & 0xFFFFFFFF
+
+    def get_precision(self):
+        return self._simulator.precision
+
+
+# 纯Python的事件循环，代替仿真器和cocotb的调度器执行测试协程
+# 直接解释测试代码await的cocotb触发器(Timer/Edge/RisingEdge/FallingEdge/ReadOnly/ReadWrite/NextTimeStep/First/Join/Event...)，
+# 每个时间步的顺序与cocotb+icarus一致：定时器 -> 写入输入 -> 等待输入边沿的协程(看到的是上升沿之前的寄存器值) ->
+# 模型更新寄存器和输出 -> 等待输出边沿的协程 -> 重复直到没有写入 -> ReadOnly
+class Mock_Simulator():
+    def __init__(self, precision=DEFAULT_PRECISION):
+        self.precision = precision
+        self.now = 0
+        self._sequence = itertools.count()
+        self._timers = []
+        self._next_step_waiters = []
+        self._ready = deque()
+        self._edge_waiters = {}
+        self._read_write_waiters = []
+        self._read_only_waiters = []
+        self._joiners = {}
+        self._pending_writes = {}
+        self._duts = []
+        self._is_read_only = False
+        self._failure = None
+        self._main_task = None
+        self._current_task = None
+        self._saved = None
+
+    def add_dut(self, dut):
+        self._duts.append(dut)
+
+    # >>> BEG: cocotb.scheduler的接口
+    def create_task(self, coro):
+        if isinstance(coro, Task):
+            return coro
+        return Task(coro)
+
+    def start_soon(self, coro):
+        task = self.create_task(coro)
+        self._ready.append((task, None))
+        return task
+
+    def _unschedule(self, task):
+        """Task.kill()时调用：唤醒等待这个协程结束的协程"""
+        self._wake_joiners(task)
+
+    def _schedule_write(self, handle, write_func, *args):
+        raise TypeError(f"{handle!r} is not a mock signal")
+    # <<< END: cocotb.scheduler的接口
+
+    def schedule_write(self, signal, binstr):
+        if self._is_read_only:
+            raise Exception(f"Write to object {signal._name} was scheduled during a read-only sync phase.")
+        self._pending_writes.pop(signal, None)
+        self._pending_writes[signal] = binstr
+
+    def apply_immediately(self, signal, binstr):
+        if signal._set(binstr):
+            self._propagate([signal])
+
+    def install(self):
+        """把cocotb的调度器以及仿真时间替换成当前的模拟器"""
+        self._saved = (cocotb.scheduler, cocotb.utils.simulator, cocotb.utils._get_simulator_precision)
+        cocotb.scheduler = self
+        cocotb.utils.simulator = _Simulator_Clock(self)
+        cocotb.utils._get_simulator_precision = lambda: self.precision
+
+    def uninstall(self):
+        if self._saved is not None:
+            cocotb.scheduler, cocotb.utils.simulator, cocotb.utils._get_simulator_precision = self._saved
+            self._saved = None
+
+    def _wake_joiners(self, task):
+        for waiter, trigger in self._joiners.pop(task, []):
+            self._ready.append((waiter, trigger))
+
+    def _wait_on(self, task, result):
+        """记录task在等待的对象，和cocotb调度器的_trigger_from_any一致"""
+        if isinstance(result, Task):
+            if not result.has_started() and not result.done():
+                self._ready.append((result, None))
+            result = result.join()
+        elif isinstance(result, list):
+            return self._wait_on(task, First(*result))
+        elif isinstance(result, Waitable):
+            return self._wait_on(task, Task(result._wait()))
+        elif not isinstance(result, Trigger):
+            if hasattr(result, 'send'):
+                return self._wait_on(task, Task(result))
+            error = TypeError(f"Coroutine yielded an object of type {type(result)}, which the scheduler can't handle")
+            self._ready.append((task, outcomes.Error(error)))
+            return
+
+        task._trigger = result
+        if isinstance(result, Timer):
+            heapq.heappush(self._timers, (self.now + result.sim_steps, next(self._sequence), task, result))
+        elif isinstance(result, (RisingEdge, FallingEdge, Edge)):
+            self._edge_waiters.setdefault(result.signal, []).append((task, result))
+        elif isinstance(result, ReadOnly):
+            self._read_only_waiters.append((task, result))
+        elif isinstance(result, ReadWrite):
+            self._read_write_waiters.append((task, result))
+        elif isinstance(result, NextTimeStep):
+            self._next_step_waiters.append((task, result))
+        elif isinstance(result, Join):
+            if result._coroutine.done():
+                self._ready.append((task, result))
+            else:
+                self._joiners.setdefault(result._coroutine, []).append((task, result))
+        else:
+            # NullTrigger以及Event/Lock这样的Python触发器，触发时回调
+            result.prime(lambda trigger, task=task: self._ready.append((task, trigger)))
+
+    def _resume(self, task, trigger):
+        if task.done():
+            return
+        # 同一个触发器可能在一个时间步内触发多次(例如First中的两个等待同时完成)，协程已经在等待别的对象时忽略
+        if isinstance(trigger, Trigger) and task._trigger is not trigger:
+            return
+        if isinstance(trigger, outcomes.Outcome):
+            outcome = trigger
+        else:
+            outcome = outcomes.Value(None) if trigger is None else trigger._outcome
+        self._current_task = task
+        task._trigger = None
+        result = task._advance(outcome)
+        self._current_task = None
+        if not task.done():
+            self._wait_on(task, result)
+            return
+        has_joiners = len(self._joiners.get(task, []))
+        self._wake_joiners(task)
+        # 和cocotb一致：没有被等待的子协程抛出异常时，整个测试用例失败
+        if isinstance(task._outcome, outcomes.Error) and task is not self._main_task and not has_joiners:
+            if self._failure is None:
+                self._failure = task._outcome.error
+
+    def _drain_ready(self):
+        while len(self._ready):
+            task, trigger = self._ready.popleft()
+            self._resume(task, trigger)
+
+    def _fire_edges(self, signals):
+        for signal in signals:
+            waiters = self._edge_waiters.pop(signal, None)
+            if not waiters:
+                continue
+            remaining = []
+            for task, trigger in waiters:
+                if task.done() or task._trigger is not trigger:
+                    continue
+                if isinstance(trigger, RisingEdge) and signal._binstr != '1':
+                    remaining.append((task, trigger))
+                elif isinstance(trigger, FallingEdge) and signal._binstr != '0':
+                    remaining.append((task, trigger))
+                else:
+                    self._ready.append((task, trigger))
+            if remaining:
+                self._edge_waiters.setdefault(signal, []).extend(remaining)
+
+    def _propagate(self, changed):
+        """输入发生变化：先唤醒等待输入边沿的协程，再更新模型，最后唤醒等待输出边沿的协程"""
+        self._fire_edges(changed)
+        self._drain_ready()
+        changed = set(changed)
+        for dut in self._duts:
+            dut_changed = [signal for signal in dut._inputs if signal in changed]
+            if dut_changed:
+                self._fire_edges(dut._after_inputs_changed(dut_changed))
+
+    def _apply_writes(self):
+        writes = self._pending_writes
+        self._pending_writes = {}
+        changed = [signal for signal, binstr in writes.items() if signal._set(binstr)]
+        if changed:
+            self._propagate(changed)
+
+    def _settle(self):
+        """执行当前时间步内的所有事件，直到没有新的写入"""
+        while True:
+            self._drain_ready()
+            if len(self._pending_writes):
+                self._apply_writes()
+                continue
+            if len(self._read_write_waiters):
+                self._ready.extend(self._read_write_waiters)
+                self._read_write_waiters = []
+                continue
+            if len(self._read_only_waiters):
+                self._is_read_only = True
+                self._ready.extend(self._read_only_waiters)
+                self._read_only_waiters = []
+                self._drain_ready()
+                self._is_read_only = False
+                continue
+            return
+
+    def _advance_time(self):
+        """Returns: 是否还有未来的事件"""
+        while len(self._timers) and self._timers[0][2].done():
+            heapq.heappop(self._timers)
+        if not len(self._timers):
+            return False
+        self.now = self._timers[0][0]
+        self._ready.extend(self._next_step_waiters)
+        self._next_step_waiters = []
+        while len(self._timers) and self._timers[0][0] == self.now:
+            _, _, task, trigger = heapq.heappop(self._timers)
+            if task._trigger is trigger:
+                self._ready.append((task, trigger))
+        return True
+
+    def run(self, coro, timeout_steps=None):
+        """
+        执行测试协程直到结束
+        Returns:
+            测试协程的返回值
+        Raises:
+            测试协程或者没有被等待的子协程抛出的异常，超时时抛出Mock_Timeout，死锁时抛出Mock_Deadlock
+        """
+        self._main_task = Task(coro)
+        self._ready.append((self._main_task, None))
+        while True:
+            self._settle()
+            if self._failure is not None:
+                raise self._failure
+            if self._main_task.done():
+                return self._main_task.result()
+            if not self._advance_time():
+                raise Mock_Deadlock(f"all tasks are waiting at {self.now} steps and nothing else will happen")
+            if timeout_steps is not None and self.now > timeout_steps:
+                raise Mock_Timeout(f"test did not finish in {timeout_steps} steps")
+
+
+def run_mock_test(test, make_dut, timeout_ns=DEFAULT_TIMEOUT_NS, precision=DEFAULT_PRECISION):
+    """
+    在模拟器上执行一个cocotb测试用例
+    parameters:
+        test: @cocotb.test装饰的测试用例
+        make_dut: 函数(simulator)，返回这个测试用例使用的Mock_Dut
+    Returns:
+        Mock_Test_Result
+    """
+    if test.skip:
+        return Mock_Test_Result(test.name, True, True, None, 0, 0)
+    simulator = Mock_Simulator(precision)
+    simulator.install()
+    start = time.time()
+    try:
+        dut = make_dut(simulator)
+        if test.timeout_time is not None:
+            timeout_ns = cocotb.utils.get_time_from_sim_steps(
+                cocotb.utils.get_sim_steps(test.timeout_time, test.timeout_unit), 'ns')
+        simulator.run(test._func(dut), timeout_steps=cocotb.utils.get_sim_steps(timeout_ns, 'ns'))
+        passed, error = True, None
+    except Exception as e:
+        logging.getLogger('cocotb.mock').exception(f"{test.name} failed")
+        passed, error = False, repr(e)
+    finally:
+        simulator.uninstall()
+    sim_time_ns = simulator.now * 10 ** (precision + 9)
+    return Mock_Test_Result(test.name, passed, False, error, sim_time_ns, time.time() - start)
+
+
+def run_mock_tests(test_module, make_dut, test_names=None, work_dir=None, **kwargs):
+    """
+    在模拟器上执行测试模块中的测试用例，跳过的测试用例(skip)不会执行
+    parameters:
+        test_names: 只执行这些测试用例，默认执行所有测试用例
+        work_dir: 执行目录，测试用例写出的文件(例如总线记录)放在这里
+    Returns:
+        Mock_Test_Result列表
+    """
+    tests = [obj for obj in vars(test_module).values() if isinstance(obj, cocotb.test)]
+    if test_names is not None:
+        tests = [test for test in tests if test.name in test_names]
+    current_dir = os.getcwd()
+    if work_dir is not None:
+        os.makedirs(work_dir, exist_ok=True)
+        os.chdir(work_dir)
+    try:
+        return [run_mock_test(test, make_dut, **kwargs) for test in tests]
+    finally:
+        os.chdir(current_dir)
+
+
+def report_mock_results(results):
+    """打印每个测试用例的结果，Returns: 失败的数量"""
+    failed = 0
+    for result in results:
+        if result.skipped:
+            continue
+        status = 'PASS' if result.passed else 'FAIL'
+        print(f"{status} {result.test:<40} sim {result.sim_time_ns:>10}ns  wall {result.wall_time:.2f}s")
+        if not result.passed:
+            print(f"    {result.error}")
+            failed += 1
+    return failed
@@ -0,0 +1,203 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import re
+import time
+from collections import namedtuple
+
+import cocotb
+from cocotb.utils import get_sim_time
+
+# 生成的顶层模块中，第i个通道的实例名以及端口名
+LANE_INSTANCE_FORMAT = '_inst_lane_{}'
+LANE_PORT_FORMAT = 'lane{}_{}'
+# 默认所有通道共用的端口：只共用时钟，复位信号每个通道单独驱动，这样一个通道失败之后可以单独复位
+DEFAULT_SHARED_PORTS = ('in_clk',)
+
+# 模块端口：direction是input/output，width是'[7:0]'这样的位宽声明(1位时为空字符串)
+Module_Port = namedtuple('Module_Port', ['direction', 'width', 'name'])
+# 一个工作项在某个通道上的执行结果
+Lane_Result = namedtuple('Lane_Result', ['lane', 'index', 'passed', 'error', 'start_ns', 'end_ns'])
+
+_PORT_PATTERN = re.compile(r'\b(input|output)\s+(?:wire\s+|reg\s+)?(\[[^\]]+\])?\s*(\w+)')
+
+
+def parse_module_ports(source_path, module_name):
+    """
+    从verilog源文件中读取模块的端口声明(只支持端口列表中带方向的写法)
+    Returns:
+        Module_Port列表
+    Raises:
+        找不到模块时抛出ValueError
+    """
+    with open(source_path, encoding='utf-8') as f:
+        text = f.read()
+    # 去掉注释，端口列表到第一个');'为止
+    text = re.sub(r'//[^\n]*|/\*.*?\*/', '', text, flags=re.S)
+    match = re.search(r'\bmodule\s+' + re.escape(module_name) + r'\b(.*?)\);', text, flags=re.S)
+    if match is None:
+        raise ValueError(f"Module {module_name} not found in {source_path}")
+    header = match.group(1)
+    # 跳过参数列表 #( ... )
+    if header.lstrip().startswith('#'):
+        depth = 0
+        for idx, char in enumerate(header):
+            if char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+                if depth == 0:
+                    header = header[idx + 1:]
+                    break
+    return [Module_Port(direction, (width or '').replace(' ', ''), name)
+            for direction, width, name in _PORT_PATTERN.findall(header)]
+
+
+def write_lane_wrapper(build_dir, source_path, module_name, num_lanes, shared_ports=DEFAULT_SHARED_PORTS):
+    """
+    生成包含num_lanes个独立实例的顶层模块 <module_name>_Lanes
+    共用端口直接连到每个实例，其余端口在顶层展开成 lane<i>_<端口名>
+    parameters:
+        source_path: 被测模块的源文件，生成的模块通过`include引用，include目录中需要包含它所在的目录
+    Returns:
+        (生成的verilog文件路径, 顶层模块名)
+    """
+    ports = parse_module_ports(source_path, module_name)
+    top_name = f"{module_name}_Lanes"
+    guard = f"{top_name.upper()}_V"
+    top_ports = [port for port in ports if port.name in shared_ports]
+    for lane in range(num_lanes):
+        top_ports += [port._replace(name=LANE_PORT_FORMAT.format(lane, port.name))
+                      for port in ports if port.name not in shared_ports]
+
+    lines = [
+        f"`ifndef {guard}",
+        f"`define {guard}",
+        "",
+        f"`include \"{os.path.basename(source_path)}\"",
+        "",
+        f"// 自动生成：{num_lanes}个独立的{module_name}，共用{', '.join(shared_ports)}",
+        f"module {top_name}(",
+    ]
+    declarations = [f"    {port.direction} wire {port.width + ' ' if port.width else ''}{port.name}" for port in top_ports]
+    lines.append(",\n".join(declarations))
+    lines.append(");")
+    for lane in range(num_lanes):
+        connections = [f".{port.name}({port.name if port.name in shared_ports else LANE_PORT_FORMAT.format(lane, port.name)})"
+                       for port in ports]
+        lines.append(f"    {module_name} {LANE_INSTANCE_FORMAT.format(lane)}(")
+        lines.append("        " + "\n        , ".join(connections) + ");")
+    lines += [
+        "endmodule",
+        "",
+        f"`endif ///< {guard}",
+        "",
+    ]
+    os.makedirs(build_dir, exist_ok=True)
+    path = os.path.join(build_dir, f"{top_name}.v")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines))
+    return path, top_name
+
+
+def count_lanes(dut):
+    """生成的顶层模块中的通道数量"""
+    num_lanes = 0
+    while True:
+        try:
+            dut._id(LANE_INSTANCE_FORMAT.format(num_lanes), extended=False)
+        except AttributeError:
+            return num_lanes
+        num_lanes += 1
+
+
+# 一个通道的视图：用法和单个器件作为顶层时的dut一致，原来的测试代码可以直接作用在某个通道上
+# 共用端口指向顶层的端口，其余端口指向 lane<i>_<端口名>，内部信号指向对应的实例
+class Lane_Scope():
+    def __init__(self, dut, lane, shared_ports=DEFAULT_SHARED_PORTS):
+        self._top = dut
+        self._lane = lane
+        self._shared_ports = set(shared_ports)
+        self._instance = dut._id(LANE_INSTANCE_FORMAT.format(lane), extended=False)
+        self._handles = {}
+        self._log = dut._log.getChild(f"lane{lane}")
+        self._name = f"lane{lane}"
+
+    @property
+    def lane(self):
+        return self._lane
+
+    def _id(self, name, extended=True):
+        handle = self._handles.get(name)
+        if handle is not None:
+            return handle
+        if name in self._shared_ports:
+            handle = self._top._id(name, extended=False)
+        else:
+            try:
+                handle = self._top._id(LANE_PORT_FORMAT.format(self._lane, name), extended=False)
+            except AttributeError:
+                handle = self._instance._id(name, extended=extended)
+        self._handles[name] = handle
+        return handle
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return self._id(name, extended=False)
+
+
+# 在同一次仿真中把一组工作项分给多个通道执行：每个通道空闲时取下一个工作项，所有通道共用同一个时钟
+# 工作项之间互相独立，某个工作项失败只记录结果，不影响其它通道以及这个通道之后的工作项
+class Lane_Scheduler():
+    def __init__(self, dut, num_lanes=None, shared_ports=DEFAULT_SHARED_PORTS):
+        """
+        parameters:
+            num_lanes: 使用的通道数量，默认使用生成的顶层模块中的所有通道
+        """
+        if num_lanes is None:
+            num_lanes = count_lanes(dut)
+        self.lanes = [Lane_Scope(dut, lane, shared_ports) for lane in range(num_lanes)]
+        self.results = []
+        self.wall_time = 0
+
+    async def _worker(self, lane, items, lane_func, next_index):
+        while next_index[0] < len(items):
+            index = next_index[0]
+            next_index[0] += 1
+            start_ns = get_sim_time('ns')
+            try:
+                await lane_func(lane, items[index])
+                passed, error = True, None
+            except Exception as e:
+                lane._log.error(f"item {index} failed: {e!r}")
+                passed, error = False, repr(e)
+            self.results.append(Lane_Result(lane.lane, index, passed, error, start_ns, get_sim_time('ns')))
+
+    async def run(self, items, lane_func):
+        """
+        parameters:
+            items: 工作项列表
+            lane_func: async函数(lane, item)，在某个通道上执行一个工作项，失败时抛出异常
+        Returns:
+            按工作项顺序排列的Lane_Result列表
+        """
+        start = time.time()
+        next_index = [0]
+        workers = [cocotb.start_soon(self._worker(lane, items, lane_func, next_index)) for lane in self.lanes]
+        for worker in workers:
+            await worker
+        self.wall_time = time.time() - start
+        self.results.sort(key=lambda result: result.index)
+        return self.results
+
+    def report(self, log):
+        """按通道打印执行的工作项数量、失败数量以及占用的仿真时间"""
+        for lane in self.lanes:
+            lane_results = [result for result in self.results if result.lane == lane.lane]
+            failed = [result.index for result in lane_results if not result.passed]
+            busy_ns = sum(result.end_ns - result.start_ns for result in lane_results)
+            log.info(f"lane {lane.lane}: {len(lane_results)} items, {len(failed)} failed {failed}, busy {busy_ns}ns")
+        if self.wall_time > 0:
+            log.info(f"{len(self.results)} items on {len(self.lanes)} lanes in {self.wall_time:.2f}s "
+                     f"({len(self.results) / self.wall_time:.2f} items/s)")
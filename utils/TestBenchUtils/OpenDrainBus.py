@@ -0,0 +1,161 @@
+# -*- coding: UTF-8 -*-
+
+import cocotb
+from cocotb.triggers import Edge
+
+# IIC_Master的总线端口：{总线名: (输出信号名, 占用信号名, 输入信号名)}
+IIC_MASTER_PORTS = {
+    'scl': ('out_scl_out', 'out_scl_is_using', 'in_scl_in'),
+    'sda': ('out_sda_out', 'out_sda_is_using', 'in_sda_in'),
+}
+
+
+# Python模型对一条开漏总线的驱动：value为1表示拉低总线，0表示释放总线(由上拉电阻拉高)
+# 与IIC_Target的sda_pull_low用法一致，可以直接传给IIC_Target
+class Line_Driver():
+    def __init__(self, line, name):
+        self._line = line
+        self.name = name
+        self._value = 0
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = int(value)
+        self._line._set_pull_low(self.name, self._value == 1)
+
+    def pull_low(self):
+        self.value = 1
+
+    def release(self):
+        self.value = 0
+
+
+# 一条开漏总线(线与)：任何一个驱动者拉低时总线就是低电平，否则是高电平
+# 只在某个驱动者发生变化时重新计算，电平真正变化时才写到各个接收端(例如IIC_Master的in_scl_in)，与时钟周期数无关
+class Open_Drain_Line():
+    def __init__(self, name, receivers=()):
+        """
+        parameters:
+            receivers: 总线电平需要写入的输入信号句柄
+        """
+        self.name = name
+        self._receivers = list(receivers)
+        self._hdl_drivers = []
+        self._is_pulling_low = {}
+        self._num_pulling_low = 0
+        self._tasks = []
+        self._is_started = False
+        self.level = 1
+        self.statistics = {'driver_changes': 0, 'transitions': 0}
+
+    def add_receiver(self, handle):
+        self._receivers.append(handle)
+        handle.value = self.level
+
+    def add_driver(self, name):
+        """
+        Returns:
+            Python模型使用的Line_Driver，初始状态是释放总线
+        """
+        self._check_name(name)
+        self._is_pulling_low[name] = False
+        return Line_Driver(self, name)
+
+    def add_hdl_driver(self, name, out_handle, using_handle):
+        """
+        器件的输出以及占用信号：占用总线并且输出确定的低电平时拉低总线，其余时候(包括高阻态)释放总线
+        """
+        self._check_name(name)
+        self._is_pulling_low[name] = False
+        self._hdl_drivers.append((name, out_handle, using_handle))
+        if self._is_started:
+            self._start_hdl_driver(name, out_handle, using_handle)
+
+    def _check_name(self, name):
+        if name in self._is_pulling_low:
+            raise ValueError(f"Driver {name} is already attached to {self.name}")
+
+    def start(self):
+        self._is_started = True
+        for name, out_handle, using_handle in self._hdl_drivers:
+            self._start_hdl_driver(name, out_handle, using_handle)
+        # 接收端的初始值不一定是当前的电平，启动时统一写一次
+        for handle in self._receivers:
+            handle.value = self.level
+
+    def stop(self):
+        for task in self._tasks:
+            task.kill()
+        self._tasks = []
+        self._is_started = False
+
+    def _start_hdl_driver(self, name, out_handle, using_handle):
+        self._update_hdl_driver(name, out_handle, using_handle)
+        for handle in (out_handle, using_handle):
+            self._tasks.append(cocotb.start_soon(self._watch_hdl_driver(name, out_handle, using_handle, handle)))
+
+    async def _watch_hdl_driver(self, name, out_handle, using_handle, handle):
+        edge = Edge(handle)
+        while True:
+            await edge
+            self._update_hdl_driver(name, out_handle, using_handle)
+
+    def _update_hdl_driver(self, name, out_handle, using_handle):
+        # 输出和占用信号同一时刻变化时会各计算一次，中间结果写到接收端的值会被同一时刻最后一次写入覆盖
+        is_pulling_low = using_handle.value.binstr == '1' and out_handle.value.binstr == '0'
+        self._set_pull_low(name, is_pulling_low)
+
+    def _set_pull_low(self, name, is_pulling_low):
+        if self._is_pulling_low[name] == is_pulling_low:
+            return
+        self._is_pulling_low[name] = is_pulling_low
+        self._num_pulling_low += 1 if is_pulling_low else -1
+        self.statistics['driver_changes'] += 1
+        level = 0 if self._num_pulling_low > 0 else 1
+        if level == self.level:
+            return
+        self.level = level
+        self.statistics['transitions'] += 1
+        for handle in self._receivers:
+            handle.value = level
+
+    def pulling_low(self):
+        """当前拉低总线的驱动者，用于定位总线被谁占住"""
+        return [name for name, is_pulling_low in self._is_pulling_low.items() if is_pulling_low]
+
+
+# IIC总线：SCL和SDA两条开漏总线，主机由HDL实现，从设备可以是HDL器件，也可以是Python模型
+class Open_Drain_Bus():
+    def __init__(self):
+        self.scl = Open_Drain_Line('scl')
+        self.sda = Open_Drain_Line('sda')
+        self._lines = {'scl': self.scl, 'sda': self.sda}
+
+    def add_iic_master(self, name, scope, ports=IIC_MASTER_PORTS):
+        """
+        把一个IIC主机接到总线上：输出和占用信号作为驱动者，线与之后的电平写回输入信号
+        parameters:
+            scope: 主机所在的层级，例如dut或者dut._inst_iic_master
+            ports: {总线名: (输出信号名, 占用信号名, 输入信号名)}
+        """
+        for line_name, (out_name, using_name, in_name) in ports.items():
+            line = self._lines[line_name]
+            line.add_hdl_driver(name, scope._id(out_name, extended=False), scope._id(using_name, extended=False))
+            line.add_receiver(scope._id(in_name, extended=False))
+
+    def start(self):
+        for line in self._lines.values():
+            line.start()
+
+    def stop(self):
+        for line in self._lines.values():
+            line.stop()
+
+    def report(self, log):
+        for line in self._lines.values():
+            log.info(f"{line.name}: {line.statistics['driver_changes']} driver changes, "
+                     f"{line.statistics['transitions']} transitions, pulled low by {line.pulling_low()}")
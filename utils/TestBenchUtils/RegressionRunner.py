@@ -0,0 +1,335 @@
+# -*- coding: UTF-8 -*-
+
+import copy
+import importlib
+import importlib.util
+import os
+import resource
+import sys
+import time
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cocotb
+from cocotb.runner import get_runner
+
+from DurationDB import Test_Duration_DB
+from GoldenTrace import ENV_TRACE_DIR
+from WaveDump import DEFAULT_RING_WINDOW_US, WAVE_MODE_FULL, WAVE_MODE_OFF, prepare_wave_dump, wave_env, wave_plusargs
+
+# 一个需要执行的测试单元：测试模块中的某个用例，配合某个随机种子
+Work_Item = namedtuple('Work_Item', ['test', 'seed'])
+# 一个测试单元的执行结果
+Test_Result = namedtuple('Test_Result', ['test', 'seed', 'passed', 'wall_time', 'sim_time_ns', 'peak_memory_kb', 'test_dir'])
+
+
+def collect_tests(test_module, include_skipped=False):
+    """
+    收集测试模块中所有cocotb测试用例的名字，顺序与定义顺序一致
+    parameters:
+        test_module: 测试模块的名字(需要能直接import)
+        include_skipped: 是否包含被标记为skip的测试用例
+    """
+    module = importlib.import_module(test_module)
+    tests = [value for value in vars(module).values() if isinstance(value, cocotb.test)]
+    tests.sort(key=lambda t: t._id)
+    return [t.__name__ for t in tests if include_skipped or not t.skip]
+
+
+def parse_results_xml(results_xml, test):
+    """
+    从cocotb的结果文件中读取某个用例的执行结果
+    Returns:
+        (是否通过, 仿真时间ns)，结果文件不存在或者没有对应用例时返回(False, None)
+    """
+    if not os.path.isfile(results_xml):
+        return False, None
+    tree = ET.parse(results_xml)
+    for testcase in tree.iter('testcase'):
+        if testcase.get('name') != test:
+            continue
+        passed = testcase.find('failure') is None and testcase.find('error') is None
+        sim_time_ns = testcase.get('sim_time_ns')
+        return passed, float(sim_time_ns) if sim_time_ns is not None else None
+    return False, None
+
+
+def parse_random_seed(results_xml):
+    """从cocotb的结果文件中读取本次仿真实际使用的随机种子，没有时返回None"""
+    if not os.path.isfile(results_xml):
+        return None
+    tree = ET.parse(results_xml)
+    for prop in tree.iter('property'):
+        if prop.get('name') == 'random_seed':
+            return int(prop.get('value'))
+    return None
+
+
+def failed_work_items(results):
+    """
+    从执行结果中找出失败的测试单元，用于重新执行
+    没有指定随机种子的测试单元使用上一次执行实际用到的随机种子，保证重新执行时能够复现
+    """
+    items = []
+    for result in results:
+        if result.passed:
+            continue
+        seed = result.seed
+        if seed is None:
+            seed = parse_random_seed(os.path.join(result.test_dir, 'results.xml'))
+        items.append(Work_Item(result.test, seed))
+    return items
+
+
+def schedule_longest_first(work_items, estimates, num_workers):
+    """
+    按照最长处理时间优先(LPT)的规则安排执行顺序
+    没有历史记录的用例被认为是最长的，优先执行，避免它们在最后拖慢整个回归
+    parameters:
+        work_items: Work_Item列表
+        estimates: Work_Item -> 估算耗时(秒)，没有历史记录的为None
+        num_workers: 并行执行的进程数量
+    Returns:
+        (排序后的Work_Item列表, 预计的总耗时)，有用例没有历史记录时预计总耗时为None
+    """
+    def sort_key(item):
+        estimate = estimates.get(item)
+        return (estimate is not None, -(estimate or 0.0))
+    ordered = sorted(work_items, key=sort_key)
+    if any(estimates.get(item) is None for item in ordered):
+        return ordered, None
+    # 模拟LPT的分配过程：每个用例都交给当前最早空闲的进程
+    worker_loads = [0.0] * max(1, num_workers)
+    for item in ordered:
+        idx = worker_loads.index(min(worker_loads))
+        worker_loads[idx] += estimates[item]
+    return ordered, max(worker_loads)
+
+
+def find_test_module_dir(test_module):
+    """测试模块所在的目录，在当前的sys.path中查找不到时返回None"""
+    spec = importlib.util.find_spec(test_module)
+    if spec is None or spec.origin is None:
+        return None
+    return os.path.dirname(os.path.abspath(spec.origin))
+
+
+def make_run_settings(simulator, test_module, hdl_toplevel, build_dir, waves=False, extra_env=None, plusargs=(),
+                      wave_mode=WAVE_MODE_OFF, wave_modes=None, ring_window_us=DEFAULT_RING_WINDOW_US,
+                      runs_dir='runs'):
+    """
+    生成在worker进程中执行测试单元需要的配置，只包含可以被json序列化的内容
+    parameters:
+        build_dir: 已经编译好的构建目录
+        wave_mode: 默认的波形模式，scoped/full需要编译时加入波形记录模块
+        wave_modes: 测试用例名 -> 波形模式，覆盖默认的波形模式
+        ring_window_us: ring模式保留的时间窗口(us)
+        runs_dir: 测试单元执行目录所在的目录，相对于build_dir
+    """
+    return {
+        'simulator': simulator,
+        'test_module': test_module,
+        # 通过工作队列在其它机器上执行时，worker的sys.path中没有测试模块所在的目录
+        'test_module_dir': find_test_module_dir(test_module),
+        'hdl_toplevel': hdl_toplevel,
+        'build_dir': build_dir,
+        'extra_env': dict(extra_env or {}),
+        'plusargs': list(plusargs),
+        'waves': waves,
+        'wave_mode': wave_mode,
+        'wave_modes': dict(wave_modes or {}),
+        'ring_window_us': ring_window_us,
+        'runs_dir': runs_dir,
+    }
+
+
+def _run_work_item(settings, item):
+    """在独立的进程中执行一个测试单元，每个进程只执行一个测试单元，这样子进程的峰值内存就只属于这个测试单元"""
+    # cocotb runner把sys.path传给仿真器的PYTHONPATH，测试模块以及它导入的同目录模块(例如IICChecker)需要在其中
+    test_module_dir = settings.get('test_module_dir')
+    if test_module_dir is not None and test_module_dir not in sys.path:
+        sys.path.insert(0, test_module_dir)
+    test_dir = os.path.join(settings['build_dir'], settings['runs_dir'], f"{item.test}_{item.seed}")
+    os.makedirs(test_dir, exist_ok=True)
+    results_xml = os.path.join(test_dir, 'results.xml')
+    # 波形文件写在测试单元自己的目录中，互不覆盖
+    wave_mode = settings['wave_modes'].get(item.test, settings['wave_mode'])
+    plusargs = settings['plusargs'] + wave_plusargs(wave_mode, os.path.join(test_dir, f"{item.test}.fst"))
+    extra_env = dict(settings['extra_env'])
+    extra_env.update(wave_env(settings['wave_mode'], test_dir, settings['wave_modes'], settings['ring_window_us']))
+    extra_env[ENV_TRACE_DIR] = test_dir
+    runner = get_runner(settings['simulator'])
+    start_time = time.perf_counter()
+    try:
+        runner.test(
+            hdl_toplevel=settings['hdl_toplevel'],
+            hdl_toplevel_lang='verilog',
+            test_module=settings['test_module'],
+            testcase=item.test,
+            seed=item.seed,
+            build_dir=settings['build_dir'],
+            test_dir=test_dir,
+            results_xml=results_xml,
+            extra_env=extra_env,
+            plusargs=plusargs,
+            waves=settings['waves'],
+            log_file=os.path.join(test_dir, 'sim.log'),
+        )
+    except SystemExit:
+        # 仿真进程异常退出，结果文件不存在，下面会被记为失败
+        pass
+    wall_time = time.perf_counter() - start_time
+    passed, sim_time_ns = parse_results_xml(results_xml, item.test)
+    peak_memory_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return Test_Result(item.test, item.seed, passed, wall_time, sim_time_ns, peak_memory_kb, test_dir)
+
+
+# 对cocotb runner的封装：只编译一次，然后把每个测试用例(以及随机种子)放到独立的进程中并行执行
+# 给出wave_signals时会一起编译波形记录模块，每个测试用例的波形模式(off/scoped/full/ring)在执行时再决定
+class Regression_Runner():
+    def __init__(self, test_module, hdl_toplevel, verilog_sources, build_dir,
+                 includes=(), defines=None, parameters=None, timescale=('1us', '1ns'),
+                 num_workers=None, db_path=None, simulator='icarus', wave_signals=None):
+        self.test_module = test_module
+        self.hdl_toplevel = hdl_toplevel
+        self.verilog_sources = list(verilog_sources)
+        self.build_dir = os.path.abspath(build_dir)
+        self.includes = list(includes)
+        self.defines = dict(defines or {})
+        self.parameters = dict(parameters or {})
+        self.timescale = timescale
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.simulator = simulator
+        self.wave_signals = list(wave_signals) if wave_signals is not None else None
+        self.db = Test_Duration_DB(db_path) if db_path is not None else None
+
+    def build(self, waves=False, always=True):
+        """编译仿真模型，waves为True时使用cocotb自带的全层级波形记录(不受wave_mode控制)"""
+        verilog_sources = list(self.verilog_sources)
+        build_args = []
+        if self.wave_signals is not None:
+            dump_sources, build_args = prepare_wave_dump(self.build_dir, self.hdl_toplevel, self.wave_signals)
+            verilog_sources += dump_sources
+        runner = get_runner(self.simulator)
+        runner.build(
+            verilog_sources=verilog_sources,
+            build_args=build_args,
+            hdl_toplevel=self.hdl_toplevel,
+            always=always,
+            waves=waves,
+            build_dir=self.build_dir,
+            includes=self.includes,
+            defines=self.defines,
+            parameters=self.parameters,
+            timescale=self.timescale
+        )
+
+    def make_work_items(self, tests=None, seeds=(None,)):
+        """把测试用例和随机种子展开成测试单元，tests为None时使用模块中所有没有被skip的用例"""
+        if tests is None:
+            tests = collect_tests(self.test_module)
+        return [Work_Item(test, seed) for test in tests for seed in seeds]
+
+    def make_settings(self, waves=False, extra_env=None, plusargs=(),
+                      wave_mode=WAVE_MODE_OFF, wave_modes=None, ring_window_us=DEFAULT_RING_WINDOW_US,
+                      runs_dir='runs'):
+        """生成在worker进程中执行测试单元需要的配置，参数见make_run_settings"""
+        return make_run_settings(self.simulator, self.test_module, self.hdl_toplevel, self.build_dir,
+                                 waves, extra_env, plusargs, wave_mode, wave_modes, ring_window_us, runs_dir)
+
+    def order_work_items(self, work_items):
+        """根据历史耗时，按照最长处理时间优先的顺序排列测试单元"""
+        estimates = {}
+        if self.db is not None:
+            for item in work_items:
+                estimates[item] = self.db.estimate(self.test_module, item.test)
+        ordered, expected_makespan = schedule_longest_first(work_items, estimates, self.num_workers)
+        if expected_makespan is not None:
+            print(f"Expected regression time: {expected_makespan:.1f}s with {self.num_workers} workers")
+        return ordered
+
+    def run(self, work_items, waves=False, extra_env=None, plusargs=(),
+            wave_mode=WAVE_MODE_OFF, wave_modes=None, ring_window_us=DEFAULT_RING_WINDOW_US):
+        """
+        并行执行测试单元，有历史记录的时候按照最长处理时间优先的顺序执行
+        Returns:
+            Test_Result列表，顺序与完成顺序一致
+        """
+        ordered = self.order_work_items(work_items)
+        settings = self.make_settings(waves, extra_env, plusargs, wave_mode, wave_modes, ring_window_us)
+        results = []
+        with ProcessPoolExecutor(max_workers=self.num_workers, max_tasks_per_child=1) as executor:
+            futures = [executor.submit(_run_work_item, settings, item) for item in ordered]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                self.record_result(result)
+        return results
+
+    def rerun_failures(self, results, rerun_build_dir=None, extra_env=None, plusargs=(), log_level='DEBUG'):
+        """
+        在独立的构建目录中，打开完整波形以及调试日志重新执行失败的测试单元
+        parameters:
+            results: 之前执行得到的Test_Result列表
+            rerun_build_dir: 重新执行使用的构建目录，默认是 <build_dir>_rerun
+            log_level: 重新执行时cocotb的日志等级
+        Returns:
+            重新执行得到的Test_Result列表，没有失败的测试单元时为空列表
+        """
+        work_items = failed_work_items(results)
+        if len(work_items) == 0:
+            return []
+        print(f"Rerunning {len(work_items)} failed tests with waves")
+        rerun = copy.copy(self)
+        rerun.build_dir = os.path.abspath(rerun_build_dir or self.build_dir + '_rerun')
+        # 打开波形之后的耗时不代表正常的执行耗时，不记录到耗时数据库中
+        rerun.db = None
+        env = dict(extra_env or {})
+        env['COCOTB_LOG_LEVEL'] = log_level
+        # 没有给出wave_signals时没有波形记录模块，使用cocotb自带的全层级波形记录
+        builtin_waves = self.wave_signals is None
+        rerun.build(waves=builtin_waves)
+        return rerun.run(work_items, waves=builtin_waves, extra_env=env, plusargs=plusargs,
+                         wave_mode=WAVE_MODE_OFF if builtin_waves else WAVE_MODE_FULL)
+
+    def run_and_rerun_failures(self, work_items, extra_env=None, plusargs=(), rerun_build_dir=None):
+        """
+        先关闭波形执行所有测试单元，然后只对失败的测试单元打开完整波形重新执行
+        全部通过的时候不需要付出任何波形记录的开销
+        Returns:
+            (第一次执行的Test_Result列表, 重新执行的Test_Result列表)
+        """
+        self.build()
+        results = self.run(work_items, extra_env=extra_env, plusargs=plusargs, wave_mode=WAVE_MODE_OFF)
+        rerun_results = self.rerun_failures(results, rerun_build_dir, extra_env, plusargs)
+        return results, rerun_results
+
+    def record_result(self, result):
+        """打印测试单元的执行结果，并记录到耗时数据库中"""
+        status = 'PASS' if result.passed else 'FAIL'
+        message = f"{status} {result.test} (seed={result.seed}) wall={result.wall_time:.2f}s"
+        if result.sim_time_ns is not None:
+            message += f" sim={result.sim_time_ns:.0f}ns"
+        message += f" mem={result.peak_memory_kb}KB"
+        if self.db is not None:
+            record_id = self.db.record(self.test_module, result.test, result.seed, result.passed,
+                                       result.wall_time, result.sim_time_ns, result.peak_memory_kb)
+            regressed, baseline = self.db.is_regressed(record_id)
+            if regressed:
+                message += f" [DURATION REGRESSED, median {baseline:.2f}s]"
+        print(message)
+
+
+def report_results(results, rerun_results=()):
+    """打印回归汇总，返回失败的测试单元数量"""
+    failed = [r for r in results if not r.passed]
+    print(f"{len(results) - len(failed)}/{len(results)} passed")
+    # 重新执行的结果按照测试单元对应回去，打印波形所在的目录
+    rerun_dirs = {(r.test, r.seed): r.test_dir for r in rerun_results}
+    for r, item in zip(failed, failed_work_items(failed)):
+        message = f"FAILED: {r.test} (seed={item.seed}), see {r.test_dir}"
+        if item in rerun_dirs:
+            message += f", waves in {rerun_dirs[item]}"
+        print(message)
+    return len(failed)
@@ -0,0 +1,118 @@
+# -*- coding: UTF-8 -*-
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import Edge, First, ReadOnly, RisingEdge, Timer, Waitable
+from cocotb.utils import get_sim_steps, get_sim_time
+
+# 记录每个时钟信号的周期以及启动时刻(单位都是step)，用于计算第N个上升沿的绝对时间
+# key是时钟信号的句柄，value是(周期, 启动时刻)
+g_registered_clocks = {}
+
+
+def register_clock(clk, period, units='ns', start_time=None):
+    """
+    登记时钟信号的周期，登记后FastClockCycles可以用一个Timer直接跳过空闲的时钟周期
+    parameters:
+        clk: 时钟信号句柄
+        period: 时钟周期
+        units: 时钟周期的单位
+        start_time: 时钟第一个上升沿的时刻(step)，默认是当前仿真时间
+    """
+    if start_time is None:
+        start_time = get_sim_time('step')
+    g_registered_clocks[clk] = (get_sim_steps(period, units), start_time)
+
+
+async def start_clock(clk, period, units='ns'):
+    """
+    创建并启动时钟，同时登记时钟周期。用来代替 Clock(...) + cocotb.start(c.start()) 的写法
+    登记之后FastClockCycles、wait_cycles_stable等等待可以直接跳过空闲的时钟周期，不需要逐个上升沿唤醒
+    Returns:
+        创建出来的Clock对象
+    """
+    c = Clock(clk, period, units=units)
+    register_clock(clk, period, units)
+    await cocotb.start(c.start())
+    return c
+
+
+class FastClockCycles(Waitable):
+    """
+    和ClockCycles一样，在clk的第num_cycles个上升沿(严格晚于当前时刻)触发
+
+    假如时钟已经通过register_clock登记，那么先用一个Timer跳到目标上升沿之前的半个周期，
+    再等待一个上升沿，总共只需要两次回调；否则退化成逐个上升沿计数
+    """
+
+    def __init__(self, clk, num_cycles):
+        self.signal = clk
+        self.num_cycles = num_cycles
+
+    async def _wait(self):
+        if self.num_cycles <= 0:
+            return self
+        rising_edge = RisingEdge(self.signal)
+        if self.signal not in g_registered_clocks:
+            for _ in range(self.num_cycles):
+                await rising_edge
+            return self
+        period, start_time = g_registered_clocks[self.signal]
+        now = get_sim_time('step')
+        passed_edges = (now - start_time) // period
+        target_time = start_time + (passed_edges + self.num_cycles) * period
+        # 落在目标上升沿之前半个周期的位置，避免和时钟自身的翻转处于同一时刻而产生歧义
+        delay = target_time - period // 2 - now
+        if delay > 0:
+            await Timer(delay, units='step')
+        await rising_edge
+        return self
+
+    def __repr__(self):
+        return "{}({!r}, {!r})".format(type(self).__qualname__, self.signal, self.num_cycles)
+
+
+async def wait_cycles_stable(clk, handles, cycles):
+    """
+    等待clk经过cycles个上升沿，并且保证这段时间内handles中的信号没有发生任何变化
+    时钟周期的跳过和信号的变化监听同时进行，谁先发生就以谁为准，因此整个等待过程只需要很少的回调
+    parameters:
+        clk: 时钟信号句柄
+        handles: 需要保持不变的信号句柄列表
+        cycles: 需要等待的时钟周期数量
+    Raises:
+        一旦其中一个信号发生了变化，会立刻抛出异常(assert)
+    """
+    clock_cycles = FastClockCycles(clk, cycles)
+    if len(handles) == 0:
+        await clock_cycles
+        return
+    fired = await First(clock_cycles, *[Edge(handle) for handle in handles])
+    assert fired is clock_cycles, \
+        f"{fired.signal._name} changed to {fired.signal.value} at {get_sim_time('ns')}ns while it should be stable"
+
+
+async def assert_stable(handles, expected, cycles, clk):
+    """
+    断言接下来cycles个时钟上升沿观察到的handles都等于expected，等价于：
+        for _ in range(cycles):
+            await RisingEdge(clk)
+            assert handle.value == expected ...
+    但是只会在开头检查一次信号值，之后一直睡到窗口结束，中途信号一旦变化就立刻失败
+    parameters:
+        handles: 需要检查的信号句柄列表
+        expected: 和handles一一对应的期望值，可以是整数或者'z'
+        cycles: 窗口持续的时钟周期数量
+        clk: 时钟信号句柄
+    Raises:
+        信号和期望值不一致，或者窗口内信号发生了变化，将会抛出异常(assert)
+    """
+    assert len(handles) == len(expected)
+    if cycles <= 0:
+        return
+    # 等待当前时间步的信号稳定下来，此时的值就是下一个时钟上升沿会观察到的值
+    await ReadOnly()
+    for handle, expected_value in zip(handles, expected):
+        assert handle.value == expected_value, \
+            f"{handle._name} is {handle.value} at {get_sim_time('ns')}ns, expected {expected_value}"
+    await wait_cycles_stable(clk, handles, cycles)
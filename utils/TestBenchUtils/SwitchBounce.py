@@ -0,0 +1,110 @@
+# -*- coding: UTF-8 -*-
+
+from collections import namedtuple
+import numpy as np
+from cocotb.triggers import Timer
+
+# 一段按键序列：所有边沿的时刻(时钟周期，浮点数)与边沿之后的电平，以及每次按下/松开的真实时刻
+# press_starts/release_starts是第一次接触的时刻，press_settles/release_settles是最后一次抖动的时刻
+Press_Sequence = namedtuple('Press_Sequence', ['times', 'levels', 'press_starts', 'press_settles',
+                                               'release_starts', 'release_settles'])
+# 一组抖动参数，区间都是[最小值, 最大值]，时间单位是时钟周期
+# glitch_rate是保持阶段中每个时钟周期出现毛刺的概率
+Bounce_Parameters = namedtuple('Bounce_Parameters', ['bounce_cycles', 'num_bounces', 'hold_cycles', 'gap_cycles',
+                                                     'glitch_rate', 'glitch_cycles'])
+
+
+def _uniform(rng, bounds):
+    return rng.uniform(bounds[0], bounds[1])
+
+
+def bounce_edges(rng, start, level, bounce_cycles, num_bounces):
+    """
+    生成一次接触(按下或者松开)的所有边沿：从start开始在bounce_cycles之内来回弹跳num_bounces次，最终停在level
+    Returns:
+        (边沿时刻数组, 边沿之后的电平数组)
+    """
+    offsets = np.sort(rng.uniform(0, bounce_cycles, 2 * num_bounces))
+    times = np.concatenate(([start], start + offsets))
+    levels = np.where(np.arange(len(times)) % 2 == 0, level, 1 - level)
+    return times, levels
+
+
+def glitch_edges(rng, start, end, level, glitch_rate, glitch_cycles):
+    """
+    在电平保持为level的[start, end)之间随机插入短暂的反向毛刺
+    Returns:
+        (边沿时刻数组, 边沿之后的电平数组)
+    """
+    count = rng.poisson(glitch_rate * (end - start))
+    starts = np.sort(rng.uniform(start, end, count))
+    # 毛刺不能超过下一个毛刺的开始时刻以及保持阶段的结束时刻
+    limits = np.diff(np.concatenate((starts, [end]))) / 2
+    widths = np.minimum(rng.uniform(glitch_cycles[0], glitch_cycles[1], count), limits)
+    times = np.column_stack((starts, starts + widths)).ravel()
+    levels = np.tile([1 - level, level], count)
+    return times, levels
+
+
+def make_press_sequence(rng, num_presses, parameters, idle_level=0):
+    """
+    生成num_presses次按下/松开的完整序列，序列从一段空闲开始
+    parameters:
+        rng: numpy.random.Generator
+        parameters: Bounce_Parameters
+        idle_level: 没有按下时的电平
+    """
+    press_level = 1 - idle_level
+    all_times = []
+    all_levels = []
+    marks = {name: np.zeros(num_presses) for name in ['press_starts', 'press_settles', 'release_starts', 'release_settles']}
+    now = _uniform(rng, parameters.gap_cycles)
+    for idx in range(num_presses):
+        for phase, level in [('press', press_level), ('release', idle_level)]:
+            times, levels = bounce_edges(rng, now, level, _uniform(rng, parameters.bounce_cycles),
+                                         rng.integers(parameters.num_bounces[0], parameters.num_bounces[1] + 1))
+            marks[f"{phase}_starts"][idx] = times[0]
+            marks[f"{phase}_settles"][idx] = times[-1]
+            hold_end = times[-1] + _uniform(rng, parameters.hold_cycles if level == press_level else parameters.gap_cycles)
+            noise_times, noise_levels = glitch_edges(rng, times[-1] + 1, hold_end, level,
+                                                     parameters.glitch_rate, parameters.glitch_cycles)
+            all_times += [times, noise_times]
+            all_levels += [levels, noise_levels]
+            now = hold_end
+    return Press_Sequence(np.concatenate(all_times), np.concatenate(all_levels).astype(np.int8), **marks)
+
+
+async def replay_edges(signal, times_ns, levels):
+    """
+    单个协程按时间顺序把所有边沿驱动到signal上，只在边沿时刻被唤醒
+    parameters:
+        times_ns: 相对于当前仿真时刻的边沿时刻(整数ns)，需要单调不减
+    """
+    last_ns = 0
+    for time_ns, level in zip(np.asarray(times_ns).tolist(), np.asarray(levels).tolist()):
+        # 同一时刻的多个边沿只保留最后一个电平
+        if time_ns > last_ns:
+            await Timer(time_ns - last_ns, units='ns')
+            last_ns = time_ns
+        signal.value = level
+
+
+def match_detections(event_starts, detections):
+    """
+    把检测到的边沿分配到各个事件：[event_starts[i], event_starts[i + 1])之内的第一个检测是有效的，其余都是误触发
+    parameters:
+        event_starts: 每个事件(按下或者松开)开始的时刻
+        detections: 检测信号有效的时刻
+    Returns:
+        (每个事件的延迟数组，没有检测到时为nan, 误触发的数量)
+    """
+    event_starts = np.asarray(event_starts, dtype=np.float64)
+    detections = np.asarray(detections, dtype=np.float64)
+    owners = np.searchsorted(event_starts, detections, side='right') - 1
+    # 第一个事件之前的检测全部是误触发
+    in_events = owners >= 0
+    owners = owners[in_events]
+    latencies = np.full(len(event_starts), np.nan)
+    matched_owners, first_idx = np.unique(owners, return_index=True)
+    latencies[matched_owners] = detections[in_events][first_idx] - event_starts[matched_owners]
+    return latencies, len(detections) - len(matched_owners)
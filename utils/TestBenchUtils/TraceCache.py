@@ -0,0 +1,161 @@
+# -*- coding: UTF-8 -*-
+
+import atexit
+import hashlib
+import json
+import os
+import struct
+import sys
+from collections import OrderedDict
+
+# 默认最多缓存多少条验证通过的记录
+DEFAULT_MAX_ENTRIES = 4096
+
+
+def run_length_encode(sigs_of_scl, sigs_of_sda):
+    """
+    把逐个时钟周期采样的scl/sda序列压缩成游程编码
+    Returns:
+        [(scl, sda, 持续的时钟周期数量), ...]，长度以两个序列中较短的为准
+    """
+    runs = []
+    prev = None
+    count = 0
+    for scl, sda in zip(sigs_of_scl, sigs_of_sda):
+        if (scl, sda) == prev:
+            count += 1
+            continue
+        if prev is not None:
+            runs.append((prev[0], prev[1], count))
+        prev = (scl, sda)
+        count = 1
+    if prev is not None:
+        runs.append((prev[0], prev[1], count))
+    return runs
+
+
+def checker_signature(checker):
+    """
+    检查器的签名：类名加上构造之后的全部成员，例如Bit_Checker期望的位值
+    必须在检查器开始检查(update)之前计算
+    """
+    members = sorted((name, repr(value)) for name, value in vars(checker).items())
+    return f"{type(checker).__qualname__}{members}"
+
+
+# 检查器所在源文件的哈希值，检查器的实现发生变化时，之前保存的验证结果全部失效
+g_checker_source_hashes = {}
+
+
+def _checker_source_hash(checker):
+    module_name = type(checker).__module__
+    if module_name not in g_checker_source_hashes:
+        digest = ''
+        path = getattr(sys.modules.get(module_name), '__file__', None)
+        if path is not None and os.path.isfile(path):
+            with open(path, 'rb') as f:
+                digest = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+        g_checker_source_hashes[module_name] = digest
+    return g_checker_source_hashes[module_name]
+
+
+def trace_fingerprint(runs, checkers):
+    """根据游程编码的信号序列以及期望的检查器序列计算指纹"""
+    hasher = hashlib.blake2b(digest_size=16)
+    for checker in checkers:
+        hasher.update(_checker_source_hash(checker).encode())
+        hasher.update(checker_signature(checker).encode())
+        hasher.update(b'\0')
+    for scl, sda, count in runs:
+        hasher.update(struct.pack('<BBI', scl, sda, count))
+    return hasher.hexdigest()
+
+
+# 验证结果缓存：相同的信号序列配合相同的检查器序列只需要逐个时钟周期检查一次
+# 只缓存验证通过的结果，验证失败每次都会重新检查并抛出异常
+class Verification_Cache():
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, path=None):
+        """
+        parameters:
+            max_entries: 最多缓存的记录数量，超出时淘汰最久没有使用的记录
+            path: 持久化文件路径，为None时只在内存中缓存。给出时会在进程退出时自动保存
+        """
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self._path = path
+        self._is_dirty = False
+        self.hits = 0
+        self.misses = 0
+        if path is not None:
+            self.load()
+            atexit.register(self.save)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, fingerprint):
+        if fingerprint not in self._entries:
+            return False
+        self._entries.move_to_end(fingerprint)
+        return True
+
+    def add(self, fingerprint):
+        self._entries[fingerprint] = True
+        self._entries.move_to_end(fingerprint)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        self._is_dirty = True
+
+    def verify(self, match_func, checkers, sigs_of_scl, sigs_of_sda):
+        """
+        使用缓存验证scl/sda序列，用法与try_to_match_iic_sigs一致
+        parameters:
+            match_func: 真正执行检查的函数，一般是IICChecker中的try_to_match_iic_sigs
+            checkers: 还没有开始检查的检查器列表
+            sigs_of_scl: scl信号序列
+            sigs_of_sda: sda信号序列
+        Raises:
+            和match_func一致，一旦其中一个检查器检查失败，将会抛出异常(assert)
+        """
+        fingerprint = trace_fingerprint(run_length_encode(sigs_of_scl, sigs_of_sda), checkers)
+        if fingerprint in self:
+            self.hits += 1
+            return
+        self.misses += 1
+        # match_func会从列表中取出检查器，传入一份拷贝
+        match_func(list(checkers), sigs_of_scl, sigs_of_sda)
+        self.add(fingerprint)
+
+    def load(self):
+        """从持久化文件中读取记录，文件中越靠后的记录越新"""
+        if self._path is None or not os.path.isfile(self._path):
+            return
+        with open(self._path) as f:
+            fingerprints = json.load(f)
+        for fingerprint in fingerprints[-self._max_entries:]:
+            self._entries[fingerprint] = True
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def save(self):
+        """
+        把记录写入持久化文件
+        多个仿真进程可能同时使用同一个文件，写入前先合并文件中已有的记录，再通过重命名原子地替换
+        """
+        if self._path is None or not self._is_dirty:
+            return
+        merged = OrderedDict()
+        if os.path.isfile(self._path):
+            with open(self._path) as f:
+                for fingerprint in json.load(f):
+                    merged[fingerprint] = True
+        for fingerprint in self._entries:
+            merged[fingerprint] = True
+            merged.move_to_end(fingerprint)
+        fingerprints = list(merged)[-self._max_entries:]
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        tmp_path = f"{self._path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(fingerprints, f)
+        os.replace(tmp_path, self._path)
+        self._is_dirty = False
@@ -0,0 +1,336 @@
+# -*- coding: UTF-8 -*-
+
+import atexit
+import functools
+import multiprocessing
+import queue
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from TraceCache import run_length_encode, trace_fingerprint
+
+# 共享内存环形缓冲区默认能容纳的游程记录数量，每条记录8字节
+DEFAULT_RING_CAPACITY = 1 << 16
+# 头部的两个字：写入位置、读取位置，都是从0开始单调递增的记录计数
+_HEADER_WORDS = 2
+_WRITE_POSITION = 0
+_READ_POSITION = 1
+# 缓冲区满/空时轮询的间隔(秒)
+DEFAULT_POLL_INTERVAL = 0.0005
+
+
+def encode_runs(runs):
+    """
+    把游程编码[(scl, sda, 持续的时钟周期数量), ...]打包成环形缓冲区中的记录
+    每条记录是一个uint64：最低位是sda，次低位是scl，其余是持续的时钟周期数量
+    """
+    if len(runs) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    table = np.array(runs, dtype=np.uint64)
+    return (table[:, 2] << np.uint64(2)) | (table[:, 0] << np.uint64(1)) | table[:, 1]
+
+
+def decode_records(records):
+    """encode_runs的逆过程，直接展开成逐个时钟周期的scl/sda序列"""
+    records = np.asarray(records, dtype=np.uint64)
+    counts = (records >> np.uint64(2)).astype(np.int64)
+    sigs_of_scl = np.repeat((records >> np.uint64(1)) & np.uint64(1), counts)
+    sigs_of_sda = np.repeat(records & np.uint64(1), counts)
+    return sigs_of_scl.tolist(), sigs_of_sda.tolist()
+
+
+# 共享内存上的单生产者单消费者环形缓冲区
+# 生产者(仿真进程)先写入记录再推进写入位置，消费者(检查进程)先复制记录再推进读取位置，双方都不需要加锁
+class Shared_Trace_Ring():
+    def __init__(self, capacity=DEFAULT_RING_CAPACITY, name=None, poll_interval=DEFAULT_POLL_INTERVAL):
+        """
+        parameters:
+            capacity: 能容纳的记录数量
+            name: 为None时创建新的共享内存；否则按照名字连接到已经创建好的共享内存(检查进程中使用)
+            poll_interval: 写入时缓冲区已满的等待间隔(秒)
+        """
+        self._is_owner = name is None
+        self._shm = shared_memory.SharedMemory(name=name, create=self._is_owner,
+                                               size=(_HEADER_WORDS + capacity) * 8)
+        words = np.ndarray((_HEADER_WORDS + capacity,), dtype=np.uint64, buffer=self._shm.buf)
+        self._header = words[:_HEADER_WORDS]
+        self._records = words[_HEADER_WORDS:]
+        self.capacity = capacity
+        self._poll_interval = poll_interval
+        if self._is_owner:
+            self._header[:] = 0
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def write_position(self):
+        return int(self._header[_WRITE_POSITION])
+
+    @property
+    def read_position(self):
+        return int(self._header[_READ_POSITION])
+
+    def write(self, records, is_consumer_alive=None):
+        """
+        写入记录，缓冲区已满时等待消费者读取
+        parameters:
+            is_consumer_alive: 等待期间检查消费者是否还活着的函数，为None时一直等待
+        Returns:
+            写入之后的写入位置
+        Raises:
+            RuntimeError: 缓冲区已满并且消费者已经退出
+        """
+        written = 0
+        while written < len(records):
+            head = self.write_position
+            free = self.capacity - (head - self.read_position)
+            if free == 0:
+                if is_consumer_alive is not None and not is_consumer_alive():
+                    raise RuntimeError(f"trace ring is full and its consumer has exited, "
+                                       f"{len(records) - written} records not written")
+                time.sleep(self._poll_interval)
+                continue
+            start = head % self.capacity
+            count = min(free, len(records) - written, self.capacity - start)
+            self._records[start:start + count] = records[written:written + count]
+            self._header[_WRITE_POSITION] = head + count
+            written += count
+        return self.write_position
+
+    def read(self):
+        """取出当前所有可读的记录(拷贝)，没有记录时返回空数组"""
+        tail = self.read_position
+        head = self.write_position
+        if head == tail:
+            return np.zeros(0, dtype=np.uint64)
+        start = tail % self.capacity
+        end = start + (head - tail)
+        if end <= self.capacity:
+            records = self._records[start:end].copy()
+        else:
+            records = np.concatenate((self._records[start:], self._records[:end - self.capacity]))
+        self._header[_READ_POSITION] = head
+        return records
+
+    def close(self):
+        if self._shm is None:
+            return
+        # 释放指向共享内存的数组之后才能关闭
+        self._header = None
+        self._records = None
+        self._shm.close()
+        if self._is_owner:
+            self._shm.unlink()
+        self._shm = None
+
+
+def run_offloaded_job(match_func, checkers, records):
+    """
+    在检查进程中执行一次检查
+    Returns:
+        (是否通过, 失败时的异常信息)
+    """
+    sigs_of_scl, sigs_of_sda = decode_records(records)
+    try:
+        match_func(list(checkers), sigs_of_scl, sigs_of_sda)
+    except Exception as e:
+        return False, ''.join(traceback.format_exception_only(type(e), e)).strip()
+    return True, ''
+
+
+def _checker_process_main(ring_name, capacity, job_queue, result_queue, poll_interval):
+    """
+    检查进程：持续把环形缓冲区中的记录搬到本地，收到检查任务之后对属于它的记录执行检查，只把结论放回结果队列
+    检查任务: (任务编号, match_func, 检查器列表, 这次检查的最后一条记录之后的写入位置)，None表示结束
+    """
+    ring = Shared_Trace_Ring(capacity, name=ring_name, poll_interval=poll_interval)
+    # 本地保存的还没有检查的记录，以及其中第一条记录的位置
+    pending = np.zeros(0, dtype=np.uint64)
+    pending_start = 0
+    try:
+        while True:
+            try:
+                job = job_queue.get(timeout=poll_interval)
+            except queue.Empty:
+                # 空闲时也把记录搬走，仿真进程写入长序列时不会因为缓冲区已满而等待
+                pending = np.concatenate((pending, ring.read()))
+                continue
+            if job is None:
+                break
+            job_id, match_func, checkers, end_position = job
+            while pending_start + len(pending) < end_position:
+                records = ring.read()
+                if len(records) == 0:
+                    time.sleep(poll_interval)
+                pending = np.concatenate((pending, records))
+            count = end_position - pending_start
+            passed, message = run_offloaded_job(match_func, checkers, pending[:count])
+            pending = pending[count:]
+            pending_start = end_position
+            result_queue.put((job_id, passed, message))
+    finally:
+        ring.close()
+
+
+# 一次检查失败的结论
+class Offload_Failure():
+    def __init__(self, job_id, checkers, message):
+        self.job_id = job_id
+        self.checkers = checkers
+        self.message = message
+
+    def __str__(self):
+        return f"offloaded check #{self.job_id} ({', '.join(self.checkers)}) failed: {self.message}"
+
+
+# 把协议检查转移到独立的检查进程：仿真进程只负责把scl/sda的游程记录写入共享内存，检查和仿真在多核机器上并行执行
+# verify的用法与Verification_Cache.verify一致，但是不等待检查结果，检查失败在wait/with_offloaded_verdicts中报告
+class Trace_Offload():
+    def __init__(self, cache=None, capacity=DEFAULT_RING_CAPACITY, poll_interval=DEFAULT_POLL_INTERVAL):
+        """
+        parameters:
+            cache: Verification_Cache，命中时不再提交检查，检查通过之后把结果加入缓存
+            capacity: 环形缓冲区能容纳的游程记录数量
+            poll_interval: 等待缓冲区以及检查结果的轮询间隔(秒)
+        """
+        self._cache = cache
+        self._capacity = capacity
+        self._poll_interval = poll_interval
+        self._ring = None
+        self._process = None
+        self._job_queue = None
+        self._result_queue = None
+        self._next_job_id = 0
+        # 任务编号 -> (指纹, 检查器名字列表)
+        self._pending = {}
+        self.failures = []
+
+    @property
+    def is_running(self):
+        return self._process is not None
+
+    def start(self):
+        """启动检查进程，第一次verify时自动调用"""
+        if self.is_running:
+            return
+        # 仿真器中不能fork，使用spawn启动全新的解释器，sys.path会传递给检查进程
+        context = multiprocessing.get_context('spawn')
+        self._ring = Shared_Trace_Ring(self._capacity, poll_interval=self._poll_interval)
+        self._job_queue = context.Queue()
+        self._result_queue = context.Queue()
+        self._process = context.Process(target=_checker_process_main,
+            args=(self._ring.name, self._capacity, self._job_queue, self._result_queue, self._poll_interval),
+            daemon=True)
+        self._process.start()
+        atexit.register(self.close)
+
+    def verify(self, match_func, checkers, sigs_of_scl, sigs_of_sda):
+        """
+        提交一次检查，立即返回
+        parameters:
+            match_func: 真正执行检查的函数，必须可以被检查进程导入，一般是IICChecker中的try_to_match_iic_sigs
+            checkers: 还没有开始检查的检查器列表
+            sigs_of_scl: scl信号序列
+            sigs_of_sda: sda信号序列
+        Returns:
+            任务编号，缓存命中时返回None
+        Raises:
+            RuntimeError: 检查进程意外退出，记录无法写入环形缓冲区
+        """
+        runs = run_length_encode(sigs_of_scl, sigs_of_sda)
+        fingerprint = None
+        if self._cache is not None:
+            fingerprint = trace_fingerprint(runs, checkers)
+            if fingerprint in self._cache:
+                self._cache.hits += 1
+                return None
+            self._cache.misses += 1
+        self.start()
+        end_position = self._ring.write(encode_runs(runs), is_consumer_alive=self._process.is_alive)
+        job_id = self._next_job_id
+        self._next_job_id += 1
+        self._pending[job_id] = (fingerprint, [type(checker).__name__ for checker in checkers])
+        self._job_queue.put((job_id, match_func, list(checkers), end_position))
+        self.collect()
+        return job_id
+
+    def _accept(self, verdict):
+        job_id, passed, message = verdict
+        fingerprint, checker_names = self._pending.pop(job_id)
+        if not passed:
+            self.failures.append(Offload_Failure(job_id, checker_names, message))
+        elif self._cache is not None:
+            self._cache.add(fingerprint)
+
+    def collect(self):
+        """不等待，取回已经完成的检查结论"""
+        while len(self._pending) > 0:
+            try:
+                verdict = self._result_queue.get_nowait()
+            except queue.Empty:
+                return
+            self._accept(verdict)
+
+    def wait(self, timeout=None):
+        """
+        等待所有已经提交的检查完成
+        parameters:
+            timeout: 最多等待的秒数，为None时一直等待
+        Returns:
+            这段时间内累计的失败列表(Offload_Failure)，返回后清空
+        Raises:
+            RuntimeError: 检查进程意外退出或者等待超时
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(self._pending) > 0:
+            try:
+                self._accept(self._result_queue.get(timeout=self._poll_interval * 100))
+                continue
+            except queue.Empty:
+                pass
+            if not self._process.is_alive():
+                raise RuntimeError(f"checker process exited with code {self._process.exitcode}, "
+                                   f"{len(self._pending)} checks unfinished")
+            if deadline is not None and time.monotonic() > deadline:
+                raise RuntimeError(f"timeout waiting for {len(self._pending)} offloaded checks")
+        failures = self.failures
+        self.failures = []
+        return failures
+
+    def close(self):
+        """结束检查进程并释放共享内存，未完成的检查直接丢弃"""
+        if not self.is_running:
+            return
+        self._job_queue.put(None)
+        self._process.join(timeout=10)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process = None
+        self._ring.close()
+        self._ring = None
+        self._pending.clear()
+
+
+def with_offloaded_verdicts(offload):
+    """
+    测试用例装饰器(放在@cocotb.test之下)：测试结束时等待测试中提交给offload的所有检查，有检查失败则测试失败
+    测试本身抛出异常时也会等待，避免检查结论被算到下一个测试用例上
+    """
+    def decorator(test_func):
+        @functools.wraps(test_func)
+        async def wrapper(dut, *args, **kwargs):
+            try:
+                result = await test_func(dut, *args, **kwargs)
+            finally:
+                failures = offload.wait()
+            for failure in failures:
+                dut._log.error(str(failure))
+            assert len(failures) == 0, f"{len(failures)} offloaded checks failed, first: {failures[0]}"
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,140 @@
+# -*- coding: UTF-8 -*-
+
+import cocotb
+from cocotb.triggers import FallingEdge, ReadOnly, RisingEdge
+
+from SignalWait import FastClockCycles
+
+# 与Device_Common.v以及UART_Common.v保持一致
+BOARD_FREQ = 27_000_000
+BAUD_RATE = 115200
+
+
+def uart_bit_cycles(board_freq=BOARD_FREQ, baud_rate=BAUD_RATE):
+    """一个UART位持续的时钟周期数量，对应UART_TX/UART_RX中的 COUNT + 1"""
+    return board_freq // baud_rate
+
+
+# UART发送总线的监视器：只在起始位的下降沿以及每个位的中间采样，一个字节只需要十几次回调
+class UART_TX_Monitor():
+    def __init__(self, clk, tx, bit_cycles=None):
+        """
+        parameters:
+            clk: 时钟信号句柄，需要通过SignalWait.start_clock启动，才能直接跳过位中间的时钟周期
+            tx: UART发送总线
+            bit_cycles: 一个位持续的时钟周期数量，默认由波特率计算
+        """
+        self._clk = clk
+        self._tx = tx
+        self._bit_cycles = bit_cycles or uart_bit_cycles()
+        self.framing_errors = 0
+        self._task = None
+
+    async def receive_byte(self):
+        """
+        等待并解码下一帧
+        Returns:
+            (字节, 是否帧错误)，起始位或者停止位在位中间采样的值不正确时认为是帧错误
+        """
+        await FallingEdge(self._tx)
+        # 起始位的中间
+        await FastClockCycles(self._clk, self._bit_cycles // 2)
+        is_framing_error = self._tx.value != 0
+        value = 0
+        for idx in range(8):
+            await FastClockCycles(self._clk, self._bit_cycles)
+            value |= int(self._tx.value) << idx
+        # 停止位的中间
+        await FastClockCycles(self._clk, self._bit_cycles)
+        is_framing_error = is_framing_error or self._tx.value != 1
+        if is_framing_error:
+            self.framing_errors += 1
+        return value, is_framing_error
+
+    def start(self, on_byte):
+        """在后台持续解码，每解码一个字节调用一次on_byte(字节)"""
+        async def run():
+            while True:
+                value, _ = await self.receive_byte()
+                on_byte(value)
+        self._task = cocotb.start_soon(run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.kill()
+            self._task = None
+
+
+# UART接收总线的驱动器：每个位只等待一次，由登记过的时钟直接跳到下一个位的开始
+class UART_RX_Driver():
+    def __init__(self, clk, rx, bit_cycles=None):
+        self._clk = clk
+        self._rx = rx
+        self._bit_cycles = bit_cycles or uart_bit_cycles()
+        self._rx.value = 1
+
+    async def send_byte(self, value):
+        """从下一个时钟上升沿开始发送一帧，发送完停止位之后返回"""
+        await RisingEdge(self._clk)
+        bits = [0] + [(value >> idx) & 1 for idx in range(8)] + [1]
+        for bit in bits:
+            self._rx.value = bit
+            await FastClockCycles(self._clk, self._bit_cycles)
+
+    async def send_bytes(self, data):
+        for value in data:
+            await self.send_byte(value)
+
+
+async def collect_received_bytes(finish, received_byte, on_byte):
+    """
+    在finish每次被拉高时读取received_byte，用于采集UART_RX的输出
+    out_receive_finish与out_received_byte在同一个时钟上升沿更新，等到ReadOnly再读取
+    """
+    while True:
+        await RisingEdge(finish)
+        await ReadOnly()
+        on_byte(int(received_byte.value))
+
+
+# 数据流计分板：预先分配好接收缓冲区，通过memoryview按顺序写入，结束时整体比较
+class Stream_Scoreboard():
+    def __init__(self, expected):
+        self.expected = bytes(expected)
+        self.received = bytearray(len(self.expected))
+        self._view = memoryview(self.received)
+        self.received_count = 0
+        self.overflow_count = 0
+
+    def push(self, value):
+        if self.received_count >= len(self._view):
+            self.overflow_count += 1
+            return
+        self._view[self.received_count] = value
+        self.received_count += 1
+
+    def is_done(self):
+        return self.received_count >= len(self.expected)
+
+    def report(self):
+        """
+        Returns:
+            dict: 发送/接收的字节数、字节错误数、位错误数、丢失的字节数、多出来的字节数以及对应的错误率
+        """
+        count = self.received_count
+        expected = self.expected[:count]
+        received = bytes(self._view[:count])
+        diff = (int.from_bytes(expected, 'little') ^ int.from_bytes(received, 'little')).to_bytes(count, 'little')
+        byte_errors = count - diff.count(0)
+        bit_errors = bin(int.from_bytes(diff, 'little')).count('1')
+        return {
+            'sent': len(self.expected),
+            'received': count,
+            'lost': len(self.expected) - count,
+            'overflow': self.overflow_count,
+            'byte_errors': byte_errors,
+            'bit_errors': bit_errors,
+            'byte_error_rate': byte_errors / count if count else 0.0,
+            'bit_error_rate': bit_errors / (count * 8) if count else 0.0,
+        }
+
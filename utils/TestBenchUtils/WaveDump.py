@@ -0,0 +1,217 @@
+# -*- coding: UTF-8 -*-
+
+import functools
+import json
+import os
+from collections import deque
+
+import cocotb
+from cocotb.triggers import Edge
+from cocotb.utils import get_sim_steps, get_sim_time
+
+# 波形模式
+WAVE_MODE_OFF = 'off'        # 不生成波形
+WAVE_MODE_SCOPED = 'scoped'  # 只记录指定的信号(总线以及状态机)
+WAVE_MODE_FULL = 'full'      # 记录顶层模块下的所有信号
+WAVE_MODE_RING = 'ring'      # 只在Python中保留最后一段时间的指定信号，测试失败时才写出VCD文件
+
+# 生成的波形记录模块，通过plusargs决定是否记录以及记录哪些信号，因此同一次编译可以用于所有的波形模式
+DUMP_MODULE_NAME = 'tb_wave_dump'
+
+# 传递给仿真进程的环境变量
+ENV_WAVE_MODE = 'TB_WAVE_MODE'              # 默认的波形模式
+ENV_WAVE_MODES = 'TB_WAVE_MODES'            # json格式，测试用例名 -> 波形模式
+ENV_WAVE_RING_US = 'TB_WAVE_RING_US'        # ring模式保留的时间窗口(us)
+ENV_WAVE_DIR = 'TB_WAVE_DIR'                # ring模式写出VCD文件的目录
+
+DEFAULT_RING_WINDOW_US = 200
+
+
+def write_dump_module(build_dir, hdl_toplevel, scoped_signals):
+    """
+    生成波形记录模块
+    +dump_full 记录顶层模块下的所有信号，+dump_scoped 只记录scoped_signals，+dump_file=<path> 指定输出文件
+    parameters:
+        build_dir: 生成的verilog文件存放的目录
+        hdl_toplevel: 顶层模块名
+        scoped_signals: 相对于顶层模块的信号名列表
+    Returns:
+        生成的verilog文件路径
+    """
+    os.makedirs(build_dir, exist_ok=True)
+    path = os.path.join(build_dir, f"{DUMP_MODULE_NAME}.v")
+    lines = [
+        f"module {DUMP_MODULE_NAME}();",
+        "    reg [8 * 1024 - 1 : 0] dump_file;",
+        "    initial begin",
+        "        if ($test$plusargs(\"dump_full\") || $test$plusargs(\"dump_scoped\")) begin",
+        "            if (!$value$plusargs(\"dump_file=%s\", dump_file))",
+        f"                dump_file = \"{hdl_toplevel}.fst\";",
+        "            $dumpfile(dump_file);",
+        "            if ($test$plusargs(\"dump_full\"))",
+        f"                $dumpvars(0, {hdl_toplevel});",
+        "            else begin",
+    ]
+    for signal in scoped_signals:
+        lines.append(f"                $dumpvars(1, {hdl_toplevel}.{signal});")
+    lines += [
+        "            end",
+        "        end",
+        "    end",
+        "endmodule",
+        "",
+    ]
+    with open(path, 'w') as f:
+        f.write("\n".join(lines))
+    return path
+
+
+def prepare_wave_dump(build_dir, hdl_toplevel, scoped_signals):
+    """
+    生成波形记录模块，并返回编译时需要额外加入的源文件以及编译参数
+    Returns:
+        (额外的verilog源文件列表, 额外的build_args列表)
+    """
+    path = write_dump_module(build_dir, hdl_toplevel, scoped_signals)
+    return [path], ['-s', DUMP_MODULE_NAME]
+
+
+def wave_plusargs(mode, dump_file):
+    """根据波形模式生成仿真时的plusargs，-fst让icarus输出FST格式"""
+    if mode == WAVE_MODE_FULL:
+        return ['+dump_full', f"+dump_file={dump_file}", '-fst']
+    if mode == WAVE_MODE_SCOPED:
+        return ['+dump_scoped', f"+dump_file={dump_file}", '-fst']
+    return []
+
+
+def wave_env(mode, wave_dir, wave_modes=None, ring_window_us=DEFAULT_RING_WINDOW_US):
+    """生成仿真进程中Python测试代码需要的波形配置(环境变量)"""
+    return {
+        ENV_WAVE_MODE: mode,
+        ENV_WAVE_MODES: json.dumps(wave_modes or {}),
+        ENV_WAVE_RING_US: str(ring_window_us),
+        ENV_WAVE_DIR: wave_dir,
+    }
+
+
+def current_wave_mode(test_name):
+    """在仿真进程中获取某个测试用例的波形模式"""
+    wave_modes = json.loads(os.environ.get(ENV_WAVE_MODES, '{}'))
+    return wave_modes.get(test_name, os.environ.get(ENV_WAVE_MODE, WAVE_MODE_OFF))
+
+
+def _vcd_timescale():
+    """将仿真器的时间精度转换成VCD的timescale"""
+    precision = cocotb.simulator.get_precision()
+    units = {-15: 'fs', -12: 'ps', -9: 'ns', -6: 'us', -3: 'ms', 0: 's'}
+    base = precision - precision % 3
+    return f"{10 ** (precision - base)}{units[base]}"
+
+
+def _vcd_identifier(idx):
+    """生成VCD中的信号标识符，使用可打印字符'!'~'~'"""
+    chars = []
+    idx += 1
+    while idx > 0:
+        idx -= 1
+        chars.append(chr(33 + idx % 94))
+        idx //= 94
+    return ''.join(chars)
+
+
+# 环形波形记录器：通过边沿回调记录指定信号的变化，只保留最后window时间内的变化
+# 信号都是总线以及状态机这类变化不频繁的信号，所以开销只和信号变化次数相关，和时钟周期数无关
+class Wave_Ring_Recorder():
+    def __init__(self, dut, signal_names, window_us=DEFAULT_RING_WINDOW_US):
+        self._handles = [dut._id(name, extended=False) for name in signal_names]
+        self._names = list(signal_names)
+        self._window_steps = get_sim_steps(window_us, 'us')
+        self._changes = deque() # (时间, 信号索引, 值)
+        self._initial_values = [None] * len(self._handles) # 时间窗口开始时的信号值
+        self._window_start = 0
+        self._tasks = []
+
+    def start(self):
+        now = get_sim_time('step')
+        self._window_start = now
+        for idx, handle in enumerate(self._handles):
+            self._initial_values[idx] = handle.value.binstr
+            self._tasks.append(cocotb.start_soon(self._watch(idx, handle)))
+
+    def stop(self):
+        for task in self._tasks:
+            task.kill()
+        self._tasks = []
+
+    async def _watch(self, idx, handle):
+        edge = Edge(handle)
+        while True:
+            await edge
+            now = get_sim_time('step')
+            self._changes.append((now, idx, handle.value.binstr))
+            self._trim(now)
+
+    def _trim(self, now):
+        window_start = now - self._window_steps
+        while len(self._changes) and self._changes[0][0] < window_start:
+            _, idx, value = self._changes.popleft()
+            self._initial_values[idx] = value
+        self._window_start = max(self._window_start, window_start)
+
+    def write_vcd(self, path):
+        """把时间窗口内的信号变化写成VCD文件"""
+        now = get_sim_time('step')
+        self._trim(now)
+        ids = [_vcd_identifier(idx) for idx in range(len(self._handles))]
+        widths = [len(handle) for handle in self._handles]
+
+        def format_value(idx, value):
+            if widths[idx] == 1:
+                return f"{value}{ids[idx]}"
+            return f"b{value} {ids[idx]}"
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(f"$timescale {_vcd_timescale()} $end\n")
+            f.write("$scope module ring $end\n")
+            for idx, name in enumerate(self._names):
+                f.write(f"$var wire {widths[idx]} {ids[idx]} {name} $end\n")
+            f.write("$upscope $end\n$enddefinitions $end\n")
+            f.write(f"#{self._window_start}\n$dumpvars\n")
+            for idx, value in enumerate(self._initial_values):
+                f.write(format_value(idx, value) + "\n")
+            f.write("$end\n")
+            last_time = self._window_start
+            for change_time, idx, value in self._changes:
+                if change_time != last_time:
+                    f.write(f"#{change_time}\n")
+                    last_time = change_time
+                f.write(format_value(idx, value) + "\n")
+            f.write(f"#{now}\n")
+
+
+def with_wave_capture(signal_names):
+    """
+    测试用例装饰器(放在@cocotb.test之下)：测试用例的波形模式为ring时，记录signal_names最后一段时间的变化，
+    测试失败时写出 <TB_WAVE_DIR>/<测试用例名>.vcd
+    """
+    def decorator(test_func):
+        @functools.wraps(test_func)
+        async def wrapper(dut, *args, **kwargs):
+            if current_wave_mode(test_func.__name__) != WAVE_MODE_RING:
+                return await test_func(dut, *args, **kwargs)
+            window_us = float(os.environ.get(ENV_WAVE_RING_US, DEFAULT_RING_WINDOW_US))
+            recorder = Wave_Ring_Recorder(dut, signal_names, window_us)
+            recorder.start()
+            try:
+                return await test_func(dut, *args, **kwargs)
+            except BaseException:
+                path = os.path.join(os.environ.get(ENV_WAVE_DIR, '.'), f"{test_func.__name__}.vcd")
+                recorder.write_vcd(path)
+                dut._log.info(f"Last {window_us}us of waves written to {path}")
+                raise
+            finally:
+                recorder.stop()
+        return wrapper
+    return decorator
@@ -0,0 +1,375 @@
+# -*- coding: UTF-8 -*-
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Process
+
+from RegressionRunner import Test_Result, Work_Item, _run_work_item
+from WaveDump import DEFAULT_RING_WINDOW_US, WAVE_MODE_OFF
+
+# 测试单元被领取之后，超过这个时间(秒)还没有提交结果，就认为执行它的worker已经挂掉，可以被重新领取
+DEFAULT_LEASE_SECONDS = 6 * 3600
+# 本地worker全部退出之后，超过这个时间(秒)没有新的测试单元完成，就认为没有worker在消费队列
+DEFAULT_STALL_SECONDS = 30 * 60
+# 测试用例可以把自己的覆盖率数据写到测试目录下的这个文件中，worker会把它一起提交回队列
+COVERAGE_FILE_NAME = 'coverage.json'
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def new_run_id():
+    """每次回归的编号，同一个队列被多次回归复用时，用它区分本次回归的测试单元以及结果"""
+    return uuid.uuid4().hex
+
+
+# 工作队列的接口规范：协调者放入测试单元，多个worker领取并执行，最后把结果提交回同一个存储
+class Base_Work_Queue():
+    def set_settings(self, settings):
+        """保存执行测试单元需要的配置(Regression_Runner.make_settings的返回值)"""
+        raise RuntimeError("Unimplemented")
+
+    def get_settings(self):
+        raise RuntimeError("Unimplemented")
+
+    def put(self, work_items, priorities=None, run_id=None):
+        """
+        放入测试单元，priorities越大越先被领取
+        Returns:
+            这批测试单元所属的回归编号，run_id为None时生成新的编号
+        """
+        raise RuntimeError("Unimplemented")
+
+    def claim(self, worker_id):
+        """
+        领取一个测试单元
+        Returns:
+            (item_id, Work_Item)，队列中没有可领取的测试单元时返回None
+        """
+        raise RuntimeError("Unimplemented")
+
+    def complete(self, item_id, result, coverage=None):
+        """提交测试单元的执行结果以及覆盖率数据"""
+        raise RuntimeError("Unimplemented")
+
+    def results(self, run_id=None):
+        """
+        获取已经提交的结果，给出run_id时只返回这次回归的结果，否则返回队列中所有的结果(包括之前的回归)
+        Returns:
+            (Test_Result, 覆盖率数据)的列表
+        """
+        raise RuntimeError("Unimplemented")
+
+    def is_drained(self, run_id=None):
+        """所有测试单元(给出run_id时只看这次回归的)是否都已经提交了结果"""
+        raise RuntimeError("Unimplemented")
+
+    def num_done(self, run_id=None):
+        """已经提交了结果的测试单元数量，比results轻量，用于判断回归是否还在推进"""
+        raise RuntimeError("Unimplemented")
+
+
+# 基于SQLite的队列，适合同一台机器上的多个worker进程
+class SQLite_Work_Queue(Base_Work_Queue):
+    def __init__(self, db_path, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self._lease_seconds = lease_seconds
+        self._conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS work_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                test TEXT NOT NULL,
+                seed TEXT,
+                priority REAL NOT NULL,
+                state TEXT NOT NULL,
+                worker TEXT,
+                claimed_at REAL,
+                result TEXT,
+                coverage TEXT
+            )""")
+        # 旧版本创建的队列没有回归编号
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(work_items)")]
+        if 'run_id' not in columns:
+            self._conn.execute("ALTER TABLE work_items ADD COLUMN run_id TEXT")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (id INTEGER PRIMARY KEY, value TEXT NOT NULL)")
+
+    def set_settings(self, settings):
+        self._conn.execute("INSERT OR REPLACE INTO settings (id, value) VALUES (0, ?)", (json.dumps(settings),))
+
+    def get_settings(self):
+        row = self._conn.execute("SELECT value FROM settings WHERE id = 0").fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, work_items, priorities=None, run_id=None):
+        priorities = priorities or [0.0] * len(work_items)
+        run_id = run_id or new_run_id()
+        self._conn.execute("BEGIN IMMEDIATE")
+        for item, priority in zip(work_items, priorities):
+            self._conn.execute(
+                "INSERT INTO work_items (test, seed, priority, state, run_id) VALUES (?, ?, ?, 'pending', ?)",
+                (item.test, json.dumps(item.seed), priority, run_id))
+        self._conn.execute("COMMIT")
+        return run_id
+
+    def claim(self, worker_id):
+        now = time.time()
+        # BEGIN IMMEDIATE拿到写锁之后再查询，保证同一个测试单元只会被一个worker领取
+        self._conn.execute("BEGIN IMMEDIATE")
+        row = self._conn.execute(
+            "SELECT id, test, seed FROM work_items "
+            "WHERE state = 'pending' OR (state = 'claimed' AND claimed_at < ?) "
+            "ORDER BY priority DESC, id LIMIT 1", (now - self._lease_seconds,)).fetchone()
+        if row is None:
+            self._conn.execute("COMMIT")
+            return None
+        self._conn.execute(
+            "UPDATE work_items SET state = 'claimed', worker = ?, claimed_at = ? WHERE id = ?",
+            (worker_id, now, row[0]))
+        self._conn.execute("COMMIT")
+        return row[0], Work_Item(row[1], json.loads(row[2]))
+
+    def complete(self, item_id, result, coverage=None):
+        self._conn.execute(
+            "UPDATE work_items SET state = 'done', result = ?, coverage = ? WHERE id = ?",
+            (json.dumps(result._asdict()), json.dumps(coverage), item_id))
+
+    def results(self, run_id=None):
+        if run_id is None:
+            rows = self._conn.execute(
+                "SELECT result, coverage FROM work_items WHERE state = 'done' ORDER BY id").fetchall()
+        else:
+            rows = self._conn.execute(
+                "SELECT result, coverage FROM work_items WHERE state = 'done' AND run_id = ? ORDER BY id",
+                (run_id,)).fetchall()
+        return [(Test_Result(**json.loads(result)), json.loads(coverage)) for result, coverage in rows]
+
+    def is_drained(self, run_id=None):
+        if run_id is None:
+            row = self._conn.execute("SELECT COUNT(*) FROM work_items WHERE state != 'done'").fetchone()
+        else:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM work_items WHERE state != 'done' AND run_id = ?", (run_id,)).fetchone()
+        return row[0] == 0
+
+    def num_done(self, run_id=None):
+        if run_id is None:
+            row = self._conn.execute("SELECT COUNT(*) FROM work_items WHERE state = 'done'").fetchone()
+        else:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM work_items WHERE state = 'done' AND run_id = ?", (run_id,)).fetchone()
+        return row[0]
+
+
+# 基于文件系统的队列，多台机器挂载同一个共享目录即可一起消费
+# 领取是通过os.rename把文件从pending目录移动到claimed目录完成的，rename是原子操作，同一个文件只有一个worker能移动成功
+class File_Work_Queue(Base_Work_Queue):
+    def __init__(self, queue_dir, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self._lease_seconds = lease_seconds
+        self._queue_dir = queue_dir
+        self._pending_dir = os.path.join(queue_dir, 'pending')
+        self._claimed_dir = os.path.join(queue_dir, 'claimed')
+        self._done_dir = os.path.join(queue_dir, 'done')
+        for d in (self._pending_dir, self._claimed_dir, self._done_dir):
+            os.makedirs(d, exist_ok=True)
+
+    def _write_json(self, path, value):
+        # 先写临时文件再rename，其它机器永远不会读到写了一半的文件
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(value, f)
+        os.rename(tmp_path, path)
+
+    def _read_json(self, path):
+        with open(path) as f:
+            return json.load(f)
+
+    def set_settings(self, settings):
+        self._write_json(os.path.join(self._queue_dir, 'settings.json'), settings)
+
+    def get_settings(self):
+        path = os.path.join(self._queue_dir, 'settings.json')
+        return self._read_json(path) if os.path.isfile(path) else None
+
+    def put(self, work_items, priorities=None, run_id=None):
+        priorities = priorities or [0.0] * len(work_items)
+        run_id = run_id or new_run_id()
+        for item, priority in zip(work_items, priorities):
+            # 文件名按字典序排列就是领取顺序：优先级高的在前；文件名中带上回归编号，领取和完成之后都保留
+            rank = max(0, 10 ** 9 - int(priority * 1000))
+            name = f"{rank:012d}_{run_id}_{uuid.uuid4().hex}.json"
+            self._write_json(os.path.join(self._pending_dir, name), {'test': item.test, 'seed': item.seed})
+        return run_id
+
+    def _is_of_run(self, name, run_id):
+        return run_id is None or f"_{run_id}_" in name
+
+    def _reclaim_expired(self):
+        now = time.time()
+        for name in os.listdir(self._claimed_dir):
+            path = os.path.join(self._claimed_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self._lease_seconds:
+                    os.rename(path, os.path.join(self._pending_dir, name.split('@')[0]))
+            except FileNotFoundError:
+                pass # 已经被别的worker处理了
+
+    def claim(self, worker_id):
+        self._reclaim_expired()
+        for name in sorted(n for n in os.listdir(self._pending_dir) if n.endswith('.json')):
+            claimed_name = f"{name}@{worker_id}"
+            try:
+                os.rename(os.path.join(self._pending_dir, name), os.path.join(self._claimed_dir, claimed_name))
+            except FileNotFoundError:
+                continue # 被别的worker抢先领取了
+            # 更新修改时间，作为租约的开始时间
+            os.utime(os.path.join(self._claimed_dir, claimed_name))
+            value = self._read_json(os.path.join(self._claimed_dir, claimed_name))
+            return claimed_name, Work_Item(value['test'], value['seed'])
+        return None
+
+    def complete(self, item_id, result, coverage=None):
+        name = item_id.split('@')[0]
+        self._write_json(os.path.join(self._done_dir, name), {'result': result._asdict(), 'coverage': coverage})
+        try:
+            os.remove(os.path.join(self._claimed_dir, item_id))
+        except FileNotFoundError:
+            pass
+
+    def results(self, run_id=None):
+        values = []
+        for name in sorted(n for n in os.listdir(self._done_dir) if n.endswith('.json') and self._is_of_run(n, run_id)):
+            value = self._read_json(os.path.join(self._done_dir, name))
+            values.append((Test_Result(**value['result']), value['coverage']))
+        return values
+
+    def is_drained(self, run_id=None):
+        has_file = lambda d: any((n.endswith('.json') or '@' in n) and self._is_of_run(n, run_id) for n in os.listdir(d))
+        return not has_file(self._pending_dir) and not has_file(self._claimed_dir)
+
+    def num_done(self, run_id=None):
+        return sum(1 for n in os.listdir(self._done_dir) if n.endswith('.json') and self._is_of_run(n, run_id))
+
+
+def open_work_queue(path, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """根据路径打开队列：以.db结尾的是SQLite队列，否则是文件系统队列(目录)"""
+    if path.endswith('.db'):
+        return SQLite_Work_Queue(path, lease_seconds)
+    return File_Work_Queue(path, lease_seconds)
+
+
+def read_coverage(test_dir):
+    path = os.path.join(test_dir, COVERAGE_FILE_NAME)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def run_worker(queue_path, worker_id=None, idle_exit_seconds=0.0, poll_interval=1.0):
+    """
+    worker主循环：不断从队列中领取测试单元并执行，直到队列中没有可领取的测试单元
+    parameters:
+        queue_path: 队列路径，见open_work_queue
+        worker_id: worker的名字，默认是主机名加进程号
+        idle_exit_seconds: 队列为空之后再等待多久才退出，用于协调者还在陆续放入测试单元的情况
+    Returns:
+        当前worker执行的测试单元数量
+    """
+    worker_id = worker_id or default_worker_id()
+    queue = open_work_queue(queue_path)
+    settings = queue.get_settings()
+    executed = 0
+    idle_since = None
+    while True:
+        claimed = queue.claim(worker_id)
+        if claimed is None:
+            idle_since = idle_since or time.time()
+            if time.time() - idle_since >= idle_exit_seconds:
+                return executed
+            time.sleep(poll_interval)
+            continue
+        idle_since = None
+        item_id, item = claimed
+        # 每个测试单元在新的子进程中执行，这样峰值内存只统计这一个测试单元
+        with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+            result = executor.submit(_run_work_item, settings, item).result()
+        queue.complete(item_id, result, read_coverage(result.test_dir))
+        executed += 1
+
+
+def run_regression_with_queue(regression, queue_path, work_items, num_local_workers=None,
+                              waves=False, extra_env=None, plusargs=(), poll_interval=1.0,
+                              wave_mode=WAVE_MODE_OFF, wave_modes=None, ring_window_us=DEFAULT_RING_WINDOW_US,
+                              stall_seconds=DEFAULT_STALL_SECONDS):
+    """
+    通过工作队列执行回归：按照最长处理时间优先的顺序放入队列，启动本地的worker进程一起消费，
+    其它机器可以在共享目录上执行 python WorkQueue.py <queue_path> 加入进来
+    parameters:
+        regression: 已经完成编译的Regression_Runner，构建目录需要对所有worker可见
+        queue_path: 队列路径，见open_work_queue
+        num_local_workers: 本地worker进程数量，默认与regression.num_workers一致，为0时只等待其它机器
+        wave_mode, wave_modes, ring_window_us: 波形配置，见Regression_Runner.make_settings
+        stall_seconds: 本地worker全部退出(或者没有本地worker)之后，超过这个时间没有测试单元完成就放弃等待
+    Returns:
+        (Test_Result列表, 与之对应的覆盖率数据列表)
+    Raises:
+        RuntimeError: 本地worker异常退出，或者队列长时间没有worker消费
+    """
+    queue = open_work_queue(queue_path)
+    queue.set_settings(regression.make_settings(waves, extra_env, plusargs, wave_mode, wave_modes, ring_window_us))
+    ordered = regression.order_work_items(work_items)
+    # 队列可能被之前的回归用过，只等待以及收集本次回归放入的测试单元
+    run_id = queue.put(ordered, [float(len(ordered) - idx) for idx in range(len(ordered))])
+
+    if num_local_workers is None:
+        num_local_workers = regression.num_workers
+    workers = [Process(target=run_worker, args=(queue_path, f"{default_worker_id()}-{idx}"))
+               for idx in range(num_local_workers)]
+    for worker in workers:
+        worker.start()
+    # 本地worker在队列中没有可领取的测试单元时正常退出，剩下的测试单元可能正在其它机器上执行
+    num_done = queue.num_done(run_id)
+    last_progress = time.time()
+    while not queue.is_drained(run_id):
+        error = None
+        crashed = [worker.exitcode for worker in workers if worker.exitcode not in (None, 0)]
+        if any(worker.is_alive() for worker in workers) or queue.num_done(run_id) != num_done:
+            num_done = queue.num_done(run_id)
+            last_progress = time.time()
+        if len(crashed) > 0:
+            error = f"{len(crashed)} local workers exited with codes {crashed}"
+        elif time.time() - last_progress > stall_seconds:
+            error = f"no work item of this run completed in {stall_seconds}s and no local worker is running"
+        if error is not None:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+            raise RuntimeError(error)
+        time.sleep(poll_interval)
+    for worker in workers:
+        worker.join()
+
+    results = queue.results(run_id)
+    for result, _ in results:
+        regression.record_result(result)
+    return [result for result, _ in results], [coverage for _, coverage in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consume regression work items from a shared work queue")
+    parser.add_argument('queue_path', help="SQLite queue (*.db) or queue directory on a shared filesystem")
+    parser.add_argument('--worker-id', default=None)
+    parser.add_argument('--idle-exit-seconds', type=float, default=0.0)
+    args = parser.parse_args()
+    executed = run_worker(args.queue_path, args.worker_id, args.idle_exit_seconds)
+    print(f"Worker executed {executed} work items")
+
+
+if __name__ == '__main__':
+    main()